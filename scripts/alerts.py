@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""Alert rules for the latest run and an async, batched webhook dispatcher.
+
+``evaluate`` checks every rule against the latest workflow run in one pass, using the
+previous ``ALERT_BASELINE_RUNS`` runs as the baseline. A run is every history entry
+sharing a ``workflow_run`` (one per matrix job, combined: summaries and retry counts
+summed, flaky candidates merged); entries without one are runs of their own. Sibling
+jobs of the latest run therefore never end up in its baseline.
+
+* ``flaky_increase``      - more flaky candidates than the previous run
+* ``new_failure_clusters`` - failure clusters first seen in any entry of the latest run
+* ``stability_drop``      - stability (100 - failure rate) fell ``ALERT_STABILITY_DROP``
+  points below the baseline mean
+* ``recovery_rate_fall``  - retry recovery rate fell ``ALERT_RECOVERY_DROP`` points below
+  the baseline mean of runs that retried anything
+* ``newly_quarantined``   - tests the flakiness model (``flakiness.py``, over the test
+  indexes in ``FLAKY_TEST_INDEXES``) put in quarantine in their index's latest run
+
+Destinations are Slack (``SLACK_WEBHOOK_URL``, ``{"text"}`` payload) and generic JSON
+webhooks (``ALERT_WEBHOOKS``, comma separated). All alerts for a destination are
+batched into as few messages as possible (``ALERT_BATCH`` alerts each); destinations
+are sent to concurrently, each over one reused keep-alive connection. Each request has a
+timeout (``ALERT_TIMEOUT``), sends per destination are rate limited (``ALERT_RATE``
+per second), connection errors, 429 and 5xx are retried with exponential backoff
+honouring ``Retry-After`` (``ALERT_RETRIES``), and the whole dispatch is bounded by
+``ALERT_DEADLINE`` seconds, so a slow webhook can never stall the workflow. Standard
+library only (asyncio streams and a minimal HTTP/1.1 client).
+
+``alerts.py [history_store] [legacy_json]`` evaluates the store's latest runs (at most
+``MAX_JOBS`` entries for each of the last ``ALERT_BASELINE_RUNS + 1`` workflow runs are read) with the
+persisted failure cluster index and dispatches; ``--dry-run`` prints the alerts and
+payloads instead.
+"""
+import asyncio
+import json
+import os
+import random
+import ssl
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from failure_fingerprint import FAILURE_CLUSTER_DIR, FailureIndex
+from flakiness import assess, index_dirs
+from history_store import HistoryStore, open_history
+from stage_metrics import instrumented, stage
+from test_index import QUARANTINE_RATE
+
+HISTORY_PATH = 'combined/flaky-history.json'
+HISTORY_STORE = 'combined/flaky-history'
+BASELINE_RUNS = int(os.environ.get('ALERT_BASELINE_RUNS', '5'))
+STABILITY_DROP = float(os.environ.get('ALERT_STABILITY_DROP', '5'))
+RECOVERY_DROP = float(os.environ.get('ALERT_RECOVERY_DROP', '10'))
+TIMEOUT = float(os.environ.get('ALERT_TIMEOUT', '10'))
+DEADLINE = float(os.environ.get('ALERT_DEADLINE', '60'))
+RETRIES = int(os.environ.get('ALERT_RETRIES', '3'))
+RATE = float(os.environ.get('ALERT_RATE', '1'))
+BATCH = int(os.environ.get('ALERT_BATCH', '20'))
+BACKOFF = 0.5
+MAX_LISTED = 10
+MAX_JOBS = 64  # matrix jobs per workflow run read for each baseline run
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def alert(rule, title, detail=None, severity='warning'):
+    return {'rule': rule, 'severity': severity, 'title': title, 'detail': detail or []}
+
+def stability(entry):
+    summary = entry.get('summary', {})
+    total = summary.get('total') or 0
+    return 100 - summary.get('failed', 0) / total * 100 if total else None
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+def _listed(items):
+    items = sorted(items)
+    return items[:MAX_LISTED] + ([f'... and {len(items) - MAX_LISTED} more'] if len(items) > MAX_LISTED else [])
+
+def group_runs(recent):
+    """Split entries into workflow runs (lists of entries), ordered by each run's newest entry."""
+    runs = {}
+    for i, entry in enumerate(recent):
+        key = entry.get('workflow_run') or ('entry', i)
+        run = runs.setdefault(key, [None, []])
+        run[0] = i
+        run[1].append(entry)
+    return [entries for _, entries in sorted(runs.values(), key=lambda r: r[0])]
+
+def combine_run(entries):
+    """One entry for a workflow run: summaries and retry counts summed, flaky candidates merged."""
+    if len(entries) == 1:
+        return entries[0]
+    summary = {}
+    flaky = {}
+    retried = recovered = 0
+    for e in entries:
+        for k, v in (e.get('summary') or {}).items():
+            summary[k] = summary.get(k, 0) + v
+        for fc in e.get('flaky_candidates') or []:
+            flaky.setdefault((fc.get('class'), fc.get('name')), fc)
+        stats = e.get('retry_stats') or {}
+        retried += stats.get('retried_tests', 0)
+        recovered += stats.get('recovered_tests', 0)
+    retry_stats = {}
+    if retried:
+        retry_stats = {'retried_tests': retried, 'recovered_tests': recovered,
+                       'recovery_rate': round(recovered / retried * 100, 2)}
+    return {
+        'timestamp': max(e.get('timestamp') or '' for e in entries),
+        'workflow_run': entries[-1].get('workflow_run'),
+        'summary': summary,
+        'failed_tests': [ft for e in entries for ft in e.get('failed_tests') or []],
+        'flaky_candidates': list(flaky.values()),
+        'retry_stats': retry_stats,
+    }
+
+def rule_flaky_increase(latest, baseline, clusters, quarantined, batch):
+    if not baseline:
+        return []
+    prev_flaky = len(baseline[-1].get('flaky_candidates', []))
+    curr_flaky = len(latest.get('flaky_candidates', []))
+    if curr_flaky > prev_flaky:
+        return [alert('flaky_increase', f'Flaky tests increased: {prev_flaky} -> {curr_flaky}',
+                      _listed(f"{fc.get('class')}::{fc.get('name')}" for fc in latest.get('flaky_candidates', [])))]
+    return []
+
+def rule_new_failure_clusters(latest, baseline, clusters, quarantined, batch):
+    if clusters is None or not batch:
+        return []
+    new = [f"`{cid}` {c.get('type')}: {(c.get('message') or '')[:120]} ({len(c.get('tests', ()))} test(s))"
+           for cid, c in clusters.clusters.items() if c.get('first_seen') in batch]
+    if new:
+        return [alert('new_failure_clusters', f'{len(new)} new failure cluster(s)', _listed(new), 'critical')]
+    return []
+
+def rule_stability_drop(latest, baseline, clusters, quarantined, batch):
+    current, before = stability(latest), _mean(stability(e) for e in baseline)
+    if current is not None and before is not None and before - current >= STABILITY_DROP:
+        return [alert('stability_drop', f'Stability dropped to {current:.1f}% (baseline {before:.1f}%)', severity='critical')]
+    return []
+
+def rule_recovery_rate_fall(latest, baseline, clusters, quarantined, batch):
+    stats = latest.get('retry_stats') or {}
+    if not stats.get('retried_tests'):
+        return []
+    before = _mean(e['retry_stats'].get('recovery_rate') for e in baseline
+                   if (e.get('retry_stats') or {}).get('retried_tests'))
+    current = stats.get('recovery_rate', 0.0)
+    if before is not None and before - current >= RECOVERY_DROP:
+        return [alert('recovery_rate_fall', f'Retry recovery rate fell to {current:.1f}% (baseline {before:.1f}%)',
+                      [f"{stats.get('recovered_tests', 0)}/{stats['retried_tests']} retried test(s) recovered"])]
+    return []
+
+def rule_newly_quarantined(latest, baseline, clusters, quarantined, batch):
+    if quarantined:
+        return [alert('newly_quarantined', f'{len(quarantined)} test(s) newly quarantined '
+                      f'(flip rate at least {QUARANTINE_RATE:.0%} with confidence)', _listed(quarantined))]
+    return []
+
+RULES = [rule_flaky_increase, rule_new_failure_clusters, rule_stability_drop, rule_recovery_rate_fall, rule_newly_quarantined]
+
+def evaluate(recent, clusters=None, quarantined=()):
+    """Alerts for the workflow run of ``recent[-1]`` against the preceding ``BASELINE_RUNS`` runs."""
+    if not recent:
+        return []
+    runs = group_runs(recent)
+    latest, baseline = combine_run(runs[-1]), [combine_run(r) for r in runs[-BASELINE_RUNS - 1:-1]]
+    batch = {e.get('timestamp') for e in runs[-1]} - {None}
+    return [a for rule in RULES for a in rule(latest, baseline, clusters, quarantined, batch)]
+
+class Destination:
+    def __init__(self, name, url, kind='json'):
+        self.name = name
+        self.url = url
+        self.kind = kind
+
+    def payloads(self, alerts, batch=BATCH):
+        """One JSON body per batch of ``batch`` alerts."""
+        for i in range(0, len(alerts), max(1, batch)):
+            chunk = alerts[i:i + batch]
+            if self.kind == 'slack':
+                yield {'text': format_text(chunk)}
+            else:
+                yield {'source': 'playwright-reports', 'sent_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                       'alerts': chunk}
+
+def destinations():
+    dests = []
+    if os.environ.get('SLACK_WEBHOOK_URL'):
+        dests.append(Destination('slack', os.environ['SLACK_WEBHOOK_URL'], 'slack'))
+    for i, url in enumerate(u.strip() for u in os.environ.get('ALERT_WEBHOOKS', '').split(',')):
+        if url:
+            dests.append(Destination(f'webhook-{i + 1}', url))
+    return dests
+
+def format_text(alerts):
+    lines = []
+    for a in alerts:
+        lines.append(f"{':rotating_light:' if a['severity'] == 'critical' else ':warning:'} {a['title']}")
+        lines.extend(f'    • {d}' for d in a['detail'])
+    return '\n'.join(lines)
+
+class HTTPError(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f'HTTP {status}')
+        self.status = status
+        self.retry_after = retry_after
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection to a single origin, reopened when the server closes it."""
+
+    def __init__(self, url, timeout=TIMEOUT):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.https = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.https else 80)
+        self.target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        self.timeout = timeout
+        self.reader = self.writer = None
+        self.opened = 0
+
+    async def _open(self):
+        ctx = ssl.create_default_context() if self.https else None
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ctx), self.timeout)
+        self.opened += 1
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+        self.reader = self.writer = None
+
+    async def post(self, body):
+        """POST ``body`` (bytes) and return ``(status, headers)``; the response body is drained."""
+        return await self.request('POST', body)
+
+    async def request(self, method, body=b''):
+        return await asyncio.wait_for(self._request(method, body), self.timeout)
+
+    async def _request(self, method, body):
+        if self.writer is None or self.writer.is_closing():
+            await self._open()
+        head = (f'{method} {self.target} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n')
+        self.writer.write(head.encode('latin-1') + body)
+        await self.writer.drain()
+        status, headers = await self._read_head()
+        while 100 <= status < 200:  # interim responses (100 Continue) precede the real one
+            status, headers = await self._read_head()
+        await self._drain_body(status, headers, method)
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, headers
+
+    async def _read_head(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('connection closed by server')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def _drain_body(self, status, headers, method):
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            return  # never has a body, whatever the headers say (RFC 9112 section 6.3)
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        else:
+            await self.reader.read()
+            await self.close()
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart."""
+
+    def __init__(self, rate=RATE):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_at = 0.0
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.next_at > now:
+            await asyncio.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+async def send_batches(dest, alerts, retries=RETRIES, timeout=TIMEOUT, rate=RATE):
+    """Send every batch for ``dest`` over one connection; returns a result record."""
+    conn = Connection(dest.url, timeout)
+    limiter = RateLimiter(rate)
+    result = {'destination': dest.name, 'messages': 0, 'failed': 0, 'attempts': 0}
+    try:
+        for payload in dest.payloads(alerts):
+            body = json.dumps(payload).encode('utf-8')
+            for attempt in range(retries + 1):
+                await limiter.wait()
+                result['attempts'] += 1
+                try:
+                    status, headers = await conn.post(body)
+                    if status in RETRY_STATUSES:
+                        raise HTTPError(status, headers.get('retry-after'))
+                    if status >= 400:
+                        result['failed'] += 1
+                        result['error'] = f'HTTP {status}'
+                        break
+                    result['messages'] += 1
+                    break
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, HTTPError) as e:
+                    if not isinstance(e, HTTPError):
+                        await conn.close()  # the response was not read completely; reconnect
+                    result['error'] = str(e) or type(e).__name__
+                    if attempt == retries:
+                        result['failed'] += 1
+                        break
+                    delay = BACKOFF * 2 ** attempt * (1 + random.random() / 2)
+                    if isinstance(e, HTTPError) and e.retry_after and e.retry_after.isdigit():
+                        delay = max(delay, float(e.retry_after))
+                    await asyncio.sleep(delay)
+    finally:
+        result['connections'] = conn.opened
+        await conn.close()
+    if not result['failed']:
+        result.pop('error', None)
+    return result
+
+async def dispatch_async(alerts, dests, deadline=DEADLINE):
+    tasks = [asyncio.create_task(send_batches(d, alerts)) for d in dests]
+    done, pending = await asyncio.wait(tasks, timeout=deadline) if tasks else (set(), set())
+    for t in pending:
+        t.cancel()
+    results = []
+    for dest, task in zip(dests, tasks):
+        if task in pending:
+            results.append({'destination': dest.name, 'error': f'deadline of {deadline}s exceeded'})
+        elif task.exception():
+            results.append({'destination': dest.name, 'error': repr(task.exception())})
+        else:
+            results.append(task.result())
+    return results
+
+def dispatch(alerts, dests=None, deadline=DEADLINE):
+    """Send ``alerts`` to every destination concurrently; returns one result per destination."""
+    dests = destinations() if dests is None else dests
+    if not alerts or not dests:
+        return []
+    with stage('alerts.dispatch', len(alerts) * len(dests)):
+        results = asyncio.run(dispatch_async(alerts, dests, deadline))
+    for r in results:
+        status = f"{r.get('messages', 0)} message(s) sent" + (f", {r['failed']} failed" if r.get('failed') else '')
+        print(f"Alerts -> {r['destination']}: {status}" + (f" ({r['error']})" if r.get('error') else ''))
+    return results
+
+def record(path, alerts, results):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'notify': bool(alerts), 'alerts': alerts, 'deliveries': results}, indent=2))
+
+@instrumented('alerts')
+def main(argv):
+    """``alerts.py [history_store] [legacy_json] [--dry-run]``"""
+    dry_run = '--dry-run' in argv
+    args = [a for a in argv[1:] if a != '--dry-run']
+    store = args[0] if args else HISTORY_STORE
+    legacy = args[1] if len(args) > 1 else HISTORY_PATH
+    if not Path(legacy).is_file() and not HistoryStore.exists(store):
+        print(f'Missing {store}; skipping.')
+        return 0
+    with stage('alerts.load', (BASELINE_RUNS + 1) * MAX_JOBS):
+        # Room for every matrix job's entry of the latest and the baseline workflow runs
+        recent = open_history(store, legacy).last((BASELINE_RUNS + 1) * MAX_JOBS)
+        clusters = FailureIndex(FAILURE_CLUSTER_DIR)
+        quarantined = assess(index_dirs())['newly_quarantined']
+    with stage('alerts.evaluate', len(RULES)):
+        alerts = evaluate(recent, clusters, quarantined)
+    if not alerts:
+        print('No alerts for the latest run.')
+        return 0
+    if dry_run:
+        for dest in destinations() or [Destination('stdout', '', 'slack')]:
+            for payload in dest.payloads(alerts):
+                print(f'-- {dest.name}:', json.dumps(payload, indent=2))
+        return 0
+    if not destinations():
+        print('Alerts due but no SLACK_WEBHOOK_URL / ALERT_WEBHOOKS provided:')
+        print(format_text(alerts))
+        return 0
+    dispatch(alerts)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Index of per-attempt test artifacts (traces, videos, screenshots).
+
+Artifact files are named ``<SimpleClass>_<method>-attempt<N>-<yyyyMMddHHmmss>.<ext>``
+by ``BaseTest`` and ``ScreenshotOnFailureExtension``. Class names may themselves contain
+``_``, so the class/method split is the longest prefix naming a class found in the test
+sources (the first ``_`` when none does). The index is built once per
+scan of ``combined/artifacts/{traces,videos,screenshots}``. It maps
+``(class, method)`` and then attempt to the matching files with their size and SHA-256, so
+every attempt of a failed test resolves with a dict lookup. Names that do not follow
+the convention stay reachable through a sorted name list searched with ``bisect``
+for prefix matches.
+
+The index is persisted as ``index.json`` beside the artifacts (replaced atomically, so
+a concurrent reader never sees a partial file); checksums of files whose size and
+mtime are unchanged are reused from it instead of being re-hashed.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ARTIFACTS_DIR = Path('combined/artifacts')
+KINDS = {'traces': '*.zip', 'videos': '*.webm', 'screenshots': '*.png'}
+NAME = re.compile(r'^(?P<cls>[A-Za-z0-9$]+)_(?P<method>.+)-attempt(?P<attempt>\d+)-(?P<ts>\d{14})\.[^.]+$')
+TEST_SOURCES = Path('src/test/java')
+HASH_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+
+def sha256_file(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def known_classes(src=TEST_SOURCES):
+    """Simple names of the classes in the test sources (empty when they are not checked out)."""
+    return {p.stem for p in src.rglob('*.java')} if src.exists() else set()
+
+def parse_name(name, classes=()):
+    """Return ``(class, method, attempt, timestamp)`` for a conventional artifact name, else None."""
+    m = NAME.match(name)
+    if not m:
+        return None
+    cls, method = m.group('cls'), m.group('method')
+    if classes:
+        # The regex splits at the first '_'; move the split right while a longer prefix is a known class
+        stem = f'{cls}_{method}'
+        i = stem.find('_', len(cls) + 1)
+        while i != -1:
+            if stem[:i] in classes:
+                cls, method = stem[:i], stem[i + 1:]
+            i = stem.find('_', i + 1)
+    return cls, method, int(m.group('attempt')), m.group('ts')
+
+class ArtifactIndex:
+    def __init__(self, root=ARTIFACTS_DIR, entries=None, classes=None):
+        self.root = Path(root)
+        self.entries = entries or []
+        self.classes = known_classes() if classes is None else classes
+        self.by_test = {}
+        self.names = []
+        self._build()
+
+    def _build(self):
+        for entry in self.entries:
+            parsed = parse_name(entry['name'], self.classes)
+            if parsed:
+                cls, method, attempt, _ = parsed
+                kinds = self.by_test.setdefault((cls, method), {}).setdefault(attempt, {})
+                kinds.setdefault(entry['kind'], []).append(entry)
+        for attempts in self.by_test.values():
+            for kinds in attempts.values():
+                for files in kinds.values():
+                    files.sort(key=lambda e: e['name'])
+        self.names = sorted((e['name'], i) for i, e in enumerate(self.entries))
+
+    @classmethod
+    def scan(cls, root=ARTIFACTS_DIR, checksums=True):
+        """Walk the artifact tree, reusing checksums from a previous index.json when files are unchanged."""
+        root = Path(root)
+        previous = {}
+        try:
+            previous = {e['path']: e for e in json.loads((root / 'index.json').read_text())['entries']}
+        except Exception:
+            pass
+        entries = []
+        to_hash = []
+        for kind, pattern in KINDS.items():
+            kind_dir = root / kind
+            if not kind_dir.exists():
+                continue
+            with os.scandir(kind_dir) as it:
+                for de in it:
+                    if not de.is_file() or not Path(de.name).match(pattern):
+                        continue
+                    st = de.stat()
+                    rel = f'{kind}/{de.name}'
+                    entry = {'kind': kind, 'name': de.name, 'path': rel, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': None}
+                    old = previous.get(rel)
+                    if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+                        entry['sha256'] = old.get('sha256')
+                    if checksums and not entry['sha256']:
+                        to_hash.append(entry)
+                    entries.append(entry)
+        if to_hash:
+            with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+                for entry, digest in zip(to_hash, pool.map(lambda e: sha256_file(root / e['path']), to_hash)):
+                    entry['sha256'] = digest
+        entries.sort(key=lambda e: e['path'])
+        return cls(root, entries)
+
+    @classmethod
+    def load(cls, root=ARTIFACTS_DIR):
+        root = Path(root)
+        return cls(root, json.loads((root / 'index.json').read_text())['entries'])
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / 'index.json.tmp'
+        tmp.write_text(json.dumps({'version': 1, 'entries': self.entries}, separators=(',', ':')))
+        os.replace(tmp, self.root / 'index.json')
+
+    def attempts(self, cls, method):
+        """Map attempt number -> {kind: [entries]} for one test (``cls`` may be fully qualified)."""
+        return self.by_test.get((cls.split('.')[-1] if cls else cls, method), {})
+
+    def resolve(self, cls, method, attempt):
+        return self.attempts(cls, method).get(attempt, {})
+
+    def with_prefix(self, prefix):
+        """Entries whose file name starts with ``prefix`` (for names outside the convention)."""
+        i = bisect_left(self.names, (prefix, -1))
+        out = []
+        while i < len(self.names) and self.names[i][0].startswith(prefix):
+            out.append(self.entries[self.names[i][1]])
+            i += 1
+        return out
+
+def main(argv):
+    root = Path(argv[1]) if len(argv) > 1 else ARTIFACTS_DIR
+    index = ArtifactIndex.scan(root)
+    index.save()
+    print(f'Indexed {len(index.entries)} artifact(s) for {len(index.by_test)} test(s) in {root}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
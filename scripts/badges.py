@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Shields.io endpoint badge JSON for the latest run.
+
+Produces ``flaky-badge.json``, ``failure-badge.json``, ``stability-badge.json`` and
+``retry-badge.json`` with the same messages and color thresholds the workflow's
+former inline shell steps used (see "Badge Color Thresholds" in the README). Given a
+flakiness model report (``flakiness.py``) with at least one index past
+``FLAKY_MIN_RUNS``, the flaky badge counts the model's confidently flaky tests
+instead of the latest run's candidates, and ``quarantine-badge.json`` counts
+quarantined tests (``n/a`` until then).
+"""
+import json
+import sys
+from pathlib import Path
+
+from flakiness import assess, index_dirs
+from history_store import open_history
+
+BADGES_DIR = Path('site/badges')
+
+def badge(label, message, color):
+    return {'schemaVersion': 1, 'label': label, 'message': message, 'color': color}
+
+def build_badges(latest, flakiness=None):
+    """Map badge file name -> badge payload for one history entry (``{}`` when there is no history)."""
+    latest = latest or {}
+    model = bool(flakiness and flakiness.get('indexes'))
+    flaky = flakiness['flaky_count'] if model else len(latest.get('flaky_candidates', []))
+    flaky_color = 'green' if flaky == 0 else 'yellow' if flaky <= 3 else 'red'
+
+    summary = latest.get('summary', {})
+    total, failed = summary.get('total', 0), summary.get('failed', 0)
+    fail_rate = f'{(failed / total) * 100:.1f}' if total > 0 else '0.0'
+    rint = int(float(fail_rate))
+    fail_color = 'green' if rint <= 2 else 'yellow' if rint <= 10 else 'red'
+
+    score = max(0.0, min(100.0, 100.0 - float(fail_rate)))
+    sint = int(score)
+    stability_color = 'green' if sint >= 98 else 'yellow' if sint >= 90 else 'red'
+
+    recovery = latest.get('retry_stats', {}).get('recovery_rate', 0.0)
+    recovery_int = int(float(recovery))
+    recovery_color = 'green' if recovery_int >= 80 else 'yellow' if recovery_int >= 50 else 'red'
+
+    badges = {
+        'flaky-badge.json': badge('flaky', str(flaky), flaky_color),
+        'failure-badge.json': badge('fail rate', f'{fail_rate}%', fail_color),
+        'stability-badge.json': badge('stability', f'{score:.1f}', stability_color),
+        'retry-badge.json': badge('retry recovery', f'{recovery}%', recovery_color),
+    }
+    if model:
+        quarantined = flakiness['quarantine_count']
+        badges['quarantine-badge.json'] = badge('quarantined', str(quarantined), 'green' if quarantined == 0 else 'orange')
+    else:
+        badges['quarantine-badge.json'] = badge('quarantined', 'n/a', 'lightgrey')
+    return badges
+
+def write_badges(latest, out_dir=BADGES_DIR, flakiness=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    badges = build_badges(latest, flakiness)
+    for name, payload in badges.items():
+        (out_dir / name).write_text(json.dumps(payload, separators=(',', ':')) + '\n')
+        print(f"{name}: {payload['message']} (color={payload['color']})")
+    return badges
+
+def main(argv):
+    """``badges.py [history_store] [legacy_json] [out_dir]``"""
+    history = open_history(argv[1] if len(argv) > 1 else 'combined/flaky-history',
+                           argv[2] if len(argv) > 2 else 'combined/flaky-history.json')
+    write_badges(history.get(-1) if len(history) else {}, argv[3] if len(argv) > 3 else BADGES_DIR, assess(index_dirs()))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""Deterministic synthetic inputs for the reporting-script benchmarks.
+
+Every generator takes an explicit ``random.Random`` seeded from the scale's seed,
+so the same scale always produces byte-identical data (timestamps derive from a
+fixed epoch, not the clock). Layout produced under ``<out>/``::
+
+    target/surefire-reports/TEST-*.xml   one report per test class
+    target/retry-attempts.jsonl          attempt log for the retried tests
+    target/flaky-history/                single-shard history store (trends input)
+    combined/history/shard-<k>/          per-shard stores for the merge/pipeline
+    combined/flaky-history/              merged store (dashboard input)
+    combined/artifacts/{traces,videos,screenshots}/   conventionally named files; traces
+                                         are Playwright-format zips (actions, network, snapshots)
+    target/test-index/                   test index with duration costs (planner)
+    src/test/java/...                    test sources matching the test classes
+
+Standard library only; runs offline.
+"""
+import hashlib
+import json
+import random
+import sys
+import zipfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from history_store import HistoryStore  # noqa: E402
+from test_index import STATUS_CODES, TestIndex  # noqa: E402
+
+SCALES = {
+    'small': {'tests': 1000, 'classes': 100, 'runs': 200, 'shards': 4, 'artifacts': 200, 'seed': 1},
+    'medium': {'tests': 10000, 'classes': 500, 'runs': 5000, 'shards': 6, 'artifacts': 2000, 'seed': 2},
+    'large': {'tests': 100000, 'classes': 2500, 'runs': 50000, 'shards': 6, 'artifacts': 10000, 'seed': 3},
+}
+# Bump when generated content changes, so cached benchmark datasets are rebuilt
+DATA_VERSION = 2
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+FAIL_RATE = 0.02
+SKIP_RATE = 0.03
+RETRY_RATE = 0.05
+# Failed tests recorded per history run, capped so huge suites keep realistic entry sizes
+HISTORY_FAILURES = 40
+ERRORS = [
+    ('com.microsoft.playwright.TimeoutError', 'Timeout {n}ms exceeded.\nCall log:\n  - waiting for locator("#{sel}")'),
+    ('org.opentest4j.AssertionFailedError', 'expected: <{sel}> but was: <{sel}-{n}>'),
+    ('com.microsoft.playwright.PlaywrightException', 'net::ERR_CONNECTION_RESET at http://localhost:{n}/{sel}?t={n}'),
+    ('java.lang.NullPointerException', 'Cannot invoke "Page.{sel}()" because "page" is null'),
+]
+SELECTORS = ['login', 'submit', 'search', 'cart', 'checkout', 'profile', 'logout', 'menu']
+
+def test_names(scale):
+    """``[(class, method)]`` for the scale, spread evenly over its classes."""
+    per_class = max(1, scale['tests'] // scale['classes'])
+    return [(f"com.example.bench.pkg{c % 20}.Bench{c:05d}Test", f"test{m:03d}")
+            for c in range(scale['classes']) for m in range(per_class)][:scale['tests']]
+
+def failure_text(rng, cls, method):
+    exc, template = rng.choice(ERRORS)
+    msg = template.format(n=rng.randint(1, 60000), sel=rng.choice(SELECTORS))
+    simple = cls.rsplit('.', 1)[1]
+    trace = (f"{exc}: {msg}\n\tat com.example.bench.pages.{rng.choice(SELECTORS).title()}Page.act({rng.choice(SELECTORS).title()}Page.java:{rng.randint(10, 400)})\n"
+             f"\tat {cls}.{method}({simple}.java:{rng.randint(10, 200)})\n"
+             f"\tat java.base/jdk.internal.reflect.DirectMethodHandleAccessor.invoke(DirectMethodHandleAccessor.java:103)\n")
+    return exc, msg, trace
+
+def xml_escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+def surefire_reports(out, scale, rng):
+    report_dir = out / 'target/surefire-reports'
+    report_dir.mkdir(parents=True, exist_ok=True)
+    by_class = {}
+    for cls, method in test_names(scale):
+        by_class.setdefault(cls, []).append(method)
+    for cls, methods in by_class.items():
+        cases = []
+        for method in methods:
+            r = rng.random()
+            body = ''
+            if r < FAIL_RATE:
+                exc, msg, trace = failure_text(rng, cls, method)
+                body = f'<failure message="{xml_escape(msg)}" type="{exc}">{xml_escape(trace)}</failure>'
+            elif r < FAIL_RATE + SKIP_RATE:
+                body = '<skipped/>'
+            out_text = 'INFO step ok\n' * rng.randint(0, 20)
+            cases.append(f'  <testcase name="{method}" classname="{cls}" time="{rng.uniform(0.05, 12):.3f}">{body}'
+                         f'<system-out><![CDATA[{out_text}]]></system-out></testcase>')
+        (report_dir / f'TEST-{cls}.xml').write_text(
+            f'<?xml version="1.0" encoding="UTF-8"?>\n<testsuite name="{cls}" tests="{len(methods)}">\n'
+            '  <properties><property name="browser" value="chromium"/></properties>\n'
+            + '\n'.join(cases) + '\n</testsuite>\n')
+
+def retry_log(out, scale, rng):
+    path = out / 'target/retry-attempts.jsonl'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    ts = EPOCH
+    with open(path, 'w') as f:
+        for cls, method in test_names(scale):
+            attempts = rng.randint(2, 3) if rng.random() < RETRY_RATE else 1
+            for attempt in range(1, attempts + 1):
+                ts += timedelta(seconds=rng.uniform(0.1, 8))
+                success = attempt == attempts and (attempts == 1 or rng.random() < 0.7)
+                error = None if success else rng.choice(ERRORS)[0].rsplit('.', 1)[1]
+                f.write(json.dumps({'timestamp': ts.isoformat().replace('+00:00', 'Z'), 'class': cls, 'method': method,
+                                    'attempt': attempt, 'maxRetries': 2, 'success': success, 'errorType': error}) + '\n')
+
+def history_entry(rng, names, run):
+    failed = rng.sample(names, min(len(names), rng.randint(0, HISTORY_FAILURES)))
+    flaky = rng.sample(names, min(len(names), rng.randint(0, 3)))
+    failed_tests = []
+    for cls, method in failed:
+        exc, msg, _ = failure_text(rng, cls, method)
+        failure = {'type': exc, 'cause': None, 'message': msg, 'frames': [f'{cls}.{method}({cls.rsplit(".", 1)[1]}.java)']}
+        failed_tests.append({'class': cls, 'name': method, 'artifact_prefix': f"{cls.rsplit('.', 1)[1]}_{method}",
+                             'fingerprint': hashlib.sha256(f'{exc}:{cls}:{method}'.encode()).hexdigest()[:16], 'failure': failure})
+    retried = rng.randint(0, 20)
+    recovered = rng.randint(0, retried)
+    return {
+        'timestamp': (EPOCH + timedelta(minutes=run * 30)).isoformat().replace('+00:00', 'Z'),
+        'summary': {'total': len(names), 'passed': len(names) - len(failed), 'failed': len(failed), 'skipped': 0},
+        'duration_seconds': round(rng.uniform(300, 3000), 3),
+        'failed_tests': failed_tests,
+        'flaky_candidates': [{'class': c, 'name': m, 'runs': [{'status': 'passed', 'failure_hash': None},
+                                                              {'status': 'failed', 'failure_hash': 'abc123def0'}]}
+                             for c, m in flaky],
+        'retry_stats': {'retried_tests': retried, 'recovered_tests': recovered,
+                        'recovery_rate': round(recovered / retried * 100, 2) if retried else 0.0},
+        'flaky_passes': [],
+    }
+
+def histories(out, scale, rng):
+    names = test_names(scale)
+    single = HistoryStore(out / 'target/flaky-history')
+    merged = HistoryStore(out / 'combined/flaky-history')
+    shards = [HistoryStore(out / f'combined/history/shard-{k}/flaky-history') for k in range(scale['shards'])]
+    for run in range(scale['runs']):
+        entry = history_entry(rng, names, run)
+        single.append(entry)
+        merged.append(entry)
+        shards[run % len(shards)].append(entry)
+
+def artifacts(out, scale, rng):
+    root = out / 'combined/artifacts'
+    kinds = {'traces': 'zip', 'videos': 'webm', 'screenshots': 'png'}
+    for kind in kinds:
+        (root / kind).mkdir(parents=True, exist_ok=True)
+    names = test_names(scale)
+    for i in range(scale['artifacts']):
+        cls, method = names[rng.randrange(len(names))]
+        kind = list(kinds)[i % 3]
+        stamp = (EPOCH + timedelta(seconds=i)).strftime('%Y%m%d%H%M%S')
+        name = f"{cls.rsplit('.', 1)[1]}_{method}-attempt{rng.randint(1, 3)}-{stamp}.{kinds[kind]}"
+        if kind == 'traces':
+            write_trace(root / kind / name, rng)
+        else:
+            (root / kind / name).write_bytes(rng.randbytes(rng.randint(512, 8192)))
+
+ACTIONS = ['locator.click', 'locator.fill', 'page.goto', 'page.waitForLoadState', 'locator.waitFor',
+           'locator.textContent', 'page.waitForURL', 'locator.isVisible']
+
+def write_trace(path, rng, actions=40):
+    """A trace zip in Playwright's v7 layout: ``trace.trace`` action/snapshot events and ``trace.network``."""
+    events = [{'type': 'context-options', 'version': 7, 'browserName': 'chromium'}]
+    network = []
+    t = 1000.0
+    for call in range(actions):
+        api = rng.choice(ACTIONS)
+        params = {'url': f'http://localhost:8080/{rng.choice(SELECTORS)}?t={call}'} if api in ('page.goto', 'page.waitForURL') \
+            else {'selector': f'#{rng.choice(SELECTORS)}'}
+        duration = rng.expovariate(1 / 150)
+        if rng.random() < 0.02:
+            duration = 30000.0  # timeout
+        events.append({'type': 'before', 'callId': f'call@{call}', 'startTime': t, 'apiName': api,
+                       'class': 'Frame', 'method': api.split('.')[1], 'params': params})
+        events.append({'type': 'frame-snapshot', 'snapshot': {'callId': f'call@{call}', 'html': ['DIV', {}, 'x' * rng.randint(200, 4000)]}})
+        after = {'type': 'after', 'callId': f'call@{call}', 'endTime': t + duration}
+        if duration >= 30000:
+            after['error'] = {'message': f'Timeout {int(duration)}ms exceeded.', 'name': 'TimeoutError'}
+        events.append(after)
+        for _ in range(rng.randint(0, 3)):
+            network.append({'type': 'resource-snapshot', 'snapshot': {
+                'request': {'method': rng.choice(['GET', 'GET', 'POST']), 'url': f'http://localhost:8080/api/{rng.choice(SELECTORS)}?id={call}'},
+                'response': {'status': rng.choice([200, 200, 200, 304, 500])}, 'time': round(rng.expovariate(1 / 80), 3)}})
+        t += duration + rng.uniform(1, 20)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for member, lines in (('trace.trace', events), ('trace.network', network)):
+            # Fixed member timestamps keep the archive byte-identical across generations
+            zf.writestr(zipfile.ZipInfo(member, date_time=(2024, 1, 1, 0, 0, 0)),
+                        ''.join(json.dumps(e, separators=(',', ':')) + '\n' for e in lines), zipfile.ZIP_DEFLATED)
+
+def test_index(out, scale, rng, runs=20):
+    index = TestIndex(out / 'target/test-index')
+    names = test_names(scale)
+    for run in range(runs):
+        obs = {}
+        for cls, method in names:
+            status = STATUS_CODES['failed'] if rng.random() < FAIL_RATE else STATUS_CODES['passed']
+            obs[f'{cls}::{method}'] = (status, None, rng.uniform(0.05, 12))
+        index.add_run(run, obs)
+    index.save()
+
+def test_sources(out, scale):
+    src = out / 'src/test/java'
+    by_class = {}
+    for cls, method in test_names(scale):
+        by_class.setdefault(cls, []).append(method)
+    for cls, methods in by_class.items():
+        path = src / Path(*cls.split('.')).with_suffix('.java')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        body = ''.join(f'    @Test void {m}() {{}}\n' for m in methods)
+        path.write_text(f"package {cls.rsplit('.', 1)[0]};\n\nclass {cls.rsplit('.', 1)[1]} {{\n{body}}}\n")
+
+GENERATORS = {
+    'surefire': surefire_reports,
+    'retry': retry_log,
+    'history': histories,
+    'artifacts': artifacts,
+    'test_index': test_index,
+}
+
+def generate(out, scale, parts=None):
+    """Generate the requested parts (all by default) for ``scale`` under ``out``."""
+    out = Path(out)
+    for name, fn in GENERATORS.items():
+        if parts and name not in parts:
+            continue
+        # One independent stream per part: adding a part never changes the others' data
+        fn(out, scale, random.Random(f"{scale['seed']}:{name}"))
+    if not parts or 'test_index' in parts:
+        test_sources(out, scale)
+    return out
+
+def scale_from_args(name, tests=None, runs=None):
+    scale = dict(SCALES[name])
+    if tests:
+        scale['tests'] = tests
+        scale['classes'] = max(1, tests // 10)
+    if runs:
+        scale['runs'] = runs
+    return scale
+
+def main(argv):
+    """``generate_data.py <out_dir> [small|medium|large] [tests] [runs]``"""
+    if len(argv) < 2:
+        print(main.__doc__)
+        return 2
+    scale = scale_from_args(argv[2] if len(argv) > 2 else 'small',
+                            int(argv[3]) if len(argv) > 3 else None, int(argv[4]) if len(argv) > 4 else None)
+    generate(argv[1], scale)
+    print(f"Generated {scale} under {argv[1]}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
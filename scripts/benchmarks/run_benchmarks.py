@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Time and memory-profile the reporting scripts against synthetic data.
+
+Each benchmark runs one script from ``scripts/`` as a fresh subprocess in a
+scratch copy of the generated inputs it needs (copying is not timed). Wall time,
+CPU time (user + sys) and peak RSS come from ``os.wait4``, so worker processes
+the script reaps are included. Every benchmark is repeated; the fastest wall/CPU
+time (like ``timeit``: slower repeats only add scheduler noise) and the maximum
+RSS are reported and compared with ``baselines.json``:
+
+* CPU time regresses when, relative to a fixed pure-Python calibration loop timed
+  before the run, it exceeds the baseline's ratio x ``time`` threshold and the
+  difference is above ``MIN_SECONDS`` (noise floor). Comparing CPU ratios rather
+  than wall times keeps the gate meaningful on a slower or busier machine than the
+  one that recorded the baseline;
+* peak RSS regresses when it exceeds baseline x ``rss`` threshold and the
+  difference is above ``MIN_RSS_MB``.
+
+The exit status is 1 when anything regressed or failed. ``--update`` records the
+measured values and the calibration time as the new baseline for the scale;
+``small``, ``medium`` and ``large`` all have one. Generated datasets are kept
+under ``--data`` and reused while the scale parameters are unchanged. Runs fully
+offline; only the scripts themselves need their usual dependencies (NumPy for the
+trend-related ones). ``--json`` output also carries each script's per-stage wall
+times from its ``target/stage-metrics.json`` (see ``stage_metrics.py``).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from generate_data import DATA_VERSION, SCALES, generate, scale_from_args
+
+HERE = Path(__file__).resolve().parent
+SCRIPTS = HERE.parent
+BASELINES = HERE / 'baselines.json'
+DATA_DIR = HERE / '.data'
+MIN_SECONDS = 0.1
+MIN_RSS_MB = 5.0
+DEFAULT_THRESHOLDS = {'time': 1.30, 'rss': 1.20}
+CALIBRATION_LOOPS = 2_000_000
+
+PART_PATHS = {
+    'surefire': ['target/surefire-reports'],
+    'retry': ['target/retry-attempts.jsonl'],
+    'history': ['target/flaky-history', 'combined/history', 'combined/flaky-history'],
+    'artifacts': ['combined/artifacts'],
+    'test_index': ['target/test-index', 'src/test/java'],
+}
+
+class Benchmark:
+    def __init__(self, script, args=(), parts=(), env=None, warmup=False):
+        self.script = script
+        self.args = list(args)
+        self.parts = parts
+        self.env = env or {}
+        # Run once untimed in the same workdir first (e.g. to measure a warm cache)
+        self.warmup = warmup
+
+BENCHMARKS = {
+    'surefire_summary_cold': Benchmark('surefire_summary.py', parts=('surefire', 'retry'), env={'SUREFIRE_CACHE_DIR': ''}),
+    'surefire_summary_warm': Benchmark('surefire_summary.py', parts=('surefire', 'retry'), warmup=True),
+    'retry_analysis': Benchmark('retry_analysis.py', ['target/retry-attempts.jsonl'], parts=('retry',)),
+    'merge_flaky_histories': Benchmark('merge_flaky_histories.py', parts=('history',)),
+    'generate_trends': Benchmark('generate_trends.py', parts=('history',)),
+    'generate_dashboard': Benchmark('generate_dashboard.py', parts=('history', 'artifacts')),
+    'report_pipeline': Benchmark('report_pipeline.py', parts=('history', 'artifacts')),
+    'artifact_index': Benchmark('artifact_index.py', ['combined/artifacts'], parts=('artifacts',)),
+    'trace_analysis': Benchmark('trace_analysis.py', ['combined/artifacts', 'target/trace-hotspots.json', '--all'], parts=('artifacts',)),
+    'failure_clusters': Benchmark('failure_fingerprint.py', ['combined/flaky-history', '', '20'], parts=('history',)),
+    'shard_planner': Benchmark('shard_planner.py', ['8'], parts=('test_index',)),
+}
+
+def dataset(scale, data_dir=DATA_DIR):
+    """Generated inputs for ``scale``, reusing an existing copy with identical parameters."""
+    key = f'v{DATA_VERSION}-' + '-'.join(f'{k}{scale[k]}' for k in sorted(scale))
+    root = data_dir / key
+    if not (root / '.complete').exists():
+        if root.exists():
+            shutil.rmtree(root)
+        print(f'Generating dataset {key} ...', flush=True)
+        started = time.perf_counter()
+        # In a spawned process: forked benchmark children would otherwise start out
+        # with (and report as peak RSS) the memory the generator left in this one
+        proc = multiprocessing.get_context('spawn').Process(target=generate, args=(root, scale))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            raise SystemExit(f'Generating dataset {key} failed (exit code {proc.exitcode})')
+        (root / '.complete').write_text(json.dumps(scale))
+        print(f'  done in {time.perf_counter() - started:.1f}s', flush=True)
+    return root
+
+def prepare(bench, data, work):
+    for part in bench.parts:
+        for rel in PART_PATHS[part]:
+            src, dst = data / rel, work / rel
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            if src.is_dir():
+                shutil.copytree(src, dst)
+            elif src.exists():
+                shutil.copy2(src, dst)
+
+def bench_env(bench):
+    env = {k: v for k, v in os.environ.items() if k != 'SLACK_WEBHOOK_URL'}
+    env['PYTHONHASHSEED'] = '0'
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    env.update(bench.env)
+    return env
+
+def run_once(bench, work, env):
+    """Run the script once in ``work``; returns (wall seconds, cpu seconds, peak RSS MB, exit code)."""
+    with open(work / 'bench.log', 'ab') as log:
+        started = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, str(SCRIPTS / bench.script), *bench.args],
+                                cwd=work, env=env, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - started
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return wall, usage.ru_utime + usage.ru_stime, usage.ru_maxrss / 1024, proc.returncode
+
+def measure(name, bench, data, repeat):
+    walls, cpus, rss = [], [], []
+    stages = {}
+    env = bench_env(bench)
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix=f'bench-{name}-') as tmp:
+            work = Path(tmp)
+            prepare(bench, data, work)
+            if bench.warmup:
+                run_once(bench, work, env)
+            wall, cpu, peak, code = run_once(bench, work, env)
+            if code != 0:
+                tail = (work / 'bench.log').read_text(errors='replace')[-2000:]
+                return {'error': f'exit code {code}', 'log': tail}
+            walls.append(wall)
+            cpus.append(cpu)
+            rss.append(peak)
+            metrics = work / 'target/stage-metrics.json'
+            if metrics.exists():
+                for script in json.loads(metrics.read_text())['scripts'].values():
+                    for st in script['stages']:
+                        stages[st['stage']] = min(st['wall_s'], stages.get(st['stage'], st['wall_s']))
+    return {'wall_s': round(min(walls), 4), 'cpu_s': round(min(cpus), 4),
+            'max_rss_mb': round(max(rss), 1), 'stages': stages}
+
+def calibrate(repeat=5):
+    """Best CPU seconds of a fixed interpreter-bound loop, the unit baselines are compared in."""
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        total = 0
+        for i in range(CALIBRATION_LOOPS):
+            total += i * i % 7
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4)
+
+def expected_cpu(base, calibration, base_calibration):
+    """The baseline CPU time scaled to this machine's calibration speed."""
+    return base['cpu_s'] * calibration / base_calibration if base_calibration else base['cpu_s']
+
+def compare(result, base, thresholds, calibration=None, base_calibration=None):
+    if 'error' in result:
+        return 'error'
+    if not base:
+        return 'new'
+    expected = expected_cpu(base, calibration, base_calibration)
+    slower = result['cpu_s'] > expected * thresholds['time'] and result['cpu_s'] - expected > MIN_SECONDS
+    bigger = result['max_rss_mb'] > base['max_rss_mb'] * thresholds['rss'] and result['max_rss_mb'] - base['max_rss_mb'] > MIN_RSS_MB
+    if slower or bigger:
+        return 'REGRESSED' + (' (time)' if slower else '') + (' (rss)' if bigger else '')
+    if result['cpu_s'] * thresholds['time'] < expected:
+        return 'improved'
+    return 'ok'
+
+def load_baselines(path=BASELINES):
+    if path.exists():
+        return json.loads(path.read_text())
+    return {'version': 1, 'thresholds': dict(DEFAULT_THRESHOLDS), 'calibration': {}, 'scales': {}}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', default='small', choices=sorted(SCALES))
+    parser.add_argument('--tests', type=int, help='override the scale test count')
+    parser.add_argument('--runs', type=int, help='override the scale history run count')
+    parser.add_argument('--only', help='comma-separated benchmark names')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--data', type=Path, default=DATA_DIR, help='dataset cache directory')
+    parser.add_argument('--update', action='store_true', help='write results as the baseline for this scale')
+    parser.add_argument('--json', type=Path, help='also write results to this file')
+    args = parser.parse_args(argv)
+
+    scale = scale_from_args(args.scale, args.tests, args.runs)
+    # Overridden scales get their own baseline key so they never compare against the preset
+    scale_key = args.scale if scale == SCALES[args.scale] else f"{args.scale}-t{scale['tests']}-r{scale['runs']}"
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    data = dataset(scale, args.data)
+    baselines = load_baselines()
+    thresholds = baselines.get('thresholds', DEFAULT_THRESHOLDS)
+    base_scale = baselines['scales'].get(scale_key, {})
+    base_calibration = baselines.get('calibration', {}).get(scale_key)
+    calibration = calibrate()
+    print(f'Calibration loop: {calibration:.4f} cpu s (baseline {base_calibration or "-"})')
+
+    results = {}
+    failed = False
+    # ``base cpu`` is the baseline CPU time scaled to this machine's calibration
+    print(f"{'benchmark':<24} {'wall s':>9} {'cpu s':>9} {'rss MB':>8} {'base cpu':>9} {'base MB':>8}  status")
+    for name in names:
+        result = measure(name, BENCHMARKS[name], data, args.repeat)
+        base = base_scale.get(name)
+        status = compare(result, base, thresholds, calibration, base_calibration)
+        failed |= status == 'error' or status.startswith('REGRESSED')
+        results[name] = dict(result, status=status)
+        if 'error' in result:
+            print(f'{name:<24} {"-":>9} {"-":>9} {"-":>8} {"-":>9} {"-":>8}  {status}: {result["error"]}')
+            print('    ' + result['log'].strip().replace('\n', '\n    '))
+            continue
+        print(f"{name:<24} {result['wall_s']:>9.3f} {result['cpu_s']:>9.3f} {result['max_rss_mb']:>8.1f} "
+              f"{round(expected_cpu(base, calibration, base_calibration), 4) if base else '-':>9} "
+              f"{base['max_rss_mb'] if base else '-':>8}  {status}")
+
+    if args.json:
+        args.json.write_text(json.dumps({'scale': scale_key, 'params': scale, 'calibration_s': calibration,
+                                         'results': results}, indent=2))
+    if args.update:
+        measured = {n: {k: r[k] for k in ('wall_s', 'cpu_s', 'max_rss_mb')} for n, r in results.items() if 'error' not in r}
+        if base_calibration and not set(base_scale) <= set(measured):
+            # Partial update: keep one calibration per scale by rescaling the new values to it
+            for m in measured.values():
+                m['cpu_s'] = round(m['cpu_s'] * base_calibration / calibration, 4)
+        else:
+            baselines.setdefault('calibration', {})[scale_key] = calibration
+        baselines['scales'].setdefault(scale_key, {}).update(measured)
+        baselines['scales'][scale_key] = dict(sorted(baselines['scales'][scale_key].items()))
+        BASELINES.write_text(json.dumps(baselines, indent=2) + '\n')
+        print(f'Updated {BASELINES.name} for scale {scale_key}')
+        return 0
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Pre-aggregated, multi-resolution chart data for the trends page and dashboard.
+
+``write_chart_data`` emits one compact JSON file per resolution into a directory:
+
+    run.json     per-run series, LTTB-downsampled to at most MAX_POINTS points
+                 (change points are always kept)
+    day.json     per-UTC-day aggregates
+    week.json    per-ISO-week (Monday start) aggregates
+    recent.json  the newest RECENT_RUNS runs at full resolution (dashboard sparklines)
+    index.json   available resolutions and their point counts
+
+Pages fetch only the resolution they display, so page weight no longer grows with
+history length.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from trend_stats import DEFAULT_ALPHA, DEFAULT_WINDOW, change_points, compute_trends, ewma, rolling_mean
+
+MAX_POINTS = int(os.environ.get('TRENDS_MAX_POINTS', '500'))
+RECENT_RUNS = 20
+
+def lttb_indices(y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` points preserving the shape of ``y``."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    x = np.arange(n, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    idx = np.empty(threshold, dtype=np.int64)
+    idx[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        idx[i + 1] = a
+    idx[-1] = n - 1
+    return idx
+
+def select(series, indices, keys):
+    return {k: [series[k][i] for i in indices] for k in keys}
+
+RUN_KEYS = ('run', 'timestamp', 'total', 'failed', 'flaky', 'failure_rate', 'failure_rate_mean',
+            'failure_rate_ewma', 'failed_mean', 'flaky_mean', 'failure_rate_change')
+
+def per_run(trends, max_points=MAX_POINTS):
+    n = len(trends['run'])
+    indices = lttb_indices(trends['failure_rate'], max_points)
+    changes = np.flatnonzero(trends['failure_rate_change'])
+    indices = np.union1d(indices, changes).tolist()
+    data = select(trends, indices, RUN_KEYS + tuple(k for k in trends if k.startswith('failure_rate_p')))
+    data['label'] = data.pop('run')
+    data['downsampled'] = len(indices) < n
+    data['source_points'] = n
+    return data
+
+def per_period(cols, unit, window=DEFAULT_WINDOW, alpha=DEFAULT_ALPHA):
+    """Aggregate runs into calendar buckets: 'D' (UTC day) or 'W' (ISO week starting Monday)."""
+    ts = cols['timestamp']
+    valid = np.char.str_len(ts) >= 10
+    if not valid.any():
+        return {'label': [], 'runs': [], 'total': [], 'failed': [], 'flaky': [], 'flaky_max': [],
+                'failure_rate': [], 'failure_rate_mean': [], 'failure_rate_ewma': [], 'failure_rate_change': []}
+    days = ts[valid].astype('U10').astype('datetime64[D]')
+    if unit == 'W':
+        # datetime64 weeks start on Thursday (the epoch); shift by 3 days for Monday-based weeks
+        days = (days + np.timedelta64(3, 'D')).astype('datetime64[W]').astype('datetime64[D]') - np.timedelta64(3, 'D')
+    periods, inverse = np.unique(days, return_inverse=True)
+    runs = np.bincount(inverse)
+    failed = np.bincount(inverse, weights=cols['failed'][valid])
+    total = np.bincount(inverse, weights=cols['total'][valid])
+    flaky = np.bincount(inverse, weights=cols['flaky'][valid])
+    flaky_max = np.zeros(len(periods), dtype=np.int64)
+    np.maximum.at(flaky_max, inverse, cols['flaky'][valid])
+    failure_rate = np.round(failed / np.maximum(1, total) * 100, 2)
+    return {
+        'label': [str(p) for p in periods],
+        'runs': runs.tolist(),
+        'total': total.astype(np.int64).tolist(),
+        'failed': failed.astype(np.int64).tolist(),
+        'flaky': np.round(flaky / runs, 2).tolist(),
+        'flaky_max': flaky_max.tolist(),
+        'failure_rate': failure_rate.tolist(),
+        'failure_rate_mean': np.round(rolling_mean(failure_rate, window), 2).tolist(),
+        'failure_rate_ewma': np.round(ewma(failure_rate, alpha), 2).tolist(),
+        'failure_rate_change': change_points(failure_rate, window).tolist(),
+    }
+
+def recent(trends, n=RECENT_RUNS):
+    data = {k: trends[k][-n:] for k in RUN_KEYS}
+    data['label'] = data.pop('run')
+    return data
+
+def build_chart_data(cols, trends=None):
+    trends = trends or compute_trends(cols)
+    return {
+        'run': per_run(trends),
+        'day': per_period(cols, 'D'),
+        'week': per_period(cols, 'W'),
+        'recent': recent(trends),
+    }
+
+def write_chart_data(out_dir, cols, trends=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    resolutions = build_chart_data(cols, trends)
+    index = {'params': (trends or {}).get('params', {'window': DEFAULT_WINDOW, 'alpha': DEFAULT_ALPHA}), 'resolutions': {}}
+    for name, data in resolutions.items():
+        (out_dir / f'{name}.json').write_text(json.dumps(data, separators=(',', ':')))
+        index['resolutions'][name] = len(data['label'])
+    (out_dir / 'index.json').write_text(json.dumps(index, separators=(',', ':')))
+    return index
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Normalized failure fingerprints and near-duplicate failure clustering.
+
+``normalize_failure`` reduces a Surefire ``<failure>``/``<error>`` to its stable
+parts: the exception type (and root ``Caused by`` type), the message with volatile
+tokens (numbers, timeouts, hex ids, element handles, timestamps, UUIDs, URL query
+strings) replaced by placeholders and Playwright call logs de-duplicated, and the
+top application stack frames without line numbers. ``fingerprint`` hashes that
+normalized form, so line shifts or different timeout values no longer split a root
+cause.
+
+``FailureIndex`` groups fingerprints that are still merely similar (a different
+selector, an extra call-log line) with MinHash signatures over message and frame
+shingles and a banded LSH table: a new fingerprint is only compared, once each, with
+the clusters sharing at least one band bucket, never pairwise with the whole history.
+The work per new fingerprint is bounded: a bucket keeps at most ``BUCKET_CAP``
+clusters (its earliest, which already represent that region) and only the
+``MAX_CANDIDATES`` clusters sharing the most buckets are scored.
+The exception and cause types are part of the bucket key rather than the signature,
+so failures of one type are not pulled into the same buckets by their shared type
+alone, and failures of different types never cluster together. Known fingerprints resolve
+with one dict lookup, so re-feeding hundreds of thousands of historical failures
+costs a hash per failure plus one MinHash per distinct fingerprint. Cluster ids are
+the fingerprint of the cluster's first member.
+
+Pure Python (no NumPy) so it also runs in the test job.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+
+INDEX_VERSION = 2
+FAILURE_CLUSTER_DIR = Path(os.environ.get('FAILURE_CLUSTER_DIR', 'target/failure-clusters'))
+# Estimated Jaccard similarity needed to join an existing cluster
+SIMILARITY = float(os.environ.get('FAILURE_CLUSTER_SIMILARITY', '0.6'))
+NUM_PERM = 64
+BANDS, ROWS = 16, 4  # BANDS * ROWS == NUM_PERM; candidate threshold ~ (1/BANDS) ** (1/ROWS) = 0.5
+# Per-lookup work bounds: clusters kept per band bucket, and candidates scored (most shared bands first)
+BUCKET_CAP = int(os.environ.get('FAILURE_CLUSTER_BUCKET_CAP', '32'))
+MAX_CANDIDATES = int(os.environ.get('FAILURE_CLUSTER_CANDIDATES', '16'))
+TOP_FRAMES = 5
+MAX_MESSAGE = 300
+MAX_CALL_LOG = 8
+
+_MERSENNE = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+
+FRAME = re.compile(r'^\s*at\s+(?:[\w.]+/)*([\w$.<>]+)\(([^)]*)\)')
+CAUSED_BY = re.compile(r'^Caused by:\s*([\w$.]+)')
+PLAYWRIGHT_HEAD = re.compile(r"^\s*message='")
+PLAYWRIGHT_TAIL = ("  name='", "name='", "  stack='", "stack='")
+FRAMEWORK_PREFIXES = (
+    'java.', 'javax.', 'jdk.', 'sun.', 'com.sun.', 'org.junit.', 'org.opentest4j.',
+    'org.apache.maven.', 'org.assertj.', 'org.hamcrest.', 'com.microsoft.playwright.impl.',
+    'io.qameta.allure.',
+)
+VOLATILE = [
+    (re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'), '<ts>'),
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<uuid>'),
+    (re.compile(r'\b0x[0-9a-fA-F]+\b'), '<hex>'),
+    (re.compile(r'((?:JS|Element)Handle)@[\w-]+'), r'\1@<id>'),
+    (re.compile(r'@[0-9a-fA-F]{5,}\b'), '@<id>'),
+    (re.compile(r'(https?://[^\s\'"?#]+)[?#][^\s\'"]*'), r'\1'),
+    (re.compile(r'\d+(?:\.\d+)?'), '<n>'),
+    (re.compile(r'[ \t]+'), ' '),
+]
+
+def _scrub(text):
+    for pattern, repl in VOLATILE:
+        text = pattern.sub(repl, text)
+    return text.strip()
+
+def _frame(method, location):
+    method = re.sub(r'\$\$Lambda\$?[^.(]*', '$$Lambda', method)
+    method = re.sub(r'lambda\$(\w+)\$\d+', r'lambda$\1', method)
+    return f"{method}({location.split(':')[0]})"
+
+def normalize_failure(type_attr, message_attr, text):
+    """Stable ``{type, cause, message, frames}`` for one failure element (all strings are normalized)."""
+    text = text or ''
+    lines = text.splitlines()
+    exc_type = (type_attr or '').strip()
+    if not exc_type and lines:
+        exc_type = lines[0].split(':', 1)[0].strip()
+    message = message_attr
+    if message is None:
+        # No message attribute: take the text up to the first stack frame, minus the "Type: " prefix
+        head = []
+        for line in lines:
+            if FRAME.match(line):
+                break
+            head.append(line)
+        message = '\n'.join(head)
+        if exc_type and message.startswith(exc_type):
+            message = message[len(exc_type):].lstrip(': ')
+    msg_lines = []
+    call_log = 0
+    for line in message.splitlines():
+        if line.startswith(PLAYWRIGHT_TAIL):
+            break  # Playwright's "Error { message=... name=... stack=... }" wrapper: the rest repeats the message
+        line = _scrub(PLAYWRIGHT_HEAD.sub('', line))
+        if not line or line == 'Error {' or (msg_lines and msg_lines[-1] == line):
+            continue  # blank or repeated (e.g. "retrying click action, attempt #<n>")
+        if line.startswith('- '):
+            call_log += 1
+            if call_log > MAX_CALL_LOG:
+                continue
+        msg_lines.append(line)
+    frames, app_frames, cause = [], [], None
+    for line in lines:
+        m = FRAME.match(line)
+        if m:
+            frame = _frame(m.group(1), m.group(2))
+            if len(frames) < TOP_FRAMES:
+                frames.append(frame)
+            if len(app_frames) < TOP_FRAMES and not m.group(1).startswith(FRAMEWORK_PREFIXES):
+                app_frames.append(frame)
+            continue
+        c = CAUSED_BY.match(line.strip())
+        if c:
+            cause = c.group(1)
+    return {
+        'type': exc_type,
+        'cause': cause,
+        'message': '\n'.join(msg_lines)[:MAX_MESSAGE],
+        'frames': app_frames or frames,
+    }
+
+def fingerprint(failure):
+    key = '\n'.join([failure.get('type') or '', failure.get('cause') or '', failure.get('message') or '', *failure.get('frames', [])])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+def shingles(failure):
+    tokens = re.findall(r"[\w<>$#.'-]+", failure.get('message') or '')
+    out = {' '.join(tokens[i:i + 3]) for i in range(max(1, len(tokens) - 2))}
+    out.update(f'frame:{f}' for f in failure.get('frames', []))
+    return out
+
+def minhash(features):
+    hashes = [int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest(), 'little') for f in features] or [0]
+    return [min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMS]
+
+def similarity(sig_a, sig_b):
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+def _bands(sig, kind):
+    return [(kind, b, hash(tuple(sig[b * ROWS:(b + 1) * ROWS]))) for b in range(BANDS)]
+
+def _kind(failure):
+    return failure.get('type') or '', failure.get('cause') or ''
+
+class FailureIndex:
+    def __init__(self, root=None, threshold=SIMILARITY):
+        self.root = Path(root) if root else None
+        self.threshold = threshold
+        self.clusters = {}
+        self.by_fingerprint = {}
+        self.buckets = {}
+        if self.root and (self.root / 'index.json').exists():
+            data = json.loads((self.root / 'index.json').read_text())
+            if data.get('version') == INDEX_VERSION:
+                self.by_fingerprint = data['fingerprints']
+                for c in data['clusters']:
+                    c['tests'] = set(c['tests'])
+                    self.clusters[c['id']] = c
+                    self._bucket(c)
+
+    def _bucket(self, cluster):
+        for band in _bands(cluster['signature'], _kind(cluster)):
+            members = self.buckets.setdefault(band, [])
+            if len(members) < BUCKET_CAP:
+                members.append(cluster['id'])
+
+    def assign(self, failure, test=None, seen=None, fp=None):
+        """Return the cluster id for one normalized failure, creating a cluster when nothing is similar."""
+        fp = fp or fingerprint(failure)
+        cid = self.by_fingerprint.get(fp)
+        if cid is None:
+            sig = minhash(shingles(failure))
+            shared = Counter()
+            for band in _bands(sig, _kind(failure)):
+                shared.update(self.buckets.get(band, ()))
+            best, best_sim = None, self.threshold
+            for candidate, _ in sorted(shared.items(), key=lambda kv: (-kv[1], kv[0]))[:MAX_CANDIDATES]:
+                sim = similarity(sig, self.clusters[candidate]['signature'])
+                if sim > best_sim or (sim == best_sim and best is None):
+                    best, best_sim = candidate, sim
+            if best is None:
+                cid = fp
+                self.clusters[cid] = {
+                    'id': cid, 'type': failure.get('type'), 'cause': failure.get('cause'),
+                    'message': (failure.get('message') or '').split('\n', 1)[0],
+                    'frame': (failure.get('frames') or [None])[0], 'signature': sig,
+                    'count': 0, 'fingerprints': 0, 'tests': set(), 'first_seen': seen, 'last_seen': seen,
+                }
+                self._bucket(self.clusters[cid])
+            else:
+                cid = best
+            self.by_fingerprint[fp] = cid
+            self.clusters[cid]['fingerprints'] += 1
+        cluster = self.clusters[cid]
+        cluster['count'] += 1
+        if test:
+            cluster['tests'].add(test)
+        if seen:
+            cluster['first_seen'] = min(cluster['first_seen'] or seen, seen)
+            cluster['last_seen'] = max(cluster['last_seen'] or seen, seen)
+        return cid
+
+    def summary(self, limit=None):
+        """Clusters by descending occurrence count, without signatures."""
+        ranked = sorted(self.clusters.values(), key=lambda c: (-c['count'], c['id']))
+        return [
+            {k: (sorted(v) if k == 'tests' else v) for k, v in c.items() if k != 'signature'}
+            for c in ranked[:limit]
+        ]
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        clusters = [dict(c, tests=sorted(c['tests'])) for c in self.clusters.values()]
+        tmp = self.root / 'index.tmp'
+        tmp.write_text(json.dumps({'version': INDEX_VERSION, 'fingerprints': self.by_fingerprint, 'clusters': clusters}, separators=(',', ':')))
+        os.replace(tmp, self.root / 'index.json')
+
+def cluster_history(entries, index=None):
+    """Feed every fingerprinted failed test of ``entries`` into ``index`` (a new in-memory one by default)."""
+    index = index or FailureIndex()
+    for entry in entries:
+        feed_entry(index, entry)
+    return index
+
+def feed_entry(index, entry):
+    for ft in entry.get('failed_tests', []):
+        if ft.get('failure'):
+            index.assign(ft['failure'], f"{ft.get('class')}::{ft.get('name')}", entry.get('timestamp'), ft.get('fingerprint'))
+
+def main(argv):
+    """``failure_fingerprint.py <history_store> [legacy_json] [limit]``: print the largest failure clusters."""
+    from history_store import open_history
+    if len(argv) < 2:
+        print(main.__doc__)
+        return 2
+    index = cluster_history(open_history(argv[1], argv[2] if len(argv) > 2 else None))
+    print(json.dumps(index.summary(int(argv[3]) if len(argv) > 3 else 20), indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Confidence-ranked flaky and quarantine lists from the online flakiness model.
+
+The model's sufficient statistics live in the test index summary columns (see
+``test_index.py``) and are updated in O(1) per test per run, so ranking never reads
+the observation log or the history: each index contributes one pass over its
+fixed-width stat arrays. In CI every matrix job has its own index (one per
+browser/headed combination); a test is assessed in each and keeps its worst
+environment, since a test flaky on one browser is flaky.
+
+* ``flaky``      - tests whose flip probability lower bound (``FLAKY_Z``) is at least
+  ``FLAKY_MIN_RATE``, highest bound first
+* ``quarantine`` - tests the index has marked quarantined (bound reached
+  ``QUARANTINE_RATE``), with ``newly_quarantined`` those that entered it in their
+  index's latest run
+
+An index joins the assessment once it holds ``FLAKY_MIN_RUNS`` runs (its most observed
+test's observation count); younger ones are listed under ``pending``. With no index
+ready, ``indexes`` is empty and the badges and dashboard fall back to the latest run's
+flaky candidates.
+
+Indexes are ``FLAKY_TEST_INDEXES`` (glob patterns separated by ``os.pathsep``,
+default ``TEST_INDEX_DIR`` or ``target/test-index``)::
+
+    python3 scripts/flakiness.py [out_json] [index_dir...]
+"""
+import glob
+import json
+import os
+import sys
+from pathlib import Path
+
+from stage_metrics import instrumented, stage
+from test_index import NONE, QUARANTINE_RATE, TestIndex, flip_bounds
+
+MIN_RATE = float(os.environ.get('FLAKY_MIN_RATE', '0.05'))
+MIN_RUNS = int(os.environ.get('FLAKY_MIN_RUNS', '5'))
+TEST_INDEXES = os.environ.get('FLAKY_TEST_INDEXES', os.environ.get('TEST_INDEX_DIR', 'target/test-index'))
+OUT = Path('combined/flakiness.json')
+MAX_LISTED = 200
+
+def index_dirs(patterns=TEST_INDEXES):
+    return sorted({d for p in patterns.split(os.pathsep) if p for d in glob.glob(p) if Path(d, 'keys.txt').exists()})
+
+def _label(d):
+    # artifacts/<job>/target/test-index -> <job>
+    parts = Path(d).parts
+    return parts[-3] if len(parts) >= 3 and parts[-2] == 'target' else str(d)
+
+def assess(dirs, min_rate=MIN_RATE, limit=MAX_LISTED, min_runs=MIN_RUNS):
+    """Rank every test of the given indexes by its flip probability lower bound."""
+    worst = {}
+    newly = set()
+    quarantined = set()
+    ready = []
+    pending = []
+    for d in dirs:
+        index = TestIndex(d)
+        s = index.stats
+        runs = max(s['observations'], default=0)
+        if runs < min_runs:
+            pending.append({'index': str(d), 'runs': runs})
+            continue
+        ready.append(d)
+        latest = max((r for r in s['last_run'] if r != NONE), default=None)
+        label = _label(d)
+        for tid, (a, b, since) in enumerate(zip(s['flip_a'], s['flip_b'], s['quarantined'])):
+            if not a and since == NONE:
+                continue  # never flipped (or fully decayed): cannot rank above the prior
+            mean, lower = flip_bounds(a, b)
+            key = index.keys[tid]
+            if since != NONE:
+                quarantined.add(key)
+                if since == latest:
+                    newly.add(key)
+            current = worst.get(key)
+            if current is None or lower > current['confidence']:
+                worst[key] = {
+                    'test': key,
+                    'confidence': round(lower, 4),
+                    'flip_probability': round(mean, 4),
+                    'flip_ewma': round(s['flip_ewma'][tid], 4),
+                    'evidence': round(a + b, 1),
+                    'last_flip': None if s['last_flip'][tid] == NONE else s['last_flip'][tid],
+                    'quarantined_since': None if since == NONE else since,
+                    'index': label,
+                }
+    ranked = sorted(worst.values(), key=lambda r: (-r['confidence'], -r['flip_ewma'], r['test']))
+    flaky = [r for r in ranked if r['confidence'] >= min_rate]
+    quarantine = [r for r in ranked if r['test'] in quarantined]
+    return {
+        'indexes': [str(d) for d in ready],
+        'pending': pending,
+        'min_runs': min_runs,
+        'min_rate': min_rate,
+        'quarantine_rate': QUARANTINE_RATE,
+        'flaky_count': len(flaky),
+        'quarantine_count': len(quarantine),
+        'flaky': flaky[:limit],
+        'quarantine': quarantine[:limit],
+        'newly_quarantined': sorted(newly),
+    }
+
+def write_report(report, out=OUT):
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    return out
+
+@instrumented('flakiness')
+def main(argv):
+    """``flakiness.py [out_json] [index_dir...]``"""
+    out = Path(argv[1]) if len(argv) > 1 else OUT
+    dirs = argv[2:] or index_dirs()
+    with stage('flakiness.assess', len(dirs)):
+        report = assess(dirs)
+    write_report(report, out)
+    for r in report['flaky'][:10]:
+        flag = ' [quarantined]' if r['quarantined_since'] is not None else ''
+        print(f"{r['confidence']:>6.3f}  p={r['flip_probability']:.3f} ewma={r['flip_ewma']:.3f}  {r['test']} ({r['index']}){flag}")
+    print(f"{report['flaky_count']} flaky, {report['quarantine_count']} quarantined "
+          f"({len(report['newly_quarantined'])} new) across {len(report['indexes'])} index(es), "
+          f"{len(report['pending'])} with fewer than {report['min_runs']} runs -> {out}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,83 +1,38 @@
 #!/usr/bin/env python3
-import json, os, re, subprocess, datetime
+import os, datetime
 from pathlib import Path
 
+from artifact_index import ARTIFACTS_DIR, ArtifactIndex
+from failure_fingerprint import FAILURE_CLUSTER_DIR, FailureIndex, cluster_history
+from flakiness import assess, index_dirs
+from history_store import open_history
+from html_stream import PageTemplate, escape, list_items
+from stage_metrics import instrumented, stage
+from trend_stats import compute_trends
+
 HISTORY = Path('combined/flaky-history.json')
+HISTORY_STORE = Path('combined/flaky-history')
 BADGES_DIR = Path('site/badges')
 OUT = Path('site/index.html')
 
-def read_badge(name):
-    f = BADGES_DIR / name
-    if f.exists():
-        try:
-            return json.loads(f.read_text())
-        except Exception:
-            return None
-    return None
-
-def main():
-    BADGES_DIR.mkdir(parents=True, exist_ok=True)
-    history = []
-    if HISTORY.exists():
-        try:
-            history = json.loads(HISTORY.read_text())
-        except Exception:
-            history = []
-    latest = history[-1] if history else {}
-    summary = latest.get('summary', {})
-    flaky = len(latest.get('flaky_candidates', []))
-    fail_rate = 0.0
-    if summary.get('total'):
-        fail_rate = (summary.get('failed', 0) / summary.get('total', 1)) * 100
-    stability = 100 - fail_rate
-    retry_stats = latest.get('retry_stats', {})
-    flaky_passes = latest.get('flaky_passes', [])
-
-    flaky_badge = read_badge('flaky-badge.json')
-    failure_badge = read_badge('failure-badge.json')
-    stability_badge = read_badge('stability-badge.json')
-
-    # Build history table (last N runs)
-    last_n = history[-20:] if len(history) > 20 else history
-    rows = []
-    for idx, run in enumerate(last_n, start=len(history)-len(last_n)+1):
-        summ = run.get('summary', {})
-        fr = 0.0
-        if summ.get('total'):
-            fr = (summ.get('failed',0) / max(1, summ.get('total',1))) * 100
-        rows.append((idx, run.get('timestamp',''), summ.get('total',0), summ.get('failed',0), len(run.get('flaky_candidates', [])), f"{fr:.1f}%"))
-
-    import json as _json
-    failure_series = [r[3] for r in rows]
-    flaky_series = [r[4] for r in rows]
-    fail_rate_series = [float(r[5].rstrip('%')) for r in rows]
-    # Determine commit hash (short) if available
-    commit = os.environ.get('GITHUB_SHA', '')[:7]
-    allure_index = Path('site/allure/index.html')
-    allure_ts = ''
-    if allure_index.exists():
-        try:
-            mtime = datetime.datetime.utcfromtimestamp(allure_index.stat().st_mtime)
-            allure_ts = mtime.strftime('%Y-%m-%d %H:%M:%S UTC')
-        except Exception:
-            allure_ts = ''
-    html = f"""<!DOCTYPE html>
+# Page layout, compiled once; {{slot}} markers are filled by streaming emitters in write_dashboard()
+LAYOUT = PageTemplate("""<!DOCTYPE html>
 <html><head><meta charset='utf-8'/><title>Test Quality Dashboard</title>
 <link rel='preconnect' href='https://img.shields.io'>
 <style>
- body {{font-family: system-ui, Arial, sans-serif; margin: 20px;}}
- header {{display:flex; gap:1rem; flex-wrap:wrap; align-items:center;}}
- nav.breadcrumb {{font-size:14px; margin-top:4px;}}
- nav.breadcrumb a {{text-decoration:none; color:#0366d6;}}
- nav.breadcrumb span.sep {{color:#555; margin:0 4px;}}
- section {{margin-top:40px;}}
- code {{background:#f5f5f5; padding:2px 4px; border-radius:3px;}}
- .grid {{display:grid; gap:16px; grid-template-columns: repeat(auto-fit, minmax(260px,1fr));}}
- .card {{border:1px solid #ddd; border-radius:8px; padding:16px; background:#fff; box-shadow:0 1px 2px rgba(0,0,0,0.06);}}
- h2 {{margin-top:0;}}
- a.badge-link img {{vertical-align:middle;}}
- .sparkline {{ width:120px; height:30px; }}
- #historyFilter {{ margin-bottom:8px; padding:4px; }}
+ body {font-family: system-ui, Arial, sans-serif; margin: 20px;}
+ header {display:flex; gap:1rem; flex-wrap:wrap; align-items:center;}
+ nav.breadcrumb {font-size:14px; margin-top:4px;}
+ nav.breadcrumb a {text-decoration:none; color:#0366d6;}
+ nav.breadcrumb span.sep {color:#555; margin:0 4px;}
+ section {margin-top:40px;}
+ code {background:#f5f5f5; padding:2px 4px; border-radius:3px;}
+ .grid {display:grid; gap:16px; grid-template-columns: repeat(auto-fit, minmax(260px,1fr));}
+ .card {border:1px solid #ddd; border-radius:8px; padding:16px; background:#fff; box-shadow:0 1px 2px rgba(0,0,0,0.06);}
+ h2 {margin-top:0;}
+ a.badge-link img {vertical-align:middle;}
+ .sparkline { width:120px; height:30px; }
+ #historyFilter { margin-bottom:8px; padding:4px; }
 </style></head>
 <body>
 <header>
@@ -85,16 +40,16 @@ def main():
         <h1 style='margin:0;'>Test Quality Dashboard</h1>
         <nav class='breadcrumb'>
             <a href='./'>Dashboard</a><span class='sep'>/</span><a href='allure/'>Allure</a>
-            {f"<span class='sep'>|</span><span>Commit: {commit}</span>" if commit else ''}
-            {f"<span class='sep'>|</span><span>Allure: {allure_ts}</span>" if allure_ts else ''}
+            {{nav_extra}}
         </nav>
     </div>
   <a class='badge-link' href='extra/trends.html'><img src='badges/flaky-badge.json' alt='Flaky Count (JSON)' hidden></a>
-  <img src='https://img.shields.io/endpoint?url={os.environ.get('SITE_BASE','') + 'badges/flaky-badge.json'}' alt='Flaky'>
-  <img src='https://img.shields.io/endpoint?url={os.environ.get('SITE_BASE','') + 'badges/failure-badge.json'}' alt='Failure Rate'>
-  <img src='https://img.shields.io/endpoint?url={os.environ.get('SITE_BASE','') + 'badges/stability-badge.json'}' alt='Stability'>
+  <img src='https://img.shields.io/endpoint?url={{site_base}}badges/flaky-badge.json' alt='Flaky'>
+  <img src='https://img.shields.io/endpoint?url={{site_base}}badges/failure-badge.json' alt='Failure Rate'>
+  <img src='https://img.shields.io/endpoint?url={{site_base}}badges/stability-badge.json' alt='Stability'>
+  <img src='https://img.shields.io/endpoint?url={{site_base}}badges/quarantine-badge.json' alt='Quarantined'>
 </header>
-<p>Latest run summary: Total={summary.get('total',0)} Passed={summary.get('passed',0)} Failed={summary.get('failed',0)} Skipped={summary.get('skipped',0)} | Flaky={flaky} | Failure Rate={fail_rate:.1f}% | Stability={stability:.1f}</p>
+<p>{{latest_summary}}</p>
 <button id='toggleSparks' style='margin:4px 0;'>Hide Sparklines</button>
 <div id='sparkContainer'>
     <canvas id='sparkFailures' class='sparkline'></canvas>
@@ -126,84 +81,55 @@ def main():
 <section>
 <h2>Flaky Candidates (Latest)</h2>
 <ul>
-"""
-    for fc in latest.get('flaky_candidates', []):
-        html += f"<li>{fc.get('class')}::{fc.get('name')}</li>"
-    if not latest.get('flaky_candidates'):
-        html += "<li>None</li>"
-    html += """</ul>
+{{flaky_candidates}}</ul>
+</section>
+<section>
+<h2>Flaky Tests (Model)</h2>
+<p>{{flaky_model}}</p>
+<table border='1' cellpadding='4' cellspacing='0'>
+<thead><tr><th>Test</th><th>Confidence</th><th>Flip Prob.</th><th>Flip EWMA</th><th>Evidence</th><th>Last Flip</th><th>Quarantined Since</th><th>Index</th></tr></thead><tbody>
+{{flaky_rows}}</tbody></table>
 </section>
 <section>
 <h2>Recovered (Flaky Pass) Tests</h2>
 <ul>
-"""
-    for fp in flaky_passes:
-        html += f"<li>{fp.get('class')}::{fp.get('name')} (attempts={fp.get('attempts')})</li>"
-    if not flaky_passes:
-        html += "<li>None</li>"
-    html += """</ul>
+{{flaky_passes}}</ul>
 </section>
 <section>
 <h2>Retry Statistics</h2>
-<p>Retried tests: {retry_stats.get('retried_tests',0)} | Recovered: {retry_stats.get('recovered_tests',0)} | Recovery Rate: {retry_stats.get('recovery_rate',0)}%</p>
+<p>{{retry_stats}}</p>
 </section>
 <section>
-<h2>Recent Run History (Last {len(last_n)})</h2>
+<h2>Recent Run History (Last {{history_window}})</h2>
 <input id='historyFilter' type='text' placeholder='Filter (substring)...'/>
 <table id='historyTable' border='1' cellpadding='4' cellspacing='0'>
 <thead><tr><th>#</th><th>Timestamp (UTC)</th><th>Total</th><th>Failed</th><th>Flaky</th><th>Fail %</th></tr></thead><tbody>
-"""
-    for r in rows:
-        html += f"<tr><td>{r[0]}</td><td>{r[1]}</td><td>{r[2]}</td><td>{r[3]}</td><td>{r[4]}</td><td>{r[5]}</td></tr>"
-    if not rows:
-        html += "<tr><td colspan='6'>No history</td></tr>"
-    html += """</tbody></table>
+{{history_rows}}</tbody></table>
+</section>
+<section>
+<h2>Failure Clusters (All History)</h2>
+<p>Failures grouped by normalized fingerprint and near-duplicate similarity; showing the {{cluster_window}} largest of {{cluster_total}}.</p>
+<table border='1' cellpadding='4' cellspacing='0'>
+<thead><tr><th>Cluster</th><th>Occurrences</th><th>Tests</th><th>Last Seen</th><th>Error</th><th>Top Frame</th></tr></thead><tbody>
+{{cluster_rows}}</tbody></table>
 </section>
 <section>
 <h2>Failed Test Artifacts (Latest)</h2>
 <ul>
-"""
-    # Attempt to map failed tests to trace artifacts heuristically (by index order)
-    traces_dir = Path('combined/artifacts/traces')
-    videos_dir = Path('combined/artifacts/videos')
-    trace_files = {p.name: p for p in traces_dir.glob('*.zip')} if traces_dir.exists() else {}
-    video_files = {p.name: p for p in videos_dir.glob('*.webm')} if videos_dir.exists() else {}
-    failed_tests = latest.get('failed_tests', [])
-    grouped = {}
-    for ft in failed_tests:
-        ap = ft.get('artifact_prefix', '')
-        base = ap.split('-attempt')[0] if '-attempt' in ap else ap
-        grouped.setdefault(base, []).append(ap)
-    for base, attempts in grouped.items():
-        html += f"<li>{base}"
-        attempt_links = []
-        for ap in sorted(attempts):
-            t = next((n for n in trace_files.keys() if n.startswith(ap)), None)
-            v = next((n for n in video_files.keys() if n.startswith(ap)), None)
-            parts = []
-            if t:
-                parts.append(f"<a href='artifacts/traces/{t}'>trace</a>")
-            if v:
-                parts.append(f"<a href='artifacts/videos/{v}'>video</a>")
-            label = ap.split('-attempt')[-1] if '-attempt' in ap else '1'
-            attempt_links.append(f"attempt {label}: " + (', '.join(parts) if parts else 'no artifacts'))
-        html += "<ul><li>" + "</li><li>".join(attempt_links) + "</li></ul></li>"
-    if not grouped:
-        html += "<li>None</li>"
-    html += """</ul>
+{{failed_artifacts}}</ul>
 </section>
-<footer style='margin-top:60px;font-size:12px;color:#666;'>Generated dashboard. History length = {len(history)}.</footer>
+<footer style='margin-top:60px;font-size:12px;color:#666;'>Generated dashboard. History length = {{history_length}}.</footer>
 </body>
 <script src='https://cdn.jsdelivr.net/npm/chart.js'></script>
 <script>
-const failureSeries = {_json.dumps(failure_series)};
-const flakySeries = {_json.dumps(flaky_series)};
-const failRateSeries = {_json.dumps(fail_rate_series)};
 function spark(ctxId, data, color){
     new Chart(document.getElementById(ctxId).getContext('2d'), {type:'line', data:{labels:data.map((_,i)=>i+1), datasets:[{data, borderColor:color, tension:0.3, pointRadius:0}]}, options:{plugins:{legend:{display:false}}, scales:{x:{display:false},y:{display:false}}});}
-spark('sparkFailures', failureSeries, '#d33');
-spark('sparkFlaky', flakySeries, '#f90');
-spark('sparkFailRate', failRateSeries, '#36c');
+// Sparkline series are pre-aggregated by generate_trends.py and loaded lazily
+fetch('extra/trends-data/recent.json').then(r => r.json()).then(d => {
+    spark('sparkFailures', d.failed, '#d33');
+    spark('sparkFlaky', d.flaky, '#f90');
+    spark('sparkFailRate', d.failure_rate, '#36c');
+}).catch(() => { document.getElementById('sparkContainer').style.display='none'; });
 document.getElementById('toggleSparks').addEventListener('click', ()=>{
     const c = document.getElementById('sparkContainer');
     const btn = document.getElementById('toggleSparks');
@@ -216,11 +142,187 @@ document.getElementById('historyFilter').addEventListener('input', e => {
     rows.forEach(r=>{ r.style.display = q && !r.innerText.toLowerCase().includes(q) ? 'none':'table-row'; });
 });
 </script>
-</html>"""
+</html>""")
+
+def test_label(entry):
+    return escape(f"{entry.get('class')}::{entry.get('name')}")
+
+def history_rows(rows):
+    seen = False
+    for r in rows:
+        seen = True
+        yield '<tr>' + ''.join(f'<td>{escape(str(v))}</td>' for v in r) + '</tr>'
+    if not seen:
+        yield "<tr><td colspan='6'>No history</td></tr>"
 
-    OUT.parent.mkdir(parents=True, exist_ok=True)
-    OUT.write_text(html)
-    print('Dashboard written to', OUT)
+def retry_summary(stats):
+    text = f"Retried tests: {stats.get('retried_tests',0)} | Recovered: {stats.get('recovered_tests',0)} | Recovery Rate: {stats.get('recovery_rate',0)}%"
+    if 'retry_seconds' in stats:
+        text += f" | Retry time: {stats['retry_seconds']:.1f}s (wasted {stats.get('wasted_retry_seconds', 0):.1f}s)"
+    by_error = stats.get('by_error_type') or {}
+    if by_error:
+        text += '<br/>By first error: ' + ', '.join(
+            f"{escape(et)} {b['recovered']}/{b['retried']} ({b['recovery_rate']}%)" for et, b in by_error.items())
+    return text
+
+MAX_CLUSTERS = 20
+MAX_FLAKY = 25
+
+def flaky_model_summary(report):
+    if not report.get('indexes'):
+        pending = report.get('pending', [])
+        if pending:
+            return (f"Collecting runs: no test index has {report['min_runs']} runs yet "
+                    f"(most: {max(p['runs'] for p in pending)}); flaky tests are only detected within a run (candidates above).")
+        return 'No test index available; flaky tests are only detected within a run (candidates above).'
+    return (f"{report['flaky_count']} flaky (flip probability lower bound &ge; {report['min_rate']:.0%}), "
+            f"{report['quarantine_count']} quarantined (bound &ge; {report['quarantine_rate']:.0%}) across "
+            f"{len(report['indexes'])} index(es); showing the {MAX_FLAKY} most confident. "
+            f"<a href='extra/flakiness.json'>Full lists</a>")
+
+def flaky_rows(rows):
+    seen = False
+    for r in rows:
+        seen = True
+        cells = (r['test'], f"{r['confidence']:.3f}", f"{r['flip_probability']:.3f}", f"{r['flip_ewma']:.3f}",
+                 r['evidence'], r['last_flip'], r['quarantined_since'] if r['quarantined_since'] is not None else '',
+                 r['index'])
+        yield '<tr>' + ''.join(f'<td>{escape(str(v))}</td>' for v in cells) + '</tr>'
+    if not seen:
+        yield "<tr><td colspan='8'>No flaky tests</td></tr>"
+
+def cluster_rows(clusters):
+    seen = False
+    for c in clusters:
+        seen = True
+        error = f"{c['type']}: {c['message']}" if c.get('message') else c['type']
+        yield (f"<tr><td><code>{escape(c['id'])}</code></td><td>{c['count']}</td><td title='{escape(', '.join(c['tests']))}'>{len(c['tests'])}</td>"
+               f"<td>{escape(str(c.get('last_seen') or ''))}</td><td>{escape(error or '')}</td><td><code>{escape(c.get('frame') or '')}</code></td></tr>")
+    if not seen:
+        yield "<tr><td colspan='6'>No fingerprinted failures</td></tr>"
+
+ARTIFACT_LABELS = (('traces', 'trace'), ('videos', 'video'), ('screenshots', 'screenshot'))
+
+def artifact_links(kinds):
+    parts = []
+    for kind, label in ARTIFACT_LABELS:
+        files = kinds.get(kind, [])
+        for j, e in enumerate(files, start=1):
+            text = f"{label} {j}" if len(files) > 1 else label
+            parts.append(f"<a href='artifacts/{escape(e['path'])}' title='{e['size']} bytes'>{text}</a>")
+    return ', '.join(parts) if parts else 'no artifacts'
+
+def failed_artifacts(failed_tests, index):
+    """Emit one list item per failed test with links to each attempt's trace/video/screenshot."""
+    grouped = {}
+    for ft in failed_tests:
+        grouped.setdefault((ft.get('class') or '', ft.get('name') or ''), ft.get('artifact_prefix', ''))
+    for (cls, name), prefix in grouped.items():
+        attempts = index.attempts(cls, name)
+        if attempts:
+            attempt_links = [f"attempt {n}: {artifact_links(attempts[n])}" for n in sorted(attempts)]
+        else:
+            # Files outside the naming convention: fall back to a prefix lookup
+            kinds = {}
+            for e in index.with_prefix(prefix) if prefix else []:
+                kinds.setdefault(e['kind'], []).append(e)
+            attempt_links = [f"attempt 1: {artifact_links(kinds)}"]
+        base = prefix.split('-attempt')[0] if prefix else f"{cls.split('.')[-1]}_{name}"
+        yield f"<li>{escape(base)}<ul><li>" + "</li><li>".join(attempt_links) + "</li></ul></li>"
+    if not grouped:
+        yield "<li>None</li>"
+
+def write_dashboard(recent, history_length, out=OUT, clusters=None, flakiness=None, artifacts=None):
+    """Render the dashboard from the most recent history entries (latest last), a FailureIndex and a flakiness report.
+
+    ``artifacts`` is an ArtifactIndex built by the caller; without one the artifact tree is
+    scanned and the index saved here.
+    """
+    clusters = clusters or FailureIndex()
+    flakiness = flakiness or {}
+    latest = recent[-1] if recent else {}
+    summary = latest.get('summary', {})
+    flaky = len(latest.get('flaky_candidates', []))
+    fail_rate = 0.0
+    if summary.get('total'):
+        fail_rate = (summary.get('failed', 0) / summary.get('total', 1)) * 100
+    stability = 100 - fail_rate
+    retry_stats = latest.get('retry_stats', {})
+    flaky_passes = latest.get('flaky_passes', [])
+
+    # Build history table (last N runs)
+    last_n = recent[-20:]
+    trends = compute_trends(last_n)
+    first_idx = history_length - len(last_n) + 1
+    rows = [
+        (first_idx + i, ts, total, failed_count, flaky_count, f"{fr:.1f}%")
+        for i, (ts, total, failed_count, flaky_count, fr) in enumerate(zip(
+            trends['timestamp'], trends['total'], trends['failed'], trends['flaky'], trends['failure_rate']))
+    ]
+
+    # Determine commit hash (short) if available
+    commit = os.environ.get('GITHUB_SHA', '')[:7]
+    allure_index = Path('site/allure/index.html')
+    allure_ts = ''
+    if allure_index.exists():
+        try:
+            mtime = datetime.datetime.utcfromtimestamp(allure_index.stat().st_mtime)
+            allure_ts = mtime.strftime('%Y-%m-%d %H:%M:%S UTC')
+        except Exception:
+            allure_ts = ''
+    nav_extra = ''.join([
+        f"<span class='sep'>|</span><span>Commit: {escape(commit)}</span>" if commit else '',
+        f"<span class='sep'>|</span><span>Allure: {allure_ts}</span>" if allure_ts else '',
+    ])
+
+    # Index artifacts once; index.json is reused by later runs and other consumers
+    if artifacts is None:
+        with stage('dashboard.artifacts') as st:
+            artifacts = ArtifactIndex.scan(ARTIFACTS_DIR)
+            st.items = len(artifacts.entries)
+            if artifacts.entries:
+                artifacts.save()
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with stage('dashboard.render', len(recent)), open(out, 'w', encoding='utf-8') as fh:
+        LAYOUT.render_to(
+            fh,
+            nav_extra=nav_extra,
+            site_base=escape(os.environ.get('SITE_BASE', '')),
+            latest_summary=(f"Latest run summary: Total={summary.get('total',0)} Passed={summary.get('passed',0)} Failed={summary.get('failed',0)} Skipped={summary.get('skipped',0)}"
+                            f" | Flaky={flaky} | Failure Rate={fail_rate:.1f}% | Stability={stability:.1f}"),
+            flaky_candidates=list_items(latest.get('flaky_candidates', []), test_label),
+            flaky_model=flaky_model_summary(flakiness),
+            flaky_rows=lambda: flaky_rows(flakiness.get('flaky', [])[:MAX_FLAKY]),
+            flaky_passes=list_items(flaky_passes, lambda fp: f"{test_label(fp)} (attempts={escape(str(fp.get('attempts')))})"),
+            retry_stats=retry_summary(retry_stats),
+            history_window=str(len(last_n)),
+            history_rows=history_rows(rows),
+            cluster_window=str(min(MAX_CLUSTERS, len(clusters.clusters))),
+            cluster_total=str(len(clusters.clusters)),
+            cluster_rows=lambda: cluster_rows(clusters.summary(MAX_CLUSTERS)),
+            failed_artifacts=lambda: failed_artifacts(latest.get('failed_tests', []), artifacts),
+            history_length=str(history_length),
+        )
+    print('Dashboard written to', out)
+
+@instrumented('generate_dashboard')
+def main():
+    BADGES_DIR.mkdir(parents=True, exist_ok=True)
+    with stage('dashboard.load_history') as st:
+        history = open_history(HISTORY_STORE, HISTORY)
+        recent = history.last(20)
+        st.items = len(recent)
+    with stage('dashboard.clusters') as st:
+        # Persisted by surefire_summary run by run; only re-clustered when it is missing
+        clusters = FailureIndex(FAILURE_CLUSTER_DIR)
+        if not clusters.clusters:
+            cluster_history(history, clusters)
+        st.items = len(clusters.clusters)
+    with stage('dashboard.flakiness') as st:
+        flakiness = assess(index_dirs())
+        st.items = len(flakiness['indexes'])
+    write_dashboard(recent, len(history), OUT, clusters, flakiness)
 
 if __name__ == '__main__':
     main()
@@ -2,58 +2,105 @@
 import json, sys
 from pathlib import Path
 
-history_file = Path('target/flaky-history.json')
-if not history_file.exists():
-    print('No history file found, skipping trends.')
-    sys.exit(0)
+from chart_data import write_chart_data
+from history_store import HistoryStore, open_history
+from stage_metrics import instrumented, stage
+from trend_stats import compute_trends, load_columns
 
-data = json.loads(history_file.read_text())
-# Build arrays for chart
-points = list(range(1, len(data)+1))
-failed = [run['summary']['failed'] for run in data]
-totals = [max(1, run['summary'].get('total', 0)) for run in data]
-failure_rates = [round((f/t)*100, 2) for f, t in zip(failed, totals)]
-flaky_counts = [len(run.get('flaky_candidates', [])) for run in data]
+HISTORY = Path('target/flaky-history.json')
+HISTORY_STORE = Path('target/flaky-history')
+OUT_DIR = Path('target')
 
-html = f"""
+def write_trends(cols, out_dir=OUT_DIR):
+    """Write ``trends.html`` and the pre-aggregated ``trends-data/`` chart files for ``cols``."""
+    out_dir = Path(out_dir)
+    with stage('trends.compute', len(cols)):
+        trends = compute_trends(cols)
+    data_dir = out_dir / 'trends-data'
+    with stage('trends.chart_data', len(cols)):
+        index = write_chart_data(data_dir, cols, trends)
+    out = out_dir / 'trends.html'
+    with stage('trends.render', 1):
+        out.write_text(trends_page(trends, index))
+    print('Wrote', out, 'and', data_dir)
+    return trends
+
+def trends_page(trends, index):
+    window = trends['params']['window']
+    return f"""
 <!DOCTYPE html>
 <html>
 <head>
 <meta charset='utf-8'/>
 <title>Test Trend</title>
 <script src='https://cdn.jsdelivr.net/npm/chart.js'></script>
-<style>body{{font-family:Arial, sans-serif; margin:20px}} canvas{{max-width:900px;}}</style>
+<style>body{{font-family:Arial, sans-serif; margin:20px}} canvas{{max-width:900px;}} .note{{font-size:12px;color:#555;}}</style>
 </head>
 <body>
 <h1>Test Execution Trends</h1>
+<label>Resolution:
+<select id='resolution'>
+  <option value='run'>Per run</option>
+  <option value='day'>Per day</option>
+  <option value='week'>Per week</option>
+</select></label>
+<p class='note' id='resolutionNote'></p>
+<p class='note'>Rolling statistics use a {window}-point trailing window; EWMA alpha={trends['params']['alpha']}. Highlighted points on the failure rate chart mark detected change points.</p>
 <canvas id='failChart'></canvas>
 <canvas id='failureRateChart' style='margin-top:40px;'></canvas>
 <canvas id='flakyChart' style='margin-top:40px;'></canvas>
 <script>
-const labels = {points};
-const failedData = {failed};
-const flakyData = {flaky_counts};
-const failureRateData = {failure_rates};
-new Chart(document.getElementById('failChart').getContext('2d'), {{
-  type:'line',
-  data: {{ labels: labels, datasets:[{{label:'Failed Tests', data: failedData, borderColor:'#d33', fill:false}}] }},
-  options: {{ responsive:true, plugins: {{ legend: {{ position:'top'}} }}, scales: {{ y: {{ beginAtZero:true }} }} }}
-}});
-new Chart(document.getElementById('failureRateChart').getContext('2d'), {{
-  type:'line',
-  data: {{ labels: labels, datasets:[{{label:'Failure Rate (%)', data: failureRateData, borderColor:'#36c', fill:false}}] }},
-  options: {{ responsive:true, plugins: {{ legend: {{ position:'top'}} }}, scales: {{ y: {{ beginAtZero:true, title: {{ display:true, text:'% Failed'}} }} }} }}
-}});
-new Chart(document.getElementById('flakyChart').getContext('2d'), {{
-  type:'line',
-  data: {{ labels: labels, datasets:[{{label:'Flaky Candidates', data: flakyData, borderColor:'#f90', fill:false}}] }},
-  options: {{ responsive:true, plugins: {{ legend: {{ position:'top'}} }}, scales: {{ y: {{ beginAtZero:true }} }} }}
-}});
+const index = {json.dumps(index, separators=(',', ':'))};
+const cache = {{}};
+const charts = {{}};
+const opts = (title) => ({{ responsive:true, animation:false, plugins: {{ legend: {{ position:'top'}} }}, scales: {{ y: {{ beginAtZero:true, title: {{ display:!!title, text:title }} }} }} }});
+function draw(id, datasets, labels, title) {{
+  if (charts[id]) charts[id].destroy();
+  charts[id] = new Chart(document.getElementById(id).getContext('2d'), {{ type:'line', data: {{ labels, datasets }}, options: opts(title) }});
+}}
+function render(res, d) {{
+  const changeRadius = d.failure_rate_change.map(c => c ? 6 : 0);
+  const mean = 'Rolling Mean ({window})';
+  const failed = [{{label: res === 'run' ? 'Failed Tests' : 'Failed Tests (sum)', data: d.failed, borderColor:'#d33', fill:false}}];
+  if (d.failed_mean) failed.push({{label: mean, data: d.failed_mean, borderColor:'#d33', borderDash:[4,4], pointRadius:0, fill:false}});
+  draw('failChart', failed, d.label, '');
+  const rate = [
+    {{label:'Failure Rate (%)', data: d.failure_rate, borderColor:'#36c', fill:false, pointRadius: changeRadius, pointBackgroundColor:'#000'}},
+    {{label: mean, data: d.failure_rate_mean, borderColor:'#36c', borderDash:[4,4], pointRadius:0, fill:false}},
+    {{label:'EWMA', data: d.failure_rate_ewma, borderColor:'#093', pointRadius:0, fill:false}}
+  ];
+  if (d.failure_rate_p90) rate.push({{label:'Rolling P90', data: d.failure_rate_p90, borderColor:'#999', borderDash:[2,2], pointRadius:0, fill:false}});
+  draw('failureRateChart', rate, d.label, '% Failed');
+  const flaky = [{{label: res === 'run' ? 'Flaky Candidates' : 'Flaky Candidates (mean)', data: d.flaky, borderColor:'#f90', fill:false}}];
+  if (d.flaky_max) flaky.push({{label:'Flaky Candidates (max)', data: d.flaky_max, borderColor:'#f90', borderDash:[4,4], pointRadius:0, fill:false}});
+  if (d.flaky_mean) flaky.push({{label: mean, data: d.flaky_mean, borderColor:'#f90', borderDash:[4,4], pointRadius:0, fill:false}});
+  draw('flakyChart', flaky, d.label, '');
+  document.getElementById('resolutionNote').textContent = d.downsampled
+    ? `Showing ${{d.label.length}} of ${{d.source_points}} runs (LTTB downsampled; change points kept).`
+    : `${{d.label.length}} point(s).`;
+}}
+async function load(res) {{
+  if (!cache[res]) cache[res] = fetch(`trends-data/${{res}}.json`).then(r => r.json());
+  render(res, await cache[res]);
+}}
+document.getElementById('resolution').addEventListener('change', e => load(e.target.value));
+load('run');
 </script>
 </body>
 </html>
 """
 
-out = Path('target/trends.html')
-out.write_text(html)
-print('Wrote', out)
+@instrumented('generate_trends')
+def main():
+    if not HISTORY.exists() and not HistoryStore.exists(HISTORY_STORE):
+        print('No history file found, skipping trends.')
+        return 0
+    # One streaming pass over the history, then vectorized series and pre-aggregated chart files
+    with stage('trends.load_columns') as st:
+        cols = load_columns(open_history(HISTORY_STORE, HISTORY))
+        st.items = len(cols)
+    write_trends(cols)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
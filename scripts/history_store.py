@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Append-only, segmented storage for flaky history run entries.
+
+Layout under the store directory::
+
+    manifest.json         {"version", "next_id", "segments": [{"name", "first", "count"}]}
+    seg-<first>.jsonl     one run entry per line, in run order
+    seg-<first>.idx       little-endian uint64 byte offset of every line in the segment
+
+Appending a run writes one line, eight index bytes and the (small) manifest, so the
+per-run cost does not depend on how much history is retained; ``extend`` appends many
+runs with a single manifest write. Readers locate
+"run K" or "the last N runs" through the manifest and offset index and only decode
+the lines they ask for. Run ids are global and stable: compaction drops old runs but
+never renumbers the ones it keeps.
+"""
+import json
+import os
+import shutil
+import sys
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+
+STORE_VERSION = 1
+SEGMENT_RUNS = int(os.environ.get('FLAKY_HISTORY_SEGMENT_RUNS', '256'))
+# Runs kept by the store itself; 0 keeps everything. Whole segments are dropped lazily.
+RETAIN_RUNS = int(os.environ.get('FLAKY_HISTORY_RETAIN', '0'))
+
+def _offsets_typecode():
+    for code in ('Q', 'L'):
+        if array(code).itemsize == 8:
+            return code
+    raise RuntimeError('No 8-byte unsigned array type available')
+
+OFFSET_TYPE = _offsets_typecode()
+
+class HistoryStore:
+    def __init__(self, root, segment_runs=SEGMENT_RUNS, retain=RETAIN_RUNS):
+        self.root = Path(root)
+        self.manifest_file = self.root / 'manifest.json'
+        self.segment_runs = max(1, segment_runs)
+        self.retain = retain
+        self.next_id = 0
+        self.segments = []
+        if self.manifest_file.exists():
+            manifest = json.loads(self.manifest_file.read_text())
+            if manifest.get('version') != STORE_VERSION:
+                raise ValueError(f'Unsupported history store version in {self.manifest_file}')
+            self.next_id = manifest['next_id']
+            self.segments = manifest['segments']
+
+    @staticmethod
+    def exists(root):
+        return (Path(root) / 'manifest.json').exists()
+
+    def __len__(self):
+        return sum(s['count'] for s in self.segments)
+
+    @property
+    def first_id(self):
+        return self.segments[0]['first'] if self.segments else self.next_id
+
+    def _paths(self, seg):
+        return self.root / f"{seg['name']}.jsonl", self.root / f"{seg['name']}.idx"
+
+    def _write_manifest(self):
+        tmp = self.manifest_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'version': STORE_VERSION, 'next_id': self.next_id, 'segments': self.segments}))
+        os.replace(tmp, self.manifest_file)
+
+    def append(self, entry):
+        """Append one run entry and return its run id."""
+        run_id = self.next_id
+        self.extend((entry,))
+        return run_id
+
+    def extend(self, entries):
+        """Append run entries in order, writing the manifest once; returns the number appended.
+
+        Segment files stay open while a segment fills, so bulk writers (the shard merge,
+        compaction, legacy import) pay one manifest rewrite per call instead of per run.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        added = 0
+        data = idx = None
+        try:
+            for entry in entries:
+                if not self.segments or self.segments[-1]['count'] >= self.segment_runs:
+                    if data:
+                        data.close()
+                        idx.close()
+                        data = idx = None
+                    self.segments.append({'name': f'seg-{self.next_id:010d}', 'first': self.next_id, 'count': 0})
+                    self._drop_expired_segments()
+                seg = self.segments[-1]
+                if data is None:
+                    data_path, idx_path = self._paths(seg)
+                    data, idx = open(data_path, 'ab'), open(idx_path, 'ab')
+                offset = data.tell()
+                data.write((json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8'))
+                array(OFFSET_TYPE, [offset]).tofile(idx)
+                seg['count'] += 1
+                self.next_id += 1
+                added += 1
+        finally:
+            if data:
+                data.close()
+                idx.close()
+            if added:
+                self._write_manifest()
+        return added
+
+    def _drop_expired_segments(self):
+        if self.retain <= 0:
+            return
+        cutoff = self.next_id - self.retain
+        while len(self.segments) > 1 and self.segments[0]['first'] + self.segments[0]['count'] <= cutoff:
+            for p in self._paths(self.segments.pop(0)):
+                p.unlink(missing_ok=True)
+
+    def _locate(self, run_id):
+        firsts = [s['first'] for s in self.segments]
+        i = bisect_right(firsts, run_id) - 1
+        if i < 0 or run_id >= self.segments[i]['first'] + self.segments[i]['count']:
+            raise IndexError(f'run {run_id} not in history store')
+        return self.segments[i], run_id - self.segments[i]['first']
+
+    def get(self, run_id):
+        """Return run ``run_id``; negative ids count back from the newest run."""
+        if run_id < 0:
+            run_id += self.next_id
+        seg, pos = self._locate(run_id)
+        data_path, idx_path = self._paths(seg)
+        offsets = array(OFFSET_TYPE)
+        with open(idx_path, 'rb') as f:
+            f.seek(pos * offsets.itemsize)
+            offsets.fromfile(f, 1)
+        with open(data_path, 'rb') as f:
+            f.seek(offsets[0])
+            return json.loads(f.readline())
+
+    def iter_segment(self, seg, start=0):
+        data_path, idx_path = self._paths(seg)
+        offsets = array(OFFSET_TYPE)
+        if start:
+            with open(idx_path, 'rb') as f:
+                f.seek(start * offsets.itemsize)
+                offsets.fromfile(f, 1)
+        with open(data_path, 'rb') as f:
+            if start:
+                f.seek(offsets[0])
+            for line in f:
+                yield json.loads(line)
+
+    def iter(self, start_id=None):
+        """Stream entries in run order, optionally starting at ``start_id``."""
+        start_id = self.first_id if start_id is None else max(start_id, self.first_id)
+        for seg in self.segments:
+            if seg['first'] + seg['count'] <= start_id:
+                continue
+            yield from self.iter_segment(seg, max(0, start_id - seg['first']))
+
+    def __iter__(self):
+        return self.iter()
+
+    def last(self, n):
+        """Return the newest ``n`` entries, oldest first."""
+        if n <= 0:
+            return []
+        return list(self.iter(self.next_id - n))
+
+    def compact(self, keep_last=None):
+        """Rewrite the store into full segments, keeping only the newest ``keep_last`` runs."""
+        if not self.segments:
+            return
+        start = self.first_id if not keep_last else max(self.first_id, self.next_id - keep_last)
+        tmp = HistoryStore(self.root.with_name(self.root.name + '.compact'), self.segment_runs, 0)
+        if tmp.root.exists():
+            shutil.rmtree(tmp.root)
+        tmp.next_id = start
+        tmp.extend(self.iter(start))
+        tmp.next_id = self.next_id
+        tmp._write_manifest()
+        old = self.root.with_name(self.root.name + '.old')
+        if old.exists():
+            shutil.rmtree(old)
+        os.replace(self.root, old)
+        os.replace(tmp.root, self.root)
+        shutil.rmtree(old)
+        self.segments = tmp.segments
+
+class ListHistory:
+    """Read-only stand-in exposing the HistoryStore reader API over a legacy JSON list."""
+
+    def __init__(self, entries):
+        self.entries = entries if isinstance(entries, list) else []
+        self.next_id = len(self.entries)
+        self.first_id = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, run_id):
+        return self.entries[run_id]
+
+    def iter(self, start_id=None):
+        return iter(self.entries[start_id or 0:])
+
+    def __iter__(self):
+        return self.iter()
+
+    def last(self, n):
+        return self.entries[-n:] if n > 0 else []
+
+def open_history(store_dir, legacy_json=None):
+    """Open the segmented store when present, else fall back to a legacy flaky-history.json."""
+    if store_dir and HistoryStore.exists(store_dir):
+        return HistoryStore(store_dir)
+    if legacy_json and Path(legacy_json).exists():
+        try:
+            return ListHistory(json.loads(Path(legacy_json).read_text()))
+        except Exception:
+            pass
+    return ListHistory([])
+
+def migrate_legacy(store, legacy_json):
+    """Seed an empty store from a legacy flaky-history.json list."""
+    if len(store) or store.next_id or not Path(legacy_json).exists():
+        return 0
+    try:
+        entries = json.loads(Path(legacy_json).read_text())
+    except Exception:
+        return 0
+    if not isinstance(entries, list):
+        return 0
+    return store.extend(entries)
+
+def main(argv):
+    """Maintenance CLI: ``history_store.py <store> compact [keep_last]`` or ``... export <out.json> [last_n]``."""
+    if len(argv) < 3:
+        print(main.__doc__)
+        return 2
+    store = HistoryStore(argv[1])
+    if argv[2] == 'compact':
+        store.compact(int(argv[3]) if len(argv) > 3 else None)
+        print(f'Compacted {argv[1]}: {len(store)} run(s) in {len(store.segments)} segment(s)')
+    elif argv[2] == 'export' and len(argv) > 3:
+        entries = store.last(int(argv[4])) if len(argv) > 4 else list(store)
+        Path(argv[3]).write_text(json.dumps(entries, indent=2))
+        print(f'Exported {len(entries)} run(s) to {argv[3]}')
+    else:
+        print(main.__doc__)
+        return 2
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Minimal compiled-template, streaming HTML writer.
+
+A ``PageTemplate`` is parsed once into literal chunks separated by ``{{slot}}``
+markers. ``render_to`` writes the chunks straight to a file object and fills each
+slot from a string, an iterable of strings (written with ``writelines``, so
+generators stream without building the section in memory) or a zero-argument
+callable returning either. Single braces pass through untouched, so inline CSS and
+JavaScript need no escaping.
+"""
+import re
+from html import escape
+
+SLOT = re.compile(r'\{\{(\w+)\}\}')
+
+class PageTemplate:
+    def __init__(self, source):
+        parts = SLOT.split(source)
+        # parts alternates literal, slot name, literal, ...; pair each literal with the slot after it
+        self.chunks = [(parts[i], parts[i + 1] if i + 1 < len(parts) else None) for i in range(0, len(parts), 2)]
+        self.slots = {name for _, name in self.chunks if name}
+
+    def render_to(self, fh, **values):
+        missing = self.slots - values.keys()
+        if missing:
+            raise KeyError(f"Missing template slot(s): {', '.join(sorted(missing))}")
+        for literal, name in self.chunks:
+            fh.write(literal)
+            if name is None:
+                continue
+            value = values[name]
+            if callable(value):
+                value = value()
+            if isinstance(value, str):
+                fh.write(value)
+            else:
+                fh.writelines(value)
+
+def list_items(items, render, empty='None'):
+    """Yield ``<li>`` elements for ``items`` (``render`` returns escaped inner HTML), or one ``empty`` item."""
+    seen = False
+    for item in items:
+        seen = True
+        yield f'<li>{render(item)}</li>'
+    if not seen:
+        yield f'<li>{escape(empty)}</li>'
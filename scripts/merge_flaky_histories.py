@@ -1,21 +1,120 @@
 #!/usr/bin/env python3
-import json, sys, pathlib, os
+"""K-way merge of per-shard flaky histories into one combined history.
+
+Every segmented store (a directory with ``manifest.json``) and every legacy
+``flaky-history.json`` found under ``combined/history`` is a sorted source. The
+sources are streamed through ``heapq.merge`` by timestamp, exact duplicate runs
+(the same entry carried by several shards) are dropped, and the result is appended
+to ``combined/flaky-history/`` while a bounded window feeds the JSON snapshot.
+Memory is bounded by the snapshot window and the legacy files, never by the
+total amount of store history.
+"""
+import hashlib
+import heapq
+import json
+import os
+import pathlib
+import shutil
+from collections import deque
+
+from history_store import HistoryStore
+from stage_metrics import instrumented, stage
+
 base = pathlib.Path('combined/history')
-merged = []
+out = pathlib.Path('combined/flaky-history.json')
+out_store = pathlib.Path('combined/flaky-history')
 max_history = int(os.environ.get('FLAKY_HISTORY_MAX', '200'))
-if base.exists():
-    for f in sorted(base.glob('flaky-history.json')):
+
+def timestamp(entry):
+    return entry.get('timestamp') or ''
+
+def run_identity(entry):
+    return hashlib.sha256(json.dumps(entry, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def discover_sources(root):
+    """Return ``(label, iterator)`` per shard history, preferring a store over its JSON snapshot."""
+    sources = []
+    store_dirs = sorted(p.parent for p in root.rglob('manifest.json'))
+    for d in store_dirs:
+        try:
+            sources.append((str(d), HistoryStore(d).iter()))
+        except Exception as e:
+            print(f'Skipping unreadable history store {d}: {e}')
+    for f in sorted(root.rglob('flaky-history.json')):
+        if f.with_suffix('') in store_dirs:
+            continue
         try:
             data = json.loads(f.read_text())
-            if isinstance(data, list):
-                merged.extend(data)
-            else:
-                merged.append(data)
         except Exception:
-            pass
-out = pathlib.Path('combined/flaky-history.json')
-out.parent.mkdir(parents=True, exist_ok=True)
-if len(merged) > max_history:
-    merged = merged[-max_history:]
-out.write_text(json.dumps(merged, indent=2))
-print('Merged entries (post-prune):', len(merged))
+            continue
+        entries = data if isinstance(data, list) else [data]
+        # Legacy lists are append-ordered; sort defensively so heapq.merge sees sorted input
+        sources.append((str(f), iter(sorted(entries, key=timestamp))))
+    return sources
+
+def merge_sources(sources):
+    """Yield entries from all sources in timestamp order, dropping duplicate runs."""
+    seen_ts = None
+    seen = set()
+    for entry in heapq.merge(*(it for _, it in sources), key=timestamp):
+        ts = timestamp(entry)
+        if ts != seen_ts:
+            seen_ts, seen = ts, set()
+        ident = run_identity(entry)
+        if ident in seen:
+            continue
+        seen.add(ident)
+        yield entry
+
+def write_snapshot(path, entries):
+    """Stream a JSON list identical to ``json.dumps(list(entries), indent=2)``."""
+    with open(path, 'w') as f:
+        first = True
+        for entry in entries:
+            f.write('[\n  ' if first else ',\n  ')
+            f.write(json.dumps(entry, indent=2).replace('\n', '\n  '))
+            first = False
+        f.write('[]' if first else '\n]')
+
+def merge_histories(root=base, store_dir=out_store, snapshot=out, keep=max_history, observe=None):
+    """Merge every shard history under ``root`` into ``store_dir`` and the ``snapshot`` JSON.
+
+    ``observe`` (optional) is called with each merged entry in order, so callers can
+    derive further data from the same pass. Returns ``(runs, window)``: the number of
+    merged runs and the last ``keep`` entries written to the snapshot.
+    """
+    with stage('merge.sources') as st:
+        sources = discover_sources(root) if root.exists() else []
+        st.items = len(sources)
+    print('History sources:', len(sources))
+    snapshot.parent.mkdir(parents=True, exist_ok=True)
+    tmp_store = store_dir.with_name(store_dir.name + '.tmp')
+    if tmp_store.exists():
+        shutil.rmtree(tmp_store)
+    store = HistoryStore(tmp_store)
+    window = deque(maxlen=keep)
+    # Reading, de-duplicating, appending and observing are one streaming pass, measured together
+    def observed():
+        for entry in merge_sources(sources):
+            window.append(entry)
+            if observe:
+                observe(entry)
+            yield entry
+    with stage('merge.stream') as st:
+        st.items = store.extend(observed())
+        if store_dir.exists():
+            shutil.rmtree(store_dir)
+        if tmp_store.exists():
+            os.replace(tmp_store, store_dir)
+    with stage('merge.snapshot', len(window)):
+        write_snapshot(snapshot, window)
+    print('Merged entries (store):', len(store))
+    print('Merged entries (post-prune):', len(window))
+    return len(store), list(window)
+
+@instrumented('merge_flaky_histories')
+def main():
+    merge_histories()
+
+if __name__ == '__main__':
+    main()
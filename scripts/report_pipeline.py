@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Single-process reporting pipeline for the deploy job.
+
+History is read exactly once. When ``combined/history`` holds shard histories they
+are k-way merged (``merge_flaky_histories``) and the same pass fills a shared
+``ReportModel``: trend columns for every run, the bounded window of recent entries
+and the failure clusters of every fingerprinted failure. Without shard histories the model is loaded from an existing
+``combined/flaky-history`` store or JSON snapshot instead.
+
+The flakiness model (``flakiness.py``) is then ranked from the test indexes' per-test
+statistics and written to ``site/extra/flakiness.json``, and the artifact tree is
+indexed once (``combined/artifacts/index.json``) for both the dashboard and the trace
+analysis. The remaining stages only read the model and are independent of each other,
+so they run concurrently:
+
+* ``trends``     - ``site/extra/trends.html``, ``trends-data/`` and the history snapshot
+* ``clusters``   - ``site/extra/failure-clusters.json`` (clusters are built during the merge pass)
+* ``badges``     - flaky, failure, stability, retry recovery and quarantine badge JSON
+* ``traces``     - ``site/extra/trace-hotspots.json``: slowest actions, selectors, waits and
+  requests in the traces of failing and retried tests (``trace_analysis.py``)
+* ``dashboard``  - ``site/index.html``
+* ``notify``     - alert rules for the latest run (``combined/notification.json``),
+  dispatched when ``SLACK_WEBHOOK_URL`` / ``ALERT_WEBHOOKS`` are set (see ``alerts.py``)
+
+Each concurrent stage's output (including a failure's traceback) is buffered and
+printed whole, in stage order, so CI logs never interleave lines of different stages.
+A failing stage is reported without stopping the others; the exit status is
+non-zero only when a required stage (merge, dashboard) fails. Every stage, and the
+sub-stages of the scripts it calls, is recorded in ``target/stage-metrics.json``
+(see ``stage_metrics.py``).
+"""
+import io
+import json
+import os
+import shutil
+import sys
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+import merge_flaky_histories as merge
+from alerts import dispatch, evaluate, record
+from artifact_index import ARTIFACTS_DIR, ArtifactIndex
+from badges import write_badges
+from failure_fingerprint import FailureIndex, feed_entry
+from flakiness import assess, index_dirs, write_report
+from generate_dashboard import write_dashboard
+from generate_trends import write_trends
+from history_store import open_history
+from stage_metrics import instrumented, stage
+from trace_analysis import write_hotspots
+from trend_stats import RUN_DTYPE, run_row
+
+SITE_DIR = Path(os.environ.get('REPORT_SITE_DIR', 'site'))
+DECISION = Path('combined/notification.json')
+REQUIRED_STAGES = {'merge', 'dashboard'}
+
+class ReportModel:
+    """Everything the report stages need, built from one pass over the history."""
+
+    def __init__(self, runs, recent, cols, clusters=None):
+        self.runs = runs
+        self.recent = recent
+        self.cols = cols
+        self.clusters = clusters or FailureIndex()
+        self.flakiness = {}
+        self.artifacts = None
+
+    @property
+    def latest(self):
+        return self.recent[-1] if self.recent else {}
+
+class ColumnCollector:
+    def __init__(self, keep):
+        self.rows = []
+        self.window = deque(maxlen=keep)
+        self.clusters = FailureIndex()
+
+    def __call__(self, entry):
+        self.rows.append(run_row(entry))
+        self.window.append(entry)
+        feed_entry(self.clusters, entry)
+
+    def model(self, runs):
+        return ReportModel(runs, list(self.window), np.array(self.rows, dtype=RUN_DTYPE), self.clusters)
+
+def load_model(keep=merge.max_history):
+    collect = ColumnCollector(keep)
+    if merge.base.exists():
+        runs, _ = merge.merge_histories(observe=collect)
+        return collect.model(runs)
+    print(f'No shard histories under {merge.base}; reading {merge.out_store}')
+    runs = 0
+    for entry in open_history(merge.out_store, merge.out):
+        collect(entry)
+        runs += 1
+    return collect.model(runs)
+
+def load_flakiness(model, site=SITE_DIR):
+    model.flakiness = assess(index_dirs())
+    write_report(model.flakiness, site / 'extra' / 'flakiness.json')
+    print(f"Flakiness model: {model.flakiness['flaky_count']} flaky, {model.flakiness['quarantine_count']} quarantined")
+
+def load_artifacts(model):
+    model.artifacts = ArtifactIndex.scan(ARTIFACTS_DIR)
+    if model.artifacts.entries:
+        model.artifacts.save()
+    print(f'Artifact index: {len(model.artifacts.entries)} file(s)')
+
+def stage_trends(model, site=SITE_DIR):
+    extra = site / 'extra'
+    extra.mkdir(parents=True, exist_ok=True)
+    if not model.runs:
+        print('No history, skipping trends.')
+        return
+    write_trends(model.cols, extra)
+    if merge.out.exists():
+        shutil.copyfile(merge.out, extra / 'flaky-history.json')
+
+def stage_clusters(model, site=SITE_DIR):
+    extra = site / 'extra'
+    extra.mkdir(parents=True, exist_ok=True)
+    (extra / 'failure-clusters.json').write_text(json.dumps(model.clusters.summary(), indent=2))
+    print(f'Failure clusters: {len(model.clusters.clusters)}')
+
+def stage_badges(model, site=SITE_DIR):
+    write_badges(model.latest, site / 'badges', model.flakiness)
+
+def stage_traces(model, site=SITE_DIR):
+    if not (ARTIFACTS_DIR / 'traces').exists():
+        print('No traces, skipping trace analysis.')
+        return
+    write_hotspots(model.recent[-20:], site / 'extra' / 'trace-hotspots.json', ARTIFACTS_DIR, index=model.artifacts)
+
+def stage_dashboard(model, site=SITE_DIR):
+    write_dashboard(model.recent[-20:], model.runs, site / 'index.html', model.clusters, model.flakiness, model.artifacts)
+
+def stage_notify(model, site=SITE_DIR):
+    alerts = evaluate(model.recent, model.clusters, model.flakiness.get('newly_quarantined', []))
+    print(f'Alerts: {len(alerts)} ({", ".join(a["rule"] for a in alerts) or "none"})')
+    record(DECISION, alerts, dispatch(alerts))
+
+STAGES = {
+    'trends': stage_trends,
+    'clusters': stage_clusters,
+    'badges': stage_badges,
+    'traces': stage_traces,
+    'dashboard': stage_dashboard,
+    'notify': stage_notify,
+}
+
+def run_stage(name, fn, *args):
+    try:
+        with stage(name):
+            fn(*args)
+        return None
+    except Exception:  # noqa: BLE001
+        print(f'Stage {name} failed:')
+        traceback.print_exc()
+        return name
+
+_capture = threading.local()
+
+class _ThreadRouted(io.TextIOBase):
+    """Stands in for stdout/stderr: writes go to the calling thread's capture buffer, if any."""
+
+    def __init__(self, target):
+        self.target = target
+
+    def write(self, text):
+        buffer = getattr(_capture, 'buffer', None)
+        (buffer if buffer is not None else self.target).write(text)
+        return len(text)
+
+    def flush(self):
+        if getattr(_capture, 'buffer', None) is None:
+            self.target.flush()
+
+@contextmanager
+def routed_output():
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = _ThreadRouted(stdout), _ThreadRouted(stderr)
+    try:
+        yield
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+def run_captured(name, fn, *args):
+    """``run_stage`` with the stage's output (stdout and stderr) returned instead of printed."""
+    _capture.buffer = io.StringIO()
+    try:
+        return run_stage(name, fn, *args), _capture.buffer.getvalue()
+    finally:
+        _capture.buffer = None
+
+@instrumented('report_pipeline')
+def main():
+    failed = []
+    model = None
+    try:
+        with stage('load_model') as st:
+            model = load_model()
+            st.items = model.runs
+    except Exception:  # noqa: BLE001
+        print('Stage merge failed:')
+        traceback.print_exc()
+        failed.append('merge')
+        model = ReportModel(0, [], np.array([], dtype=RUN_DTYPE))
+    print(f'Report model: {model.runs} run(s), {len(model.recent)} recent')
+    if run_stage('flakiness', load_flakiness, model):
+        failed.append('flakiness')
+    if run_stage('artifacts', load_artifacts, model):
+        failed.append('artifacts')
+    # Concurrent stages would interleave their lines; each one's output is printed whole, in stage order
+    with routed_output(), ThreadPoolExecutor(max_workers=len(STAGES)) as pool:
+        futures = [pool.submit(run_captured, name, fn, model) for name, fn in STAGES.items()]
+        for future in futures:
+            name, output = future.result()
+            sys.stdout.write(output)
+            sys.stdout.flush()
+            if name:
+                failed.append(name)
+    if failed:
+        print('Failed stage(s):', ', '.join(failed))
+    return 1 if REQUIRED_STAGES.intersection(failed) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
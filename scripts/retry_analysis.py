@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Single-pass, streaming analysis of ``target/retry-attempts.jsonl``.
+
+``RetryExtension`` appends one record per attempt when the attempt finishes
+(``timestamp``, ``class``, ``method``, ``attempt``, ``maxRetries``, ``success``,
+``errorType``). The log is read line by line and every test keeps only its open
+execution (at most ``maxRetries + 1`` attempts, capped at MAX_TIMELINE), running
+counters over its closed retried executions and the timelines of the last
+MAX_EXECUTIONS of them. An execution closes when the same test logs a new
+``attempt == 1`` or the log ends, so memory is bounded by the number of distinct
+tests, not log length.
+
+Because the log only has end-of-attempt timestamps, the duration of attempt N > 1 is
+the gap to attempt N-1. The first attempt's duration is unknown. "Retry time" for an
+execution is the span from the end of attempt 1 to the end of its final attempt: the
+wall clock added by retrying. It counts as wasted when the test never recovered.
+
+A test can be executed more than once per log (reruns, several shards appending to one
+file); each is counted, and only the most recent retried executions keep a timeline.
+``retry_stats`` counts tests (``retried_tests``/``recovered_tests``: a test recovered
+when its last retried execution did, and ``by_error_type`` buckets each test by that
+execution's first error) alongside ``retried_executions``/``recovered_executions``.
+"""
+import json
+import sys
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+MAX_TIMELINE = 20
+MAX_EXECUTIONS = 5
+
+def parse_ts(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except Exception:
+        return None
+
+class RetryAnalyzer:
+    def __init__(self, max_timeline=MAX_TIMELINE, max_executions=MAX_EXECUTIONS):
+        self.max_timeline = max_timeline
+        self.max_executions = max_executions
+        self.open = {}
+        self.tests = {}
+        self.by_error = {}
+        self.lines = 0
+        self.bad_lines = 0
+        self.retry_seconds = 0.0
+        self.wasted_seconds = 0.0
+
+    def feed(self, rec):
+        key = (rec.get('class'), rec.get('method'))
+        attempt = rec.get('attempt', 0) or 0
+        ex = self.open.get(key)
+        if ex is not None and attempt <= ex['last_attempt']:
+            self._close(key, ex)
+            ex = None
+        if ex is None:
+            ex = {'attempts': [], 'last_attempt': 0, 'last_ts': None, 'count': 0}
+            self.open[key] = ex
+            self.tests.setdefault(key, None)
+        ts = parse_ts(rec.get('timestamp') or '')
+        duration = round(ts - ex['last_ts'], 3) if ts is not None and ex['last_ts'] is not None else None
+        if len(ex['attempts']) < self.max_timeline:
+            ex['attempts'].append({
+                'attempt': attempt,
+                'timestamp': rec.get('timestamp'),
+                'duration_s': duration,
+                'success': bool(rec.get('success')),
+                'errorType': rec.get('errorType'),
+            })
+        ex.setdefault('first_ts', ts)
+        ex['last_ts'] = ts
+        ex['last_attempt'] = attempt
+        ex['count'] += 1
+        ex['final_success'] = bool(rec.get('success'))
+        ex['max_retries'] = rec.get('maxRetries')
+
+    def _close(self, key, ex):
+        del self.open[key]
+        attempts = ex['attempts']
+        if ex['count'] < 2 or not any(not a['success'] for a in attempts[:-1]):
+            return
+        recovered = ex['final_success']
+        span = 0.0
+        if ex.get('first_ts') is not None and ex['last_ts'] is not None:
+            span = max(0.0, ex['last_ts'] - ex['first_ts'])
+        self.retry_seconds += span
+        if not recovered:
+            self.wasted_seconds += span
+        test = self.tests[key]
+        if test is None:
+            test = self.tests[key] = {'executions': 0, 'recovered_executions': 0, 'attempts': 0,
+                                      'retry_seconds': 0.0, 'recent': deque(maxlen=self.max_executions)}
+        test['executions'] += 1
+        test['recovered_executions'] += 1 if recovered else 0
+        test['attempts'] += ex['count']
+        test['retry_seconds'] += span
+        test['recent'].append({
+            'attempts': ex['count'],
+            'max_retries': ex['max_retries'],
+            'recovered': recovered,
+            'error_type': next((a['errorType'] for a in attempts if not a['success']), None) or 'unknown',
+            'retry_seconds': round(span, 3),
+            'timeline': attempts,
+        })
+
+    def finish(self):
+        for key in list(self.open):
+            self._close(key, self.open[key])
+        retried = []
+        executions = recovered_executions = 0
+        for (cls, name), test in self.tests.items():
+            if not test:
+                continue
+            last = test['recent'][-1]
+            retried.append({'class': cls, 'name': name, 'attempts': last['attempts'], 'recovered': last['recovered'],
+                            'executions': test['executions'], 'recovered_executions': test['recovered_executions'],
+                            'total_attempts': test['attempts'], 'retry_seconds': round(test['retry_seconds'], 3),
+                            'recent': list(test['recent'])})
+            bucket = self.by_error.setdefault(last['error_type'], {'retried': 0, 'recovered': 0})
+            bucket['retried'] += 1
+            bucket['recovered'] += 1 if last['recovered'] else 0
+            executions += test['executions']
+            recovered_executions += test['recovered_executions']
+        recovered = [t for t in retried if t['recovered']]
+        stats = {}
+        if retried:
+            stats = {
+                'retried_tests': len(retried),
+                'recovered_tests': len(recovered),
+                'recovery_rate': round((len(recovered) / len(retried)) * 100, 2),
+                'retried_executions': executions,
+                'recovered_executions': recovered_executions,
+                'retry_seconds': round(self.retry_seconds, 3),
+                'wasted_retry_seconds': round(self.wasted_seconds, 3),
+                'by_error_type': {
+                    et: dict(b, recovery_rate=round(b['recovered'] / b['retried'] * 100, 2))
+                    for et, b in sorted(self.by_error.items())
+                },
+            }
+        return {
+            'retry_stats': stats,
+            'flaky_passes': [{'class': t['class'], 'name': t['name'], 'attempts': t['attempts']} for t in recovered],
+            'timelines': retried,
+            'lines': self.lines,
+            'bad_lines': self.bad_lines,
+        }
+
+def analyze(path):
+    """Stream ``path`` once and return retry stats, flaky passes and per-test timelines."""
+    analyzer = RetryAnalyzer()
+    path = Path(path)
+    if path.exists():
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                analyzer.lines += 1
+                try:
+                    analyzer.feed(json.loads(line))
+                except Exception:
+                    analyzer.bad_lines += 1
+    return analyzer.finish()
+
+if __name__ == '__main__':
+    result = analyze(sys.argv[1] if len(sys.argv) > 1 else 'target/retry-attempts.jsonl')
+    print(json.dumps({k: v for k, v in result.items() if k != 'timelines'}, indent=2))
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Duration-aware assignment of test classes to N shards.
+
+Per-test costs are the EWMA durations kept by the test index (``target/test-index``,
+see ``test_index.py``), summed per class. In CI every matrix job has its own index,
+so the deploy job folds them into one ``durations.json`` (``export``: the mean of
+the indexes' already smoothed costs, keeping earlier costs of tests no index has now)
+that the plan job reads instead;
+a single plan is made once per workflow run and shared by every shard. Test classes are discovered from the test
+sources (``src/test/java/**/*Test.java``, the pom's Surefire include pattern), so
+classes that were never timed are still planned:
+
+* a class with no timed tests costs ``@Test`` methods x the median known per-test cost
+  (``SHARD_DEFAULT_TEST_SECONDS`` when nothing has been timed yet);
+* a partly timed class adds that median for each method the index has not seen;
+* classes declaring no test methods (shared base classes) are left out.
+
+Classes are placed largest first onto the currently lightest shard (LPT), which is
+within 4/3 of the optimal makespan. For every shard ``shard-<i>.txt`` lists one
+Surefire include pattern per class; the ``shard`` Maven profile consumes it via
+``-DshardFile=target/shards/shard-<i>.txt``. ``plan.json`` records the assignment
+and estimated load per shard. Surefire treats an empty includes file as "no filter"
+and would run the whole suite, so when there are more shards than classes the extra
+shards get a ``shard-<i>.skip`` marker instead, which the workflow checks. An
+unreadable durations file is reported and planning falls back to ``@Test`` counts.
+"""
+import heapq
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from statistics import median
+
+from test_index import TestIndex
+
+TEST_INDEX_DIR = Path(os.environ.get('TEST_INDEX_DIR', 'target/test-index'))
+TEST_SOURCES = Path('src/test/java')
+OUT_DIR = Path('target/shards')
+DEFAULT_TEST_SECONDS = float(os.environ.get('SHARD_DEFAULT_TEST_SECONDS', '5'))
+TEST_ANNOTATION = re.compile(r'@(?:Test|ParameterizedTest|RepeatedTest|TestFactory|TestTemplate)\b')
+
+def discover_classes(src=TEST_SOURCES):
+    """Map fully qualified test class name -> number of test methods declared in its source file."""
+    classes = {}
+    if not src.exists():
+        return classes
+    for path in sorted(src.rglob('*Test.java')):
+        text = path.read_text(encoding='utf-8', errors='replace')
+        if re.search(r'\babstract\s+class\b', text):
+            continue
+        fqcn = '.'.join(path.relative_to(src).with_suffix('').parts)
+        classes[fqcn] = len(TEST_ANNOTATION.findall(text))
+    return classes
+
+def load_costs(source):
+    """``{class::name: seconds}`` from a test index directory or an exported durations.json."""
+    source = Path(source)
+    if source.is_file():
+        return json.loads(source.read_text()).get('tests', {})
+    return dict(TestIndex(source).costs())
+
+def export_costs(out, index_dirs):
+    """Fold several test indexes into ``out``, keeping its previous costs for tests none of them has.
+
+    Index costs are already EWMA-smoothed per run (the indexes are cached across workflow
+    runs), so they are averaged across indexes and exported as-is, not smoothed again.
+    """
+    sums, counts = {}, {}
+    for d in index_dirs:
+        for key, cost in TestIndex(d).costs():
+            sums[key] = sums.get(key, 0.0) + cost
+            counts[key] = counts.get(key, 0) + 1
+    tests = {}
+    if Path(out).is_file():
+        try:
+            tests = load_costs(out)
+        except (OSError, ValueError, AttributeError) as e:
+            print(f'Replacing unreadable durations in {out} ({e})')
+    for key, total in sums.items():
+        tests[key] = round(total / counts[key], 3)
+    Path(out).parent.mkdir(parents=True, exist_ok=True)
+    Path(out).write_text(json.dumps({'version': 1, 'tests': dict(sorted(tests.items()))}, indent=2))
+    return len(sums), len(tests)
+
+def class_costs(test_costs, classes):
+    """Estimated seconds per class from per-test costs, with defaults for untimed tests."""
+    per_class = {}
+    known_tests = {}
+    for key, cost in test_costs.items():
+        cls = key.split('::', 1)[0]
+        per_class[cls] = per_class.get(cls, 0.0) + cost
+        known_tests[cls] = known_tests.get(cls, 0) + 1
+    typical = median(test_costs.values()) if test_costs else DEFAULT_TEST_SECONDS
+    costs = {}
+    for cls in sorted(set(classes) | set(per_class)):
+        if classes and cls not in classes:
+            continue  # timed in the past but no longer in the source tree
+        if cls not in per_class and not classes[cls]:
+            continue  # no test methods of its own (e.g. a shared base class)
+        missing = max(classes.get(cls, 0) - known_tests.get(cls, 0), 0)
+        costs[cls] = per_class.get(cls, 0.0) + missing * typical
+    return costs, typical
+
+def plan(costs, shards):
+    """LPT: largest class first onto the lightest shard. Returns ``[(load, [classes])]`` per shard."""
+    shards = max(1, shards)
+    loads = [(0.0, i) for i in range(shards)]
+    assigned = [[] for _ in range(shards)]
+    totals = [0.0] * shards
+    for cls, cost in sorted(costs.items(), key=lambda kv: (-kv[1], kv[0])):
+        load, i = heapq.heappop(loads)
+        assigned[i].append(cls)
+        totals[i] = load + cost
+        heapq.heappush(loads, (totals[i], i))
+    return [(totals[i], sorted(assigned[i])) for i in range(shards)]
+
+def include_pattern(cls):
+    return cls.replace('.', '/') + '.java'
+
+def write_plan(shard_plan, typical, out_dir=OUT_DIR):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for old in [*out_dir.glob('shard-*.txt'), *out_dir.glob('shard-*.skip')]:
+        old.unlink()
+    for i, (_, classes) in enumerate(shard_plan, start=1):
+        if classes:
+            (out_dir / f'shard-{i}.txt').write_text(''.join(include_pattern(c) + '\n' for c in classes))
+        else:
+            (out_dir / f'shard-{i}.skip').write_text('no test classes assigned\n')
+    loads = [load for load, _ in shard_plan]
+    mean = sum(loads) / len(loads)
+    summary = {
+        'shards': [{'shard': i, 'estimated_seconds': round(load, 3), 'classes': classes, 'skip': not classes}
+                   for i, (load, classes) in enumerate(shard_plan, start=1)],
+        'makespan_seconds': round(max(loads), 3),
+        'imbalance': round(max(loads) / mean, 4) if mean else 1.0,
+        'default_test_seconds': round(typical, 3),
+    }
+    (out_dir / 'plan.json').write_text(json.dumps(summary, indent=2))
+    return summary
+
+def main(argv):
+    """``shard_planner.py <shards> [test_index_dir|durations.json] [out_dir]`` or ``... export <durations.json> <index_dir>...``"""
+    if len(argv) < 2 or (argv[1] == 'export' and len(argv) < 4):
+        print(main.__doc__)
+        return 2
+    if argv[1] == 'export':
+        updated, total = export_costs(Path(argv[2]), [Path(d) for d in argv[3:]])
+        print(f'Exported {updated} timed test(s) to {argv[2]} ({total} total)')
+        return 0
+    source = Path(argv[2]) if len(argv) > 2 else TEST_INDEX_DIR
+    test_costs = {}
+    if source.exists():
+        try:
+            test_costs = load_costs(source)
+        except (OSError, ValueError, AttributeError) as e:
+            print(f'Ignoring unreadable durations in {source} ({e}); planning by @Test counts')
+    costs, typical = class_costs(test_costs, discover_classes())
+    summary = write_plan(plan(costs, int(argv[1])), typical, Path(argv[3]) if len(argv) > 3 else OUT_DIR)
+    for s in summary['shards']:
+        print(f"shard {s['shard']}: {len(s['classes'])} class(es), ~{s['estimated_seconds']}s" + (' (skipped)' if s['skip'] else ''))
+    print(f"Makespan ~{summary['makespan_seconds']}s, imbalance {summary['imbalance']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Per-stage wall time, CPU time, peak RSS and item counts for the reporting scripts.
+
+A script's ``main`` is wrapped with ``@instrumented('<script>')``; code inside it marks
+named stages with::
+
+    with stage('parse_reports') as st:
+        ...
+        st.items = len(files)
+
+``stage`` records on the recorder of the running script (so library functions such as
+``write_trends`` are measured both standalone and inside ``report_pipeline``) and is
+a no-op context otherwise. For each stage the record holds:
+
+* ``wall_s``       - elapsed time
+* ``cpu_s``        - CPU time of the stage's thread, so concurrent pipeline stages don't
+  double count. A stage that runs its own worker processes (the Surefire parse pool,
+  the trace analysis pool) opens with ``stage(name, children=True)`` to add the CPU of
+  children reaped meanwhile; that counter is process-wide, so only one such stage
+  should run at a time. The script total includes all children either way.
+* ``max_rss_mb``   - process peak RSS (including reaped children) when the stage ended;
+  ``rss_growth_mb`` is how much the stage raised that peak
+* ``items``, ``items_per_s`` and optional ``details`` (e.g. parse cache hits)
+
+On exit the script's section of ``STAGE_METRICS_FILE`` (default
+``target/stage-metrics.json``; '' disables it) is replaced, leaving other scripts'
+sections intact. Set ``STAGE_PROFILE`` to a stage name (or ``<script>:<stage>``) to
+dump cProfile output for that stage to ``STAGE_PROFILE_DIR`` (``<script>.<stage>.prof``
+plus a cumulative-time ``.txt``).
+
+``append`` adds metrics files as one run to a history store, so pipeline cost is kept
+over time like test results; ``show`` prints a metrics file or the latest stored runs::
+
+    python3 scripts/stage_metrics.py show target/stage-metrics.json
+    python3 scripts/stage_metrics.py append .cache/stage-metrics target/stage-metrics.json
+    python3 scripts/stage_metrics.py show .cache/stage-metrics 5
+"""
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows; RSS is then reported as null
+    resource = None
+
+METRICS_VERSION = 1
+METRICS_FILE = os.environ.get('STAGE_METRICS_FILE', 'target/stage-metrics.json')
+PROFILE_STAGE = os.environ.get('STAGE_PROFILE', '')
+PROFILE_DIR = Path(os.environ.get('STAGE_PROFILE_DIR', 'target/profiles'))
+PROFILE_LINES = 40
+
+_active = None
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)  # ru_maxrss is in KiB on Linux
+
+def _children_cpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class Stage:
+    """Handle yielded by ``stage()``; set ``items`` (or call ``add``) and ``details`` while it runs."""
+
+    __slots__ = ('name', 'items', 'details')
+
+    def __init__(self, name, items=0):
+        self.name = name
+        self.items = items
+        self.details = {}
+
+    def add(self, n=1):
+        self.items += n
+
+class StageMetrics:
+    def __init__(self, script, out=METRICS_FILE, profile=PROFILE_STAGE, profile_dir=PROFILE_DIR):
+        self.script = script
+        self.out = Path(out) if out else None
+        self.profile = profile
+        self.profile_dir = Path(profile_dir)
+        self.started = time.perf_counter()
+        self.started_cpu = time.process_time() + _children_cpu()
+        self.timestamp = datetime.now(timezone.utc).isoformat(timespec='seconds').replace('+00:00', 'Z')
+        self.stages = []
+        self._lock = threading.Lock()
+
+    def _profiled(self, name):
+        return self.profile in (name, f'{self.script}:{name}')
+
+    @contextmanager
+    def stage(self, name, items=0, children=False):
+        handle = Stage(name, items)
+        profiler = cProfile.Profile() if self._profiled(name) else None
+        rss_before = _peak_rss_mb()
+        children_before = _children_cpu() if children else 0.0
+        cpu_before = time.thread_time()
+        started = time.perf_counter()
+        status = 'ok'
+        if profiler:
+            profiler.enable()
+        try:
+            yield handle
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+            wall = time.perf_counter() - started
+            cpu = time.thread_time() - cpu_before
+            if children:
+                cpu += _children_cpu() - children_before
+            rss = _peak_rss_mb()
+            record = {
+                'stage': name,
+                'status': status,
+                'wall_s': round(wall, 4),
+                'cpu_s': round(cpu, 4),
+                'max_rss_mb': rss,
+                'rss_growth_mb': round(rss - rss_before, 1) if rss is not None else None,
+                'items': handle.items,
+                'items_per_s': round(handle.items / wall, 1) if handle.items and wall > 0 else None,
+            }
+            if handle.details:
+                record['details'] = handle.details
+            if profiler:
+                record['profile'] = str(self._dump_profile(profiler, name))
+            with self._lock:
+                self.stages.append(record)
+
+    def _dump_profile(self, profiler, name):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        path = self.profile_dir / f'{self.script}.{name}.prof'
+        profiler.dump_stats(path)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        path.with_suffix('.txt').write_text(text.getvalue())
+        return path
+
+    def summary(self):
+        with self._lock:
+            stages = list(self.stages)
+        return {
+            'script': self.script,
+            'timestamp': self.timestamp,
+            'wall_s': round(time.perf_counter() - self.started, 4),
+            'cpu_s': round(time.process_time() + _children_cpu() - self.started_cpu, 4),
+            'max_rss_mb': _peak_rss_mb(),
+            'stages': stages,
+        }
+
+    def write(self):
+        """Replace this script's section of the metrics file; returns the path or None when disabled."""
+        if not self.out:
+            return None
+        data = read_metrics(self.out) if self.out.exists() else {}
+        if data.get('version') != METRICS_VERSION:
+            data = {'version': METRICS_VERSION, 'scripts': {}}
+        data['scripts'][self.script] = self.summary()
+        self.out.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.out.with_name(self.out.name + '.tmp')
+        tmp.write_text(json.dumps(data, indent=2))
+        os.replace(tmp, self.out)
+        return self.out
+
+def stage(name, items=0, children=False):
+    """Measure a named stage on the running script's recorder (no-op when nothing is recording)."""
+    recorder = _active
+    if recorder is None:
+        return _untimed(name, items)
+    return recorder.stage(name, items, children)
+
+@contextmanager
+def _untimed(name, items):
+    yield Stage(name, items)
+
+def instrumented(script):
+    """Decorator for a script's ``main``: record its stages and write the metrics file afterwards."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            global _active
+            recorder = _active = StageMetrics(script)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _active = None
+                try:
+                    recorder.write()
+                except OSError as e:
+                    print(f'Could not write stage metrics: {e}')
+        return run
+    return wrap
+
+def read_metrics(path):
+    return json.loads(Path(path).read_text())
+
+def append_run(store_dir, files, commit=None):
+    """Append the given metrics files as one run entry ``{timestamp, commit, reports: {file: scripts}}``."""
+    from history_store import HistoryStore
+    reports = {}
+    for f in files:
+        f = Path(f)
+        if f.is_file():
+            reports[str(f)] = read_metrics(f).get('scripts', {})
+    if not reports:
+        return None
+    entry = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds').replace('+00:00', 'Z'),
+        'commit': commit if commit is not None else os.environ.get('GITHUB_SHA', '')[:7],
+        'reports': reports,
+    }
+    return HistoryStore(store_dir).append(entry)
+
+def format_scripts(scripts):
+    lines = []
+    for name, s in scripts.items():
+        lines.append(f"{name}: {s['wall_s']:.3f}s wall, {s['cpu_s']:.3f}s cpu, peak {s['max_rss_mb']} MB")
+        for st in s['stages']:
+            rate = f", {st['items_per_s']}/s" if st.get('items_per_s') else ''
+            flag = '' if st['status'] == 'ok' else f" [{st['status']}]"
+            lines.append(f"  {st['stage']:<28} {st['wall_s']:>9.3f}s {st['cpu_s']:>9.3f}s cpu"
+                         f" {st['max_rss_mb']!s:>8} MB  {st['items']} item(s){rate}{flag}")
+    return '\n'.join(lines)
+
+def main(argv):
+    """``stage_metrics.py show <metrics.json|store> [runs]`` or ``stage_metrics.py append <store> <metrics.json>...``"""
+    if len(argv) < 3 or argv[1] not in ('show', 'append') or (argv[1] == 'append' and len(argv) < 4):
+        print(main.__doc__)
+        return 2
+    if argv[1] == 'append':
+        run_id = append_run(argv[2], argv[3:])
+        print(f'Appended stage metrics run {run_id} to {argv[2]}' if run_id is not None else 'No stage metrics files found')
+        return 0
+    source = Path(argv[2])
+    if source.is_file():
+        print(format_scripts(read_metrics(source).get('scripts', {})))
+        return 0
+    from history_store import HistoryStore
+    for entry in HistoryStore(source).last(int(argv[3]) if len(argv) > 3 else 1):
+        print(f"== {entry['timestamp']} {entry.get('commit') or ''}")
+        for report, scripts in entry['reports'].items():
+            print(f'-- {report}')
+            print(format_scripts(scripts))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""On-disk, content-addressed cache of parsed Surefire report records.
+
+Layout under the cache directory::
+
+    index.json            path -> (size, mtime_ns, digest) plus per-digest LRU metadata
+    entries/<digest>.json the suite record produced by surefire_summary.parse_report
+
+A file whose path, size and mtime match the index is served without being read.
+Otherwise its SHA-256 is computed and looked up, so copies of unchanged reports
+(e.g. re-downloaded artifacts with fresh mtimes) still hit. Entries are evicted
+least-recently-used first once the cache exceeds its byte budget, which keeps the
+directory small enough to persist between workflow runs via actions/cache.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+# Bump whenever the cached record shape or parse semantics change.
+CACHE_VERSION = 3
+DEFAULT_MAX_BYTES = int(os.environ.get('SUREFIRE_CACHE_MAX_MB', '256')) * 1024 * 1024
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class ParseCache:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.entries_dir = self.root / 'entries'
+        self.index_file = self.root / 'index.json'
+        self.max_bytes = max_bytes
+        self.files = {}
+        self.entries = {}
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            index = json.loads(self.index_file.read_text())
+        except Exception:
+            index = {}
+        if index.get('version') != CACHE_VERSION:
+            # Incompatible or missing index: start over rather than serve stale records
+            if self.entries_dir.exists():
+                for f in self.entries_dir.glob('*.json'):
+                    f.unlink(missing_ok=True)
+            return
+        self.files = index.get('files', {})
+        self.entries = index.get('entries', {})
+
+    def _read_entry(self, digest):
+        try:
+            record = json.loads((self.entries_dir / f'{digest}.json').read_text())
+        except Exception:
+            self.entries.pop(digest, None)
+            return None
+        self.entries[digest]['used'] = time.time()
+        return record
+
+    def get(self, path):
+        """Return the cached suite record for ``path`` or None on a miss."""
+        key = str(Path(path).resolve())
+        st = os.stat(path)
+        meta = self.files.get(key)
+        if meta and meta['size'] == st.st_size and meta['mtime_ns'] == st.st_mtime_ns and meta['digest'] in self.entries:
+            record = self._read_entry(meta['digest'])
+            if record is not None:
+                self.hits += 1
+                return record
+        digest = file_digest(path)
+        self.files[key] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'digest': digest}
+        if digest in self.entries:
+            record = self._read_entry(digest)
+            if record is not None:
+                self.hits += 1
+                return record
+        self.pending[key] = digest
+        self.misses += 1
+        return None
+
+    def put(self, path, record):
+        key = str(Path(path).resolve())
+        digest = self.pending.pop(key, None) or file_digest(path)
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(record, separators=(',', ':'))
+        (self.entries_dir / f'{digest}.json').write_text(data)
+        self.entries[digest] = {'bytes': len(data), 'used': time.time()}
+
+    def _evict(self):
+        total = sum(e['bytes'] for e in self.entries.values())
+        if total <= self.max_bytes:
+            return
+        for digest, meta in sorted(self.entries.items(), key=lambda kv: kv[1]['used']):
+            if total <= self.max_bytes:
+                break
+            (self.entries_dir / f'{digest}.json').unlink(missing_ok=True)
+            del self.entries[digest]
+            total -= meta['bytes']
+
+    def save(self):
+        self._evict()
+        self.files = {k: v for k, v in self.files.items() if v['digest'] in self.entries}
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'version': CACHE_VERSION, 'files': self.files, 'entries': self.entries}))
+        os.replace(tmp, self.index_file)
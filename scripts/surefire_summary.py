@@ -1,27 +1,31 @@
 #!/usr/bin/env python3
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import hashlib
 import json
 import os
 from datetime import datetime
 
+from failure_fingerprint import FAILURE_CLUSTER_DIR, FailureIndex, fingerprint, normalize_failure
+from history_store import HistoryStore, migrate_legacy
+from retry_analysis import analyze as analyze_retry_log
+from stage_metrics import instrumented, stage
+from surefire_cache import ParseCache
+from test_index import TestIndex, observations_from_occurrences
+
+# Runs exported to the legacy flaky-history.json snapshot; the segmented store keeps the rest.
 MAX_HISTORY = int(os.environ.get('FLAKY_HISTORY_MAX', '200'))
+HISTORY_STORE_DIR = Path(os.environ.get('FLAKY_HISTORY_STORE', 'target/flaky-history'))
+TEST_INDEX_DIR = Path(os.environ.get('TEST_INDEX_DIR', 'target/test-index'))
+# Parallel parse workers; 1 forces the serial path. Output is identical either way.
+WORKERS = int(os.environ.get('SUREFIRE_WORKERS', str(os.cpu_count() or 1)))
+# Shards per worker: several small shards keep the pool balanced when suite sizes vary.
+SHARDS_PER_WORKER = 4
 
 REPORT_DIR = Path('target/surefire-reports')
-
-summary = {
-    'total': 0,
-    'passed': 0,
-    'failed': 0,
-    'skipped': 0,
-    'suites': [],
-    'flaky_candidates': []
-}
-
-if not REPORT_DIR.exists():
-    print('No surefire reports found')
-    exit(0)
+# Parsed-record cache shared across runs; set SUREFIRE_CACHE_DIR='' to disable.
+CACHE_DIR = os.environ.get('SUREFIRE_CACHE_DIR', '.cache/surefire-summary')
 
 def classify(case):
     if case.find('failure') is not None or case.find('error') is not None:
@@ -30,131 +34,272 @@ def classify(case):
         return 'skipped'
     return 'passed'
 
-# Collect occurrences by (class,name) to detect instability across runs (hash of stacktrace)
-occurrences = {}
-failed_tests_current_run = []
-
-for file in REPORT_DIR.glob('TEST-*.xml'):
-    tree = ET.parse(file)
-    root = tree.getroot()
-    suite_name = root.attrib.get('name')
-    suite_record = {'name': suite_name, 'tests': []}
-    for case in root.findall('testcase'):
-        name = case.attrib.get('name')
-        classname = case.attrib.get('classname')
-        status = classify(case)
+def failure_element(case):
+    failure_el = case.find('failure')
+    if failure_el is None:
+        failure_el = case.find('error')
+    return failure_el
+
+def failure_text_hash(case):
+    failure_el = failure_element(case)
+    if failure_el is None:
+        return None
+    return hashlib.sha256((failure_el.text or '').encode('utf-8')).hexdigest()[:10]
+
+def failure_signature(case):
+    """Normalized failure (type, message, top frames) and its fingerprint, or ``(None, None)``."""
+    failure_el = failure_element(case)
+    if failure_el is None:
+        return None, None
+    failure = normalize_failure(failure_el.attrib.get('type'), failure_el.attrib.get('message'), failure_el.text)
+    return failure, fingerprint(failure)
+
+def case_time(case):
+    """Wall time Surefire recorded for a testcase, in seconds (None when absent or malformed)."""
+    try:
+        return float(case.attrib['time'].replace(',', ''))
+    except (KeyError, ValueError):
+        return None
+
+def parse_report(path):
+    """Stream one TEST-*.xml report into a suite record.
+
+    Each testcase is classified and its failure text hashed as soon as the
+    element closes; the element is then cleared and detached from the root so
+    captured output and stack traces never accumulate in memory.
+    """
+    suite_record = {'name': None, 'tests': []}
+    root = None
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+                suite_record['name'] = elem.attrib.get('name')
+            continue
+        if elem is root:
+            break
+        if elem.tag == 'testcase':
+            failure, fp = failure_signature(elem)
+            suite_record['tests'].append({
+                'name': elem.attrib.get('name'),
+                'class': elem.attrib.get('classname'),
+                'status': classify(elem),
+                'failure_hash': failure_text_hash(elem),
+                'fingerprint': fp,
+                'failure': failure,
+                'time': case_time(elem)
+            })
+            elem.clear()
+        # Detach every closed top-level child (testcases, suite-level system-out, properties)
+        if len(root) and root[-1] is elem:
+            elem.clear()
+            root.remove(elem)
+    if root is not None:
+        root.clear()
+    return suite_record
+
+def parse_shard(paths):
+    """Worker entry point: parse a contiguous shard of report files, in order."""
+    return [parse_report(p) for p in paths]
+
+def iter_suite_records(files, workers=WORKERS):
+    """Yield one suite record per report file, always in the order of ``files``.
+
+    With more than one worker the files are split into contiguous shards parsed
+    by a process pool; ``Executor.map`` hands shard results back in submission
+    order, so the reducer sees exactly the sequence a serial run would.
+    """
+    workers = max(1, min(workers, len(files)))
+    if workers == 1:
+        for f in files:
+            yield parse_report(f)
+        return
+    shard_size = max(1, -(-len(files) // (workers * SHARDS_PER_WORKER)))
+    shards = [files[i:i + shard_size] for i in range(0, len(files), shard_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for records in pool.map(parse_shard, shards):
+            yield from records
+
+def new_summary():
+    return {
+        'total': 0,
+        'passed': 0,
+        'failed': 0,
+        'skipped': 0,
+        'suites': [],
+        'flaky_candidates': []
+    }
+
+def artifact_suffix():
+    attempt = os.environ.get('TEST_ATTEMPT') or os.environ.get('ATTEMPT') or os.getenv('ATTEMPT') or '1'
+    try:
+        attempt_int = int(attempt)
+    except Exception:
+        attempt_int = 1
+    return f"-attempt{attempt_int}" if attempt_int > 1 else ""
+
+def merge_suite(summary, occurrences, durations, failed_tests_current_run, suite_record, suffix):
+    """Reduce one parsed suite record into the run-level accumulators."""
+    for test in suite_record['tests']:
+        name = test['name']
+        classname = test['class']
+        status = test['status']
         summary['total'] += 1
         summary[status] += 1
-        failure_el = case.find('failure') or case.find('error')
-        failure_hash = None
-        if failure_el is not None:
-            failure_hash = hashlib.sha256((failure_el.text or '').encode('utf-8')).hexdigest()[:10]
         key = (classname, name)
         if key not in occurrences:
             occurrences[key] = []
-        occurrences[key].append({'status': status, 'failure_hash': failure_hash})
+        occurrences[key].append({'status': status, 'failure_hash': test['failure_hash']})
+        if test.get('time') is not None:
+            durations[key] = durations.get(key, 0.0) + test['time']
         if status == 'failed':
-            attempt = os.environ.get('TEST_ATTEMPT') or os.environ.get('ATTEMPT') or os.getenv('ATTEMPT') or '1'
-            try:
-                attempt_int = int(attempt)
-            except Exception:
-                attempt_int = 1
-            suffix = f"-attempt{attempt_int}" if attempt_int > 1 else ""
-            failed_tests_current_run.append({'class': classname, 'name': name, 'artifact_prefix': f"{classname.split('.')[-1]}_{name}{suffix}"})
-        suite_record['tests'].append({'name': name, 'class': classname, 'status': status, 'failure_hash': failure_hash})
+            failed_tests_current_run.append({
+                'class': classname,
+                'name': name,
+                'artifact_prefix': f"{classname.split('.')[-1]}_{name}{suffix}",
+                'fingerprint': test.get('fingerprint'),
+                'failure': test.get('failure'),
+            })
     summary['suites'].append(suite_record)
 
-# Detect flaky candidates: same test with both pass and fail states in its history (across parallel shards)
-for key, runs in occurrences.items():
-    statuses = {r['status'] for r in runs}
-    if 'failed' in statuses and 'passed' in statuses:
-        summary['flaky_candidates'].append({'test': key, 'runs': runs})
+@instrumented('surefire_summary')
+def main():
+    if not REPORT_DIR.exists():
+        print('No surefire reports found')
+        return 0
 
-print(json.dumps(summary, indent=2))
+    summary = new_summary()
+    # Collect occurrences by (class,name) to detect instability across runs (hash of stacktrace)
+    occurrences = {}
+    # Seconds per (class,name) in this run, summed over reruns; feeds the test index cost model
+    durations = {}
+    failed_tests_current_run = []
+    suffix = artifact_suffix()
 
-# Flaky history merge
-history_file = Path('target/flaky-history.json')
-history = []
-if history_file.exists():
-    try:
-        history = json.loads(history_file.read_text())
-    except Exception:
-        history = []
-
-run_entry = {
-    'timestamp': datetime.utcnow().isoformat() + 'Z',
-    'summary': {
-        'total': summary['total'],
-        'passed': summary['passed'],
-        'failed': summary['failed'],
-        'skipped': summary['skipped']
-    },
-    'failed_tests': failed_tests_current_run,
-    'flaky_candidates': [
-        {'class': fc['test'][0], 'name': fc['test'][1], 'runs': fc['runs']}
-        for fc in summary['flaky_candidates']
-    ],
-    'retry_stats': {},
-    'flaky_passes': []
-}
-
-# Retry attempt analysis
-retry_log = Path('target/retry-attempts.jsonl')
-attempt_records = []
-if retry_log.exists():
-    for line in retry_log.read_text().splitlines():
-        try:
-            attempt_records.append(json.loads(line))
-        except Exception:
-            pass
-if attempt_records:
-    from collections import defaultdict
-    grouped = defaultdict(list)
-    for rec in attempt_records:
-        key = (rec.get('class'), rec.get('method'))
-        grouped[key].append(rec)
-    totalRetried = 0
-    recovered = 0
-    for key, recs in grouped.items():
-        attempts_sorted = sorted(recs, key=lambda r: r.get('attempt', 0))
-        success_final = attempts_sorted[-1].get('success') if attempts_sorted else False
-        had_failure = any(not r.get('success') for r in attempts_sorted[:-1])
-        if len(attempts_sorted) > 1 and had_failure:
-            totalRetried += 1
-            if success_final:
-                recovered += 1
-                run_entry['flaky_passes'].append({'class': key[0], 'name': key[1], 'attempts': len(attempts_sorted)})
-    if totalRetried:
-        run_entry['retry_stats'] = {
-            'retried_tests': totalRetried,
-            'recovered_tests': recovered,
-            'recovery_rate': round((recovered / totalRetried) * 100, 2)
-        }
-
-history.append(run_entry)
-# Prune history if exceeding MAX_HISTORY (keep newest MAX_HISTORY)
-if len(history) > MAX_HISTORY:
-    history = history[-MAX_HISTORY:]
-history_file.write_text(json.dumps(history, indent=2))
-print('Updated', history_file)
-
-# Generate markdown table
-md_lines = []
-md_lines.append('# Test Summary')
-md_lines.append('')
-md_lines.append(f"Total: {summary['total']}  Passed: {summary['passed']}  Failed: {summary['failed']}  Skipped: {summary['skipped']}")
-md_lines.append('')
-if summary['flaky_candidates']:
-    md_lines.append('## Flaky Candidates')
-    for fc in summary['flaky_candidates']:
-        (cls, name) = fc['test']
-        md_lines.append(f"- {cls}::{name} (runs: {len(fc['runs'])})")
-else:
-    md_lines.append('No flaky candidates detected.')
-
-Path('target').mkdir(exist_ok=True)
-md_lines.append('\n## Flaky History Size')
-md_lines.append(str(len(history)))
-
-Path('target/test-summary.md').write_text('\n'.join(md_lines))
-print('Wrote target/test-summary.md')
+    # Sorted so serial and parallel runs reduce the same files in the same order
+    files = sorted(REPORT_DIR.glob('TEST-*.xml'))
+    with stage('parse_reports', len(files), children=True) as st:
+        cache = ParseCache(CACHE_DIR) if CACHE_DIR else None
+        records = [cache.get(f) for f in files] if cache else [None] * len(files)
+        misses = [i for i, rec in enumerate(records) if rec is None]
+        for i, suite_record in zip(misses, iter_suite_records([files[i] for i in misses])):
+            records[i] = suite_record
+            if cache:
+                cache.put(files[i], suite_record)
+        if cache:
+            cache.save()
+            print(f'Parse cache: {cache.hits} hit(s), {cache.misses} miss(es)')
+            st.details = {'cache_hits': cache.hits, 'cache_misses': cache.misses}
+    with stage('reduce') as st:
+        for suite_record in records:
+            merge_suite(summary, occurrences, durations, failed_tests_current_run, suite_record, suffix)
+
+        # Detect flaky candidates: same test with both pass and fail states in its history (across parallel shards)
+        for key, runs in occurrences.items():
+            statuses = {r['status'] for r in runs}
+            if 'failed' in statuses and 'passed' in statuses:
+                summary['flaky_candidates'].append({'test': key, 'runs': runs})
+        st.items = summary['total']
+
+    print(json.dumps(summary, indent=2))
+
+    # Flaky history: append to the segmented store, seeding it once from a legacy JSON file
+    history_file = Path('target/flaky-history.json')
+    with stage('history_open') as st:
+        store = HistoryStore(HISTORY_STORE_DIR)
+        migrated = st.items = migrate_legacy(store, history_file)
+    if migrated:
+        print(f'Imported {migrated} legacy history entries into {HISTORY_STORE_DIR}')
+
+    run_entry = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'summary': {
+            'total': summary['total'],
+            'passed': summary['passed'],
+            'failed': summary['failed'],
+            'skipped': summary['skipped']
+        },
+        'duration_seconds': round(sum(durations.values()), 3),
+        'failed_tests': failed_tests_current_run,
+        'flaky_candidates': [
+            {'class': fc['test'][0], 'name': fc['test'][1], 'runs': fc['runs']}
+            for fc in summary['flaky_candidates']
+        ],
+        'retry_stats': {},
+        'flaky_passes': []
+    }
+    if os.environ.get('GITHUB_RUN_ID'):
+        # Matrix jobs of one workflow run share it, so the report can tell the whole batch
+        run_entry['workflow_run'] = os.environ['GITHUB_RUN_ID']
+
+    # Failure clusters: near-duplicate failures share a cluster id across runs
+    with stage('failure_clusters', len(failed_tests_current_run)):
+        clusters = FailureIndex(FAILURE_CLUSTER_DIR)
+        run_clusters = {}
+        for ft in failed_tests_current_run:
+            if not ft.get('failure'):
+                continue
+            ft['cluster'] = clusters.assign(ft['failure'], f"{ft['class']}::{ft['name']}", run_entry['timestamp'], ft['fingerprint'])
+            rc = run_clusters.setdefault(ft['cluster'], {'cluster': ft['cluster'], 'type': ft['failure']['type'], 'message': ft['failure']['message'].split('\n', 1)[0], 'tests': []})
+            rc['tests'].append(f"{ft['class']}::{ft['name']}")
+        run_entry['failure_clusters'] = sorted(run_clusters.values(), key=lambda c: (-len(c['tests']), c['cluster']))
+        if clusters.clusters:
+            clusters.save()
+            print(f'Failure clusters: {len(run_clusters)} this run, {len(clusters.clusters)} known ({FAILURE_CLUSTER_DIR})')
+
+    # Retry attempt analysis (single streaming pass over the attempt log)
+    with stage('retry_analysis') as st:
+        retry = analyze_retry_log('target/retry-attempts.jsonl')
+        st.items = retry['lines']
+        run_entry['retry_stats'] = retry['retry_stats']
+        run_entry['flaky_passes'] = retry['flaky_passes']
+        if retry['timelines']:
+            Path('target/retry-analysis.json').write_text(json.dumps(retry, indent=2))
+            print('Wrote target/retry-analysis.json')
+
+    with stage('history_append', 1):
+        run_id = store.append(run_entry)
+    print('Updated', HISTORY_STORE_DIR)
+    with stage('test_index') as st:
+        test_index = TestIndex(TEST_INDEX_DIR)
+        observations = observations_from_occurrences(occurrences, durations)
+        st.items = len(observations)
+        test_index.add_run(run_id, observations)
+        test_index.save()
+    print('Updated', TEST_INDEX_DIR)
+    # Bounded snapshot (newest MAX_HISTORY runs) for consumers of the legacy JSON list
+    with stage('history_snapshot') as st:
+        snapshot = store.last(MAX_HISTORY)
+        st.items = len(snapshot)
+        history_file.write_text(json.dumps(snapshot, indent=2))
+    print('Updated', history_file)
+
+    # Generate markdown table
+    md_lines = []
+    md_lines.append('# Test Summary')
+    md_lines.append('')
+    md_lines.append(f"Total: {summary['total']}  Passed: {summary['passed']}  Failed: {summary['failed']}  Skipped: {summary['skipped']}")
+    md_lines.append('')
+    if summary['flaky_candidates']:
+        md_lines.append('## Flaky Candidates')
+        for fc in summary['flaky_candidates']:
+            (cls, name) = fc['test']
+            md_lines.append(f"- {cls}::{name} (runs: {len(fc['runs'])})")
+    else:
+        md_lines.append('No flaky candidates detected.')
+
+    if run_entry['failure_clusters']:
+        md_lines.append('\n## Failure Clusters')
+        for fc in run_entry['failure_clusters']:
+            md_lines.append(f"- `{fc['cluster']}` {fc['type']}: {fc['message'][:120]} ({len(fc['tests'])} test(s))")
+
+    Path('target').mkdir(exist_ok=True)
+    md_lines.append('\n## Flaky History Size')
+    md_lines.append(str(len(store)))
+
+    Path('target/test-summary.md').write_text('\n'.join(md_lines))
+    print('Wrote target/test-summary.md')
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""Per-test columnar index over the flaky history.
+
+Layout under the index directory::
+
+    keys.txt              one ``class::name`` per line; line number is the test id
+    col-<name>.bin        append-only observation columns, one row per (run, test)
+    stat-<name>.bin       fixed-width per-test summary columns, indexed by test id
+
+Observation columns are ``run`` (run id from the history store), ``test``, ``status``
+(see STATUS_CODES), ``fhash`` (failure hash as an integer, 0 when none), ``dur``
+(Surefire wall time in seconds, NaN when unknown) and ``prev`` (row of the same
+test's previous observation), which chains each test's rows so a windowed query only
+touches that test's own observations. The summary columns are updated in O(1) per
+test per run and answer first/last seen, failure streak, overall flip rate and the
+smoothed (EWMA) duration used by the shard planner without touching the observation
+log at all. Indexes written before a column existed are padded on load/save.
+
+The same update keeps the online flakiness model read by ``flakiness.py``: per test,
+Beta pseudo-counts of runs with and without a transition (an outcome different from
+the previous one, or pass and fail within one run), discounted by ``FLAKY_DECAY`` per
+decided run so old behaviour fades; an EWMA of the transition indicator
+(``FLAKY_EWMA_ALPHA``); the run of the last transition; and the run the test entered
+quarantine, i.e. when the lower confidence bound of its flip probability reached
+``QUARANTINE_RATE`` (it leaves once the bound falls below half of that).
+"""
+import json
+import math
+import mmap
+import os
+import sys
+from array import array
+from pathlib import Path
+
+STATUS_CODES = {'passed': 0, 'failed': 1, 'skipped': 2, 'flaky': 3}
+STATUS_NAMES = {v: k for k, v in STATUS_CODES.items()}
+NONE = 0xFFFFFFFF
+
+def _typecode(size, codes):
+    for code in codes:
+        if array(code).itemsize == size:
+            return code
+    raise RuntimeError(f'No {size}-byte unsigned array type available')
+
+U8 = 'B'
+U32 = _typecode(4, 'IL')
+U64 = _typecode(8, 'QL')
+
+COLUMNS = {'run': U32, 'test': U32, 'status': U8, 'fhash': U64, 'prev': U32, 'dur': 'f'}
+STATS = {
+    'first_run': U32,
+    'last_run': U32,
+    'last_row': U32,
+    'observations': U32,
+    'skips': U32,
+    'failures': U32,
+    'flips': U32,
+    'streak': U32,
+    'last_outcome': U8,  # last non-skipped status code, NONE_OUTCOME if never run
+    'timed': U32,  # non-skipped observations that carried a duration
+    'cost': 'd',  # EWMA of duration in seconds, NaN until the first timed observation
+    'flip_a': 'd',  # discounted count of decided runs with a transition
+    'flip_b': 'd',  # discounted count of decided runs without one
+    'flip_ewma': 'd',  # EWMA of the transition indicator
+    'last_flip': U32,  # run of the last transition
+    'quarantined': U32,  # run the test entered quarantine, NONE when not quarantined
+}
+NONE_OUTCOME = 0xFF
+NAN = float('nan')
+# Weight of the newest duration in the per-test cost estimate
+COST_ALPHA = float(os.environ.get('TEST_COST_ALPHA', '0.3'))
+FLAKY_DECAY = float(os.environ.get('FLAKY_DECAY', '0.98'))
+FLAKY_EWMA_ALPHA = float(os.environ.get('FLAKY_EWMA_ALPHA', '0.2'))
+FLAKY_Z = float(os.environ.get('FLAKY_Z', '1.645'))  # one-sided 95%
+QUARANTINE_RATE = float(os.environ.get('QUARANTINE_RATE', '0.2'))
+# Beta prior on the flip probability: one transition in ten runs' worth of evidence
+PRIOR_FLIPS = 1.0
+PRIOR_STABLE = 9.0
+
+def flip_bounds(flips, stable, z=FLAKY_Z):
+    """Posterior mean and lower confidence bound of the flip probability (normal approximation)."""
+    a, b = flips + PRIOR_FLIPS, stable + PRIOR_STABLE
+    n = a + b
+    mean = a / n
+    return mean, max(0.0, mean - z * math.sqrt(a * b / (n * n * (n + 1))))
+
+def _stat_default(name):
+    if name in ('first_run', 'last_run', 'last_row', 'last_flip', 'quarantined'):
+        return NONE
+    if name == 'last_outcome':
+        return NONE_OUTCOME
+    if name == 'cost':
+        return NAN
+    return 0
+
+def _column_default(name):
+    return NAN if name == 'dur' else 0
+
+def run_status(statuses):
+    """Collapse the statuses a test had within one run (across shards) to a single code."""
+    if 'failed' in statuses and 'passed' in statuses:
+        return STATUS_CODES['flaky']
+    for name in ('failed', 'passed', 'skipped'):
+        if name in statuses:
+            return STATUS_CODES[name]
+    return STATUS_CODES['skipped']
+
+class TestIndex:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.keys = []
+        self.ids = {}
+        keys_file = self.root / 'keys.txt'
+        if keys_file.exists():
+            self.keys = keys_file.read_text(encoding='utf-8').splitlines()
+            self.ids = {k: i for i, k in enumerate(self.keys)}
+        self.saved_keys = len(self.keys)
+        self.stats = {}
+        for name, code in STATS.items():
+            arr = array(code)
+            path = self.root / f'stat-{name}.bin'
+            if path.exists():
+                arr.frombytes(path.read_bytes())
+            # Stats added after this index was written start from their defaults
+            arr.extend([_stat_default(name)] * (len(self.keys) - len(arr)))
+            self.stats[name] = arr
+        status_col = self.root / 'col-status.bin'
+        self.rows = status_col.stat().st_size if status_col.exists() else 0
+        self.pending = {name: array(code) for name, code in COLUMNS.items()}
+
+    def _new_test(self, key):
+        tid = len(self.keys)
+        self.keys.append(key)
+        self.ids[key] = tid
+        for name, arr in self.stats.items():
+            arr.append(_stat_default(name))
+        return tid
+
+    def add_run(self, run_id, observations):
+        """Record one run.
+
+        ``observations`` maps ``class::name`` to ``(status_code, failure_hash, seconds)``;
+        ``seconds`` may be None when Surefire reported no time.
+        """
+        s = self.stats
+        row = self.rows + len(self.pending['status'])
+        for key, (status, fhash, seconds) in observations.items():
+            tid = self.ids.get(key)
+            if tid is None:
+                tid = self._new_test(key)
+            self.pending['run'].append(run_id)
+            self.pending['test'].append(tid)
+            self.pending['status'].append(status)
+            self.pending['fhash'].append(int(fhash, 16) if fhash else 0)
+            self.pending['prev'].append(s['last_row'][tid])
+            self.pending['dur'].append(NAN if seconds is None else seconds)
+            if s['first_run'][tid] == NONE:
+                s['first_run'][tid] = run_id
+            s['last_run'][tid] = run_id
+            s['last_row'][tid] = row
+            s['observations'][tid] += 1
+            row += 1
+            if status == STATUS_CODES['skipped']:
+                s['skips'][tid] += 1
+                continue
+            if seconds is not None:
+                cost = s['cost'][tid]
+                s['cost'][tid] = seconds if math.isnan(cost) else cost + COST_ALPHA * (seconds - cost)
+                s['timed'][tid] += 1
+            failed = status == STATUS_CODES['failed']
+            if status != STATUS_CODES['passed']:
+                s['failures'][tid] += 1
+            last = s['last_outcome'][tid]
+            flipped = status == STATUS_CODES['flaky'] or (last != NONE_OUTCOME and last != status)
+            if flipped:
+                s['flips'][tid] += 1
+                s['last_flip'][tid] = run_id
+            s['streak'][tid] = s['streak'][tid] + 1 if failed else 0
+            s['last_outcome'][tid] = status
+            self._observe_flip(tid, run_id, flipped)
+
+    def _observe_flip(self, tid, run_id, flipped):
+        s = self.stats
+        s['flip_a'][tid] = s['flip_a'][tid] * FLAKY_DECAY + flipped
+        s['flip_b'][tid] = s['flip_b'][tid] * FLAKY_DECAY + (not flipped)
+        s['flip_ewma'][tid] += FLAKY_EWMA_ALPHA * (flipped - s['flip_ewma'][tid])
+        _, lower = flip_bounds(s['flip_a'][tid], s['flip_b'][tid])
+        if s['quarantined'][tid] == NONE:
+            if lower >= QUARANTINE_RATE:
+                s['quarantined'][tid] = run_id
+        elif lower < QUARANTINE_RATE / 2:
+            s['quarantined'][tid] = NONE
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        if len(self.keys) > self.saved_keys:
+            with open(self.root / 'keys.txt', 'a', encoding='utf-8') as f:
+                f.write(''.join(k + '\n' for k in self.keys[self.saved_keys:]))
+            self.saved_keys = len(self.keys)
+        for name, arr in self.pending.items():
+            path = self.root / f'col-{name}.bin'
+            have = path.stat().st_size // arr.itemsize if path.exists() else 0
+            with open(path, 'ab') as f:
+                if have < self.rows:
+                    # Column added after this index was written: backfill earlier rows
+                    array(COLUMNS[name], [_column_default(name)] * (self.rows - have)).tofile(f)
+                arr.tofile(f)
+        self.rows += len(self.pending['status'])
+        self.pending = {name: array(code) for name, code in COLUMNS.items()}
+        for name, arr in self.stats.items():
+            path = self.root / f'stat-{name}.bin'
+            tmp = path.with_suffix('.tmp')
+            tmp.write_bytes(arr.tobytes())
+            os.replace(tmp, path)
+
+    def stats_for(self, key):
+        """Summary stats for one test, or None if it was never indexed."""
+        tid = self.ids.get(key)
+        if tid is None:
+            return None
+        s = self.stats
+        decided = s['observations'][tid] - s['skips'][tid]
+        last = s['last_outcome'][tid]
+        return {
+            'test': key,
+            'first_seen': s['first_run'][tid],
+            'last_seen': s['last_run'][tid],
+            'observations': s['observations'][tid],
+            'failures': s['failures'][tid],
+            'flips': s['flips'][tid],
+            'flip_rate': round(s['flips'][tid] / max(1, decided - 1), 4) if decided > 1 else 0.0,
+            'failure_streak': s['streak'][tid],
+            'last_status': STATUS_NAMES.get(last) if last != NONE_OUTCOME else None,
+            'duration_ewma': None if math.isnan(s['cost'][tid]) else round(s['cost'][tid], 3),
+            'flip_probability': round(flip_bounds(s['flip_a'][tid], s['flip_b'][tid])[0], 4),
+            'flip_ewma': round(s['flip_ewma'][tid], 4),
+            'last_flip': None if s['last_flip'][tid] == NONE else s['last_flip'][tid],
+            'quarantined_since': None if s['quarantined'][tid] == NONE else s['quarantined'][tid],
+        }
+
+    def costs(self):
+        """Yield ``(class::name, smoothed seconds)`` for every test with at least one timed run."""
+        for tid, cost in enumerate(self.stats['cost']):
+            if not math.isnan(cost):
+                yield self.keys[tid], cost
+
+    def _column(self, name):
+        """Read-only, zero-copy view of a persisted observation column."""
+        path = self.root / f'col-{name}.bin'
+        if not self.rows or not path.exists():
+            return memoryview(array(COLUMNS[name]))
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mm).cast(COLUMNS[name])
+
+    def history_rows(self, tid, since_run=None):
+        """Yield ``(run, status, fhash)`` for one test id, newest first, following the prev chain."""
+        row = self.stats['last_row'][tid]
+        if row == NONE or row >= self.rows:
+            return
+        runs, statuses, hashes, prevs = (self._column(n) for n in ('run', 'status', 'fhash', 'prev'))
+        while row != NONE:
+            run = runs[row]
+            if since_run is not None and run < since_run:
+                break
+            yield run, statuses[row], hashes[row]
+            row = prevs[row]
+
+    def window(self, key, runs, latest_run):
+        """Flip count, flip rate and failures for ``key`` over the last ``runs`` runs."""
+        tid = self.ids.get(key)
+        if tid is None:
+            return None
+        outcomes = [status for _, status, _ in self.history_rows(tid, latest_run - runs + 1)
+                    if status != STATUS_CODES['skipped']]
+        outcomes.reverse()
+        flips = sum(1 for s in outcomes if s == STATUS_CODES['flaky'])
+        flips += sum(1 for a, b in zip(outcomes, outcomes[1:]) if a != b and b != STATUS_CODES['flaky'])
+        return {
+            'test': key,
+            'runs': runs,
+            'observations': len(outcomes),
+            'failures': sum(1 for s in outcomes if s != STATUS_CODES['passed']),
+            'flips': flips,
+            'flip_rate': round(flips / max(1, len(outcomes) - 1), 4) if len(outcomes) > 1 else 0.0,
+        }
+
+def observations_from_occurrences(occurrences, durations=None):
+    """Build TestIndex.add_run input from surefire_summary's (class, name) -> runs mapping."""
+    durations = durations or {}
+    obs = {}
+    for (classname, name), runs in occurrences.items():
+        fhash = next((r['failure_hash'] for r in runs if r.get('failure_hash')), None)
+        obs[f'{classname}::{name}'] = (run_status({r['status'] for r in runs}), fhash, durations.get((classname, name)))
+    return obs
+
+def main(argv):
+    """Query CLI: ``test_index.py <index-dir> <class::name> [window_runs]``."""
+    if len(argv) < 3:
+        print(main.__doc__)
+        return 2
+    index = TestIndex(argv[1])
+    stats = index.stats_for(argv[2])
+    if stats is None:
+        print(f'{argv[2]} not indexed')
+        return 1
+    if len(argv) > 3:
+        stats['window'] = index.window(argv[2], int(argv[3]), stats['last_seen'])
+    print(json.dumps(stats, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
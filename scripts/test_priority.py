@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""History-driven ordering of test classes, so likely failures run first.
+
+Every test gets a recency-weighted failure score from the flaky history: each run
+adds a weight for the test appearing in ``failed_tests`` (1.0), ``flaky_candidates``
+or ``flaky_passes`` (0.5), and older contributions decay by half every
+``PRIORITY_HALF_LIFE`` runs (default 10). Scores are folded incrementally: per test
+only the score and the run it was last updated at are kept, so a run costs its
+signalled tests rather than the whole window. In CI the deploy job folds the merged
+history into a cached ``priority-scores.json`` (``export``); locally the score is
+computed from the last ``PRIORITY_WINDOW`` runs of ``target/flaky-history``.
+
+Per class the test scores are summed and squashed into ``[0, 1)``. When a git base
+is known (``PRIORITY_BASE``, else ``origin/$GITHUB_BASE_REF`` on pull requests),
+``git diff --name-only <base>...HEAD`` adds change relevance weighted by
+``PRIORITY_CHANGE_WEIGHT`` (default 1): 1 for a changed test class, 0.5 for a test
+class whose source names a changed class (page objects, ``BaseTest``, utilities).
+Classes are ordered by score, then by estimated duration (``shard_planner``'s cost
+model, cheapest first), then by name. The output directory gets:
+
+* ``order.txt``   - one class per line; read by ``HistoryClassOrderer`` via ``-DpriorityFile``
+* ``subset.txt``  - Surefire include patterns for every class with a score, topped up to
+  ``PRIORITY_SUBSET_MIN`` classes; run just those with ``-DshardFile=.../subset.txt``
+* ``priority.json`` - the scores behind the order
+
+::
+
+    python3 scripts/test_priority.py                                    # target/flaky-history -> target/priority
+    python3 scripts/test_priority.py .cache/test-durations/priority-scores.json target/shards/priority
+    python3 scripts/test_priority.py export .cache/test-durations/priority-scores.json combined/flaky-history
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+from shard_planner import TEST_SOURCES, class_costs, discover_classes, include_pattern, load_costs
+from stage_metrics import instrumented, stage
+
+HALF_LIFE = float(os.environ.get('PRIORITY_HALF_LIFE', '10'))
+WINDOW = int(os.environ.get('PRIORITY_WINDOW', '200'))
+CHANGE_WEIGHT = float(os.environ.get('PRIORITY_CHANGE_WEIGHT', '1'))
+SUBSET_MIN = int(os.environ.get('PRIORITY_SUBSET_MIN', '5'))
+MIN_SCORE = 0.01  # decayed below this a test is dropped from the exported scores
+BASE = os.environ.get('PRIORITY_BASE', '')
+DURATIONS = Path(os.environ.get('PRIORITY_DURATIONS', '.cache/test-durations/durations.json'))
+HISTORY_STORE = Path('target/flaky-history')
+HISTORY = Path('target/flaky-history.json')
+OUT_DIR = Path('target/priority')
+SIGNALS = (('failed_tests', 1.0), ('flaky_candidates', 0.5), ('flaky_passes', 0.5))
+CHANGED_TEST = 1.0
+REFERENCES_CHANGE = 0.5
+
+class FailureScores:
+    """Recency-weighted failure score per ``class::name``, decayed lazily per test."""
+
+    def __init__(self, half_life=HALF_LIFE):
+        self.decay = 0.5 ** (1.0 / half_life) if half_life > 0 else 0.0
+        self.runs = 0
+        self.timestamp = ''
+        self.tests = {}  # key -> [score at its last update, run of that update]
+
+    def add_run(self, entry):
+        self.runs += 1
+        self.timestamp = max(self.timestamp, entry.get('timestamp') or '')
+        weights = {}
+        for field, weight in SIGNALS:
+            for t in entry.get(field) or []:
+                key = f"{t.get('class')}::{t.get('name')}"
+                weights[key] = max(weights.get(key, 0.0), weight)
+        for key, weight in weights.items():
+            state = self.tests.get(key)
+            if state is None:
+                self.tests[key] = [weight, self.runs]
+            else:
+                state[0] = state[0] * self.decay ** (self.runs - state[1]) + weight
+                state[1] = self.runs
+
+    def score(self, key):
+        state = self.tests.get(key)
+        return state[0] * self.decay ** (self.runs - state[1]) if state else 0.0
+
+    def scores(self):
+        return {key: self.score(key) for key in self.tests}
+
+    @classmethod
+    def load(cls, path, half_life=HALF_LIFE):
+        data = json.loads(Path(path).read_text())
+        scores = cls(half_life)
+        scores.runs = data.get('runs', 0)
+        scores.timestamp = data.get('timestamp', '')
+        # Re-anchored at export time, so every stored score is current as of ``runs``
+        scores.tests = {key: [score, scores.runs] for key, score in data.get('tests', {}).items()}
+        return scores
+
+    def save(self, path):
+        tests = {key: round(s, 4) for key, s in sorted(self.scores().items()) if s >= MIN_SCORE}
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({'version': 1, 'half_life': HALF_LIFE, 'runs': self.runs,
+                                    'timestamp': self.timestamp, 'tests': tests}, indent=2))
+        return len(tests)
+
+def fold_history(scores, entries):
+    """Add the entries newer than the scores' last timestamp; returns how many were added."""
+    since = scores.timestamp
+    added = 0
+    for entry in entries:
+        if since and (entry.get('timestamp') or '') <= since:
+            continue
+        scores.add_run(entry)
+        added += 1
+    return added
+
+def history_entries(store=HISTORY_STORE, legacy=HISTORY, window=WINDOW):
+    from history_store import HistoryStore, open_history
+    if not (HistoryStore.exists(store) or Path(legacy).exists()):
+        return []
+    return open_history(store, legacy).last(window)
+
+def default_base():
+    if BASE:
+        return BASE
+    ref = os.environ.get('GITHUB_BASE_REF', '')
+    return f'origin/{ref}' if ref else None
+
+def changed_files(base):
+    """Paths changed since the merge base with ``base``, or None when git can't tell."""
+    if not base:
+        return None
+    try:
+        out = subprocess.run(['git', 'diff', '--name-only', f'{base}...HEAD'],
+                             capture_output=True, text=True, check=True, timeout=60).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f'No change relevance: git diff against {base} failed ({e})')
+        return None
+    return [line.strip() for line in out.splitlines() if line.strip()]
+
+def change_relevance(changed, classes, src=TEST_SOURCES):
+    """``{class: relevance}`` for test classes that changed or name a changed Java class."""
+    if not changed:
+        return {}
+    relevance = {}
+    names = set()
+    for path in changed:
+        p = Path(path)
+        if p.suffix != '.java':
+            continue
+        try:
+            fqcn = '.'.join(p.relative_to(src).with_suffix('').parts)
+        except ValueError:
+            fqcn = None
+        if classes.get(fqcn):
+            relevance[fqcn] = CHANGED_TEST
+        else:
+            names.add(p.stem)  # a helper, page object or base class without tests of its own
+    if names:
+        pattern = re.compile(r'\b(?:' + '|'.join(sorted(map(re.escape, names))) + r')\b')
+        for fqcn in classes:
+            if fqcn in relevance:
+                continue
+            path = src / include_pattern(fqcn)
+            if path.exists() and pattern.search(path.read_text(encoding='utf-8', errors='replace')):
+                relevance[fqcn] = REFERENCES_CHANGE
+    return relevance
+
+def prioritize(test_scores, relevance, costs):
+    """Rows ``{class, score, history, change, estimated_seconds, tests}``, highest priority first."""
+    per_class = {}
+    for key, s in test_scores.items():
+        cls, name = key.split('::', 1)
+        if cls in costs and s > 0:
+            per_class.setdefault(cls, {})[name] = s
+    rows = []
+    for cls, cost in costs.items():
+        tests = per_class.get(cls, {})
+        history = 1.0 - 0.5 ** sum(tests.values())
+        change = relevance.get(cls, 0.0)
+        rows.append({
+            'class': cls,
+            'score': round(history + CHANGE_WEIGHT * change, 4),
+            'history': round(history, 4),
+            'change': change,
+            'estimated_seconds': round(cost, 3),
+            'tests': {name: round(s, 4) for name, s in sorted(tests.items(), key=lambda kv: -kv[1])},
+        })
+    rows.sort(key=lambda r: (-r['score'], r['estimated_seconds'], r['class']))
+    return rows
+
+def write_priority(rows, out_dir=OUT_DIR, subset_min=SUBSET_MIN, base=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / 'order.txt').write_text(''.join(r['class'] + '\n' for r in rows))
+    subset = [r['class'] for i, r in enumerate(rows) if r['score'] > 0 or i < subset_min]
+    (out_dir / 'subset.txt').write_text(''.join(include_pattern(c) + '\n' for c in subset))
+    summary = {'base': base, 'classes': rows, 'subset': subset,
+               'subset_estimated_seconds': round(sum(r['estimated_seconds'] for r in rows[:len(subset)]), 3)}
+    (out_dir / 'priority.json').write_text(json.dumps(summary, indent=2))
+    return summary
+
+@instrumented('test_priority')
+def main(argv):
+    """``test_priority.py [priority-scores.json|history_store] [out_dir]`` or ``... export <priority-scores.json> [history_store] [legacy_json]``"""
+    if len(argv) > 1 and argv[1] == 'export':
+        if len(argv) < 3:
+            print(main.__doc__)
+            return 2
+        out = Path(argv[2])
+        scores = FailureScores()
+        if out.is_file():
+            try:
+                scores = FailureScores.load(out)
+            except (OSError, ValueError, AttributeError) as e:
+                print(f'Rebuilding unreadable failure scores in {out} ({e})')
+        with stage('priority.fold') as st:
+            st.items = fold_history(scores, history_entries(Path(argv[3]) if len(argv) > 3 else HISTORY_STORE,
+                                                            Path(argv[4]) if len(argv) > 4 else HISTORY))
+        kept = scores.save(out)
+        print(f'Folded {st.items} run(s) into {out} ({kept} test(s) with a failure score)')
+        return 0
+    source = Path(argv[1]) if len(argv) > 1 else HISTORY_STORE
+    out_dir = Path(argv[2]) if len(argv) > 2 else OUT_DIR
+    with stage('priority.scores') as st:
+        scores = None
+        if source.is_file():
+            try:
+                scores = FailureScores.load(source)
+            except (OSError, ValueError, AttributeError) as e:
+                print(f'Ignoring unreadable failure scores in {source} ({e})')
+                scores = FailureScores()
+        if scores is None:
+            scores = FailureScores()
+            fold_history(scores, history_entries(source, source.with_suffix('.json')))
+        st.items = len(scores.tests)
+    with stage('priority.changes') as st:
+        classes = discover_classes()
+        base = default_base()
+        changed = changed_files(base)
+        relevance = change_relevance(changed, classes)
+        st.items = len(changed or [])
+    test_costs = {}
+    if DURATIONS.exists():
+        try:
+            test_costs = load_costs(DURATIONS)
+        except (OSError, ValueError, AttributeError) as e:
+            print(f'Ignoring unreadable durations in {DURATIONS} ({e}); ordering ties by @Test counts')
+    costs, _ = class_costs(test_costs, classes)
+    summary = write_priority(prioritize(scores.scores(), relevance, costs), out_dir, base=base)
+    for r in summary['classes'][:10]:
+        print(f"{r['score']:>7.3f}  history {r['history']:.3f}  change {r['change']:.1f}  ~{r['estimated_seconds']}s  {r['class']}")
+    print(f"{len(summary['classes'])} class(es) ordered, {len(summary['subset'])} in the fast subset "
+          f"(~{summary['subset_estimated_seconds']}s) -> {out_dir}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
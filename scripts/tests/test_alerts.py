@@ -0,0 +1,150 @@
+"""Alert rules over multi-job workflow runs, and webhook dispatch against an asyncio stub
+server: batching, Retry-After and bodiless replies.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+import asyncio
+import json
+import sys
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import alerts  # noqa: E402
+from failure_fingerprint import FailureIndex  # noqa: E402
+
+class StubServer:
+    """HTTP/1.1 keep-alive server answering each request with the next scripted raw response."""
+
+    def __init__(self, responses, default=b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok'):
+        self.responses = list(responses)
+        self.default = default
+        self.requests = []
+        self.connections = 0
+        self.server = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/hook'
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b''):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                self.requests.append((request_line.split()[0].decode(), body))
+                writer.write(self.responses.pop(0) if self.responses else self.default)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+def _alerts(n):
+    return [alerts.alert('rule', f'alert {i}') for i in range(n)]
+
+class SendBatchesTest(unittest.IsolatedAsyncioTestCase):
+    async def test_batches_share_one_connection(self):
+        async with StubServer([]) as server:
+            result = await alerts.send_batches(alerts.Destination('hook', server.url), _alerts(45), rate=0)
+        self.assertEqual(result['messages'], 3)
+        self.assertEqual(result['failed'], 0)
+        self.assertEqual(result['connections'], 1)
+        self.assertEqual(server.connections, 1)
+        sizes = [len(json.loads(body)['alerts']) for _, body in server.requests]
+        self.assertEqual(sizes, [alerts.BATCH, alerts.BATCH, 45 - 2 * alerts.BATCH])
+
+    async def test_retry_after_is_honoured(self):
+        busy = b'HTTP/1.1 429 Too Many Requests\r\nRetry-After: 1\r\nContent-Length: 4\r\n\r\nbusy'
+        async with StubServer([busy]) as server:
+            started = time.monotonic()
+            result = await alerts.send_batches(alerts.Destination('hook', server.url), _alerts(1), retries=2, rate=0)
+            elapsed = time.monotonic() - started
+        self.assertEqual(result['messages'], 1)
+        self.assertEqual(result['attempts'], 2)
+        self.assertNotIn('error', result)
+        self.assertGreaterEqual(elapsed, 1.0)
+        self.assertEqual(server.connections, 1)
+
+    async def test_bodiless_replies_keep_the_connection(self):
+        replies = [
+            b'HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 204 No Content\r\n\r\n',
+            b'HTTP/1.1 304 Not Modified\r\nContent-Length: 12\r\n\r\n',
+            b'HTTP/1.1 200 OK\r\nContent-Length: 12\r\n\r\n',  # reply to HEAD: length without a body
+        ]
+        async with StubServer(replies) as server:
+            conn = alerts.Connection(server.url, timeout=2)
+            try:
+                self.assertEqual((await conn.post(b'{}'))[0], 204)
+                self.assertEqual((await conn.post(b'{}'))[0], 304)
+                status, headers = await conn.request('HEAD')
+                self.assertEqual((status, headers['content-length']), (200, '12'))
+                self.assertEqual((await conn.post(b'{}'))[0], 200)
+            finally:
+                await conn.close()
+        self.assertEqual(conn.opened, 1)
+        self.assertEqual([method for method, _ in server.requests], ['POST', 'POST', 'HEAD', 'POST'])
+
+class NewFailureClustersTest(unittest.TestCase):
+    def test_clusters_first_seen_anywhere_in_the_batch(self):
+        failure = {'type': 'TimeoutError', 'message': 'Timeout <N>ms exceeded', 'frames': ['LoginTest.login']}
+        other = {'type': 'AssertionError', 'message': 'expected <N> rows', 'frames': ['CartTest.total']}
+        clusters = FailureIndex()
+        clusters.assign(failure, 'LoginTest::login', '2024-01-02T10:00:01Z')
+        clusters.assign(other, 'CartTest::total', '2024-01-01T10:00:00Z')
+        recent = [
+            {'timestamp': '2024-01-01T10:00:00Z', 'workflow_run': '1'},
+            {'timestamp': '2024-01-02T10:00:01Z', 'workflow_run': '2'},  # another shard of the latest run
+            {'timestamp': '2024-01-02T10:00:05Z', 'workflow_run': '2'},
+        ]
+        found = [a for a in alerts.evaluate(recent, clusters) if a['rule'] == 'new_failure_clusters']
+        self.assertEqual(len(found), 1)
+        self.assertEqual(found[0]['title'], '1 new failure cluster(s)')
+        self.assertIn('TimeoutError', found[0]['detail'][0])
+
+class BaselineTest(unittest.TestCase):
+    @staticmethod
+    def _job(ts, run, failed, flaky):
+        return {'timestamp': ts, 'workflow_run': run, 'summary': {'total': 100, 'passed': 100 - failed, 'failed': failed},
+                'flaky_candidates': [{'class': 'CartTest', 'name': f'test{i}'} for i in range(flaky)]}
+
+    def test_sibling_jobs_are_not_the_baseline(self):
+        recent = [
+            self._job('2024-01-01T10:00:00Z', '1', 0, 0),
+            self._job('2024-01-01T10:00:01Z', '1', 10, 1),
+            self._job('2024-01-02T10:00:00Z', '2', 0, 0),
+            self._job('2024-01-02T10:00:01Z', '2', 10, 1),  # one bad browser job, as in the previous run
+        ]
+        self.assertEqual(alerts.evaluate(recent), [])
+
+    def test_latest_run_is_combined_across_jobs(self):
+        recent = [
+            self._job('2024-01-01T10:00:00Z', '1', 0, 0),
+            self._job('2024-01-01T10:00:01Z', '1', 0, 0),
+            self._job('2024-01-02T10:00:00Z', '2', 12, 2),
+            self._job('2024-01-02T10:00:01Z', '2', 0, 0),
+        ]
+        rules = {a['rule']: a for a in alerts.evaluate(recent)}
+        self.assertEqual(sorted(rules), ['flaky_increase', 'stability_drop'])
+        self.assertEqual(rules['flaky_increase']['title'], 'Flaky tests increased: 0 -> 2')
+        self.assertIn('94.0%', rules['stability_drop']['title'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+"""Run ids handed out by the segmented history store.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from history_store import HistoryStore  # noqa: E402
+
+class AppendTest(unittest.TestCase):
+    def test_append_returns_increasing_run_ids(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = HistoryStore(Path(tmp) / 'store', segment_runs=2)
+            ids = [store.append({'timestamp': f'2024-01-0{i + 1}T00:00:00Z'}) for i in range(4)]
+            self.assertEqual(ids, [0, 1, 2, 3])
+            self.assertEqual(store.extend([{'timestamp': '2024-01-05T00:00:00Z'}]), 1)
+            reopened = HistoryStore(Path(tmp) / 'store', segment_runs=2)
+            self.assertEqual(reopened.append({'timestamp': '2024-01-06T00:00:00Z'}), 5)
+            self.assertEqual(reopened.get(3)['timestamp'], '2024-01-04T00:00:00Z')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""Slow-action hotspots from Playwright trace zips.
+
+Traces are the ``combined/artifacts/traces/*.zip`` files written by ``BaseTest``.
+The ones analysed belong to failing and retried tests: every test the artifact index
+has more than one attempt for, plus the failed tests and flaky passes of the given
+history entries (``--all`` takes every trace). Each zip is read in place: its
+``*.trace`` and ``*.network`` members are decompressed as streams, line by line, and
+only action and resource events are decoded. DOM snapshots and screencast frames,
+which make up most of a trace, are skipped by a prefix check without JSON parsing.
+
+Per trace, action durations (``before``/``after`` pairs, or ``action`` events in
+older trace formats) are aggregated by API call, by selector and, for navigations
+and explicit waits, by target URL; network requests are aggregated by method and URL
+(query strings dropped). Traces are analysed in parallel (``TRACE_WORKERS``), the
+small per-trace aggregates are merged, and the report lists the categories by total
+time along with the slowest individual actions and requests:
+
+    python3 scripts/trace_analysis.py [artifacts_dir] [out_json] [--all]
+"""
+import heapq
+import json
+import multiprocessing
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from artifact_index import ARTIFACTS_DIR, ArtifactIndex
+from stage_metrics import instrumented, stage
+
+WORKERS = int(os.environ.get('TRACE_WORKERS', str(os.cpu_count() or 1)))
+TOP = int(os.environ.get('TRACE_TOP', '25'))
+OUT = Path('combined/trace-hotspots.json')
+HISTORY_STORE = 'combined/flaky-history'
+HISTORY = 'combined/flaky-history.json'
+NAVIGATION = {'goto', 'reload', 'goBack', 'goForward', 'waitForNavigation', 'waitForLoadState',
+              'waitForURL', 'waitForTimeout'}
+EVENT_PREFIX = b'{"type":"'
+ACTION_TYPES = (b'before"', b'after"', b'action"')
+NETWORK_TYPES = (b'resource-snapshot"',)
+
+def _url_key(url):
+    return (url or '').split('#', 1)[0].split('?', 1)[0]
+
+def _add(agg, key, ms, error=False):
+    stats = agg.get(key)
+    if stats is None:
+        agg[key] = [1, ms, ms, int(error)]
+    else:
+        stats[0] += 1
+        stats[1] += ms
+        stats[2] = max(stats[2], ms)
+        stats[3] += int(error)
+
+def _events(fh, wanted):
+    """Decode only the events of the wanted types from a JSON-lines member."""
+    for line in fh:
+        if line.startswith(EVENT_PREFIX):
+            if not line[len(EVENT_PREFIX):].startswith(wanted):
+                continue
+        elif not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue  # a truncated last line when the trace was cut short
+
+def _action(result, top, label, api, selector, url, ms, error):
+    method = api.rsplit('.', 1)[-1]
+    error = bool(error)
+    _add(result['actions'], api, ms, error)
+    if selector:
+        _add(result['selectors'], selector, ms, error)
+    if method in NAVIGATION:
+        _add(result['navigation'], (api, _url_key(url)), ms, error)
+    item = (ms, api, selector or '', label, error)
+    if len(top) < TOP:
+        heapq.heappush(top, item)
+    elif item > top[0]:
+        heapq.heapreplace(top, item)
+
+def _read_actions(fh, result, top, label):
+    pending = {}
+    for ev in _events(fh, ACTION_TYPES):
+        kind = ev.get('type')
+        if kind == 'before':
+            params = ev.get('params') or {}
+            api = ev.get('apiName') or f"{ev.get('class', '').lower()}.{ev.get('method')}"
+            pending[ev.get('callId')] = (api, params.get('selector'), params.get('url'), ev.get('startTime', 0))
+        elif kind == 'after':
+            call = pending.pop(ev.get('callId'), None)
+            if call:
+                api, selector, url, start = call
+                _action(result, top, label, api, selector, url, max(0.0, ev.get('endTime', start) - start), ev.get('error'))
+        elif kind == 'action':
+            meta = ev.get('metadata') or {}
+            params = meta.get('params') or {}
+            api = meta.get('apiName') or f"{meta.get('type', '').lower()}.{meta.get('method')}"
+            _action(result, top, label, api, params.get('selector'), params.get('url'),
+                    max(0.0, meta.get('endTime', 0) - meta.get('startTime', 0)), meta.get('error'))
+        else:
+            continue
+        result['events'] += 1
+    # Calls still running when tracing stopped (typically the one that timed out)
+    result['unfinished'] += len(pending)
+    for api, selector, _, _ in pending.values():
+        result['unfinished_calls'].append(f'{api} {selector}' if selector else api)
+
+def _read_network(fh, result, top, label):
+    for ev in _events(fh, NETWORK_TYPES):
+        if ev.get('type') != 'resource-snapshot':
+            continue
+        snap = ev.get('snapshot') or {}
+        request, response = snap.get('request') or {}, snap.get('response') or {}
+        ms = snap.get('time')
+        if ms is None or ms < 0:
+            continue
+        status = response.get('status', -1)
+        url = _url_key(request.get('url'))
+        _add(result['network'], (request.get('method', 'GET'), url), ms, status >= 400 or status <= 0)
+        item = (ms, request.get('method', 'GET'), url, label, status)
+        if len(top) < TOP:
+            heapq.heappush(top, item)
+        elif item > top[0]:
+            heapq.heapreplace(top, item)
+        result['events'] += 1
+
+def analyze_trace(path, label=None):
+    """Aggregates for one trace zip (never raises; unreadable traces carry ``error``)."""
+    path = Path(path)
+    label = label or path.name
+    result = {'trace': path.name, 'events': 0, 'unfinished': 0, 'unfinished_calls': [], 'error': None,
+              'actions': {}, 'selectors': {}, 'navigation': {}, 'network': {}, 'slow_actions': [], 'slow_requests': []}
+    try:
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if info.filename.endswith('.trace'):
+                    with zf.open(info) as fh:
+                        _read_actions(fh, result, result['slow_actions'], label)
+                elif info.filename.endswith('.network'):
+                    with zf.open(info) as fh:
+                        _read_network(fh, result, result['slow_requests'], label)
+    except (zipfile.BadZipFile, OSError, EOFError, ValueError) as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    return result
+
+def _analyze(item):
+    return analyze_trace(*item)
+
+def select_traces(index, entries=(), all_traces=False):
+    """``[(path, label)]`` for traces of failing and retried tests (every trace with ``all_traces``)."""
+    wanted = set()
+    for entry in entries:
+        for t in entry.get('failed_tests', []) + entry.get('flaky_passes', []):
+            wanted.add(((t.get('class') or '').split('.')[-1], t.get('name')))
+    out = []
+    for (cls, method), attempts in sorted(index.by_test.items()):
+        if not (all_traces or len(attempts) > 1 or max(attempts) > 1 or (cls, method) in wanted):
+            continue
+        for attempt in sorted(attempts):
+            for e in attempts[attempt].get('traces', []):
+                out.append((str(index.root / e['path']), f'{cls}.{method}#{attempt}'))
+    return out
+
+def iter_results(items, workers=WORKERS):
+    if workers <= 1 or len(items) < 2:
+        yield from map(_analyze, items)
+        return
+    # Spawned, not forked: the report pipeline runs this next to other stage threads
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(items)), mp_context=ctx) as pool:
+        yield from pool.map(_analyze, items, chunksize=max(1, len(items) // (workers * 4)))
+
+def _ranked(agg, fields, top=TOP):
+    rows = []
+    for key, (count, total, worst, errors) in agg.items():
+        row = dict(zip(fields, key if isinstance(key, tuple) else (key,)))
+        row.update(count=count, total_ms=round(total, 1), mean_ms=round(total / count, 1), max_ms=round(worst, 1), errors=errors)
+        rows.append(row)
+    rows.sort(key=lambda r: (-r['total_ms'], str(r)))
+    return rows[:top]
+
+def analyze_traces(items, workers=WORKERS, top=TOP):
+    """Merge the per-trace aggregates of ``items`` (``[(path, label)]``) into one hotspot report."""
+    totals = {'actions': {}, 'selectors': {}, 'navigation': {}, 'network': {}}
+    slow_actions, slow_requests, unfinished, bad = [], [], {}, []
+    events = 0
+    for r in iter_results(items, workers):
+        if r['error']:
+            bad.append({'trace': r['trace'], 'error': r['error']})
+        events += r['events']
+        for name, agg in totals.items():
+            for key, (count, total, worst, errors) in r[name].items():
+                stats = agg.get(key)
+                if stats is None:
+                    agg[key] = [count, total, worst, errors]
+                else:
+                    stats[0] += count
+                    stats[1] += total
+                    stats[2] = max(stats[2], worst)
+                    stats[3] += errors
+        slow_actions = heapq.nlargest(top, slow_actions + r['slow_actions'])
+        slow_requests = heapq.nlargest(top, slow_requests + r['slow_requests'])
+        for call in r['unfinished_calls']:
+            unfinished[call] = unfinished.get(call, 0) + 1
+    return {
+        'traces': len(items),
+        'unreadable': bad,
+        'events': events,
+        'actions': _ranked(totals['actions'], ('api',), top),
+        'selectors': _ranked(totals['selectors'], ('selector',), top),
+        'navigation': _ranked(totals['navigation'], ('api', 'url'), top),
+        'network': _ranked(totals['network'], ('method', 'url'), top),
+        'slowest_actions': [{'ms': round(ms, 1), 'api': api, 'selector': sel, 'test': test, 'error': err}
+                            for ms, api, sel, test, err in slow_actions],
+        'slowest_requests': [{'ms': round(ms, 1), 'method': m, 'url': url, 'test': test, 'status': status}
+                             for ms, m, url, test, status in slow_requests],
+        'unfinished_calls': dict(sorted(unfinished.items(), key=lambda kv: -kv[1])[:top]),
+    }
+
+def write_hotspots(entries=(), out=OUT, artifacts_dir=ARTIFACTS_DIR, all_traces=False, index=None):
+    """Analyse the selected traces under ``artifacts_dir`` (or of a prebuilt ``index``) and write the report to ``out``."""
+    artifacts_dir = Path(artifacts_dir)
+    if index is None and (artifacts_dir / 'index.json').exists():
+        index = ArtifactIndex.load(artifacts_dir)
+    elif index is None:
+        index = ArtifactIndex.scan(artifacts_dir, checksums=False)
+    items = select_traces(index, entries, all_traces)
+    with stage('traces.analyze', len(items), children=True):
+        report = analyze_traces(items)
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"Trace hotspots: {report['traces']} trace(s), {report['events']} event(s), "
+          f"{len(report['unreadable'])} unreadable -> {out}")
+    return report
+
+def _print_table(title, rows, label):
+    if not rows:
+        return
+    print(f'\n{title}')
+    for r in rows[:10]:
+        print(f"  {r['total_ms']:>11.1f} ms  x{r['count']:<5} max {r['max_ms']:>9.1f}  {label(r)}"
+              + (f"  ({r['errors']} error(s))" if r['errors'] else ''))
+
+@instrumented('trace_analysis')
+def main(argv):
+    """``trace_analysis.py [artifacts_dir] [out_json] [--all]``"""
+    from history_store import HistoryStore, open_history
+    all_traces = '--all' in argv
+    args = [a for a in argv[1:] if a != '--all']
+    artifacts_dir = Path(args[0]) if args else ARTIFACTS_DIR
+    out = Path(args[1]) if len(args) > 1 else OUT
+    if not (artifacts_dir / 'traces').exists():
+        print(f'No traces under {artifacts_dir}; skipping.')
+        return 0
+    entries = []
+    if HistoryStore.exists(HISTORY_STORE) or Path(HISTORY).exists():
+        entries = open_history(HISTORY_STORE, HISTORY).last(20)
+    report = write_hotspots(entries, out, artifacts_dir, all_traces)
+    _print_table('Actions by total time', report['actions'], lambda r: r['api'])
+    _print_table('Selectors by total time', report['selectors'], lambda r: r['selector'])
+    _print_table('Navigation and waits', report['navigation'], lambda r: f"{r['api']} {r['url']}")
+    _print_table('Network requests', report['network'], lambda r: f"{r['method']} {r['url']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
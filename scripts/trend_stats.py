@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""NumPy-backed trend statistics over flaky history run entries.
+
+``load_columns`` streams history entries once into typed arrays; ``compute_trends``
+derives every series the trends page and dashboard sparklines chart (raw counts,
+failure rate, rolling means, EWMA, rolling percentiles and change-point flags) with
+array operations, so cost stays linear and in C even for tens of thousands of runs.
+"""
+import math
+
+import numpy as np
+
+DEFAULT_WINDOW = 10
+DEFAULT_ALPHA = 0.3
+DEFAULT_PERCENTILES = (50, 90)
+# |mean shift| in pooled standard errors needed to flag a change point
+CHANGE_THRESHOLD = 5.0
+
+RUN_DTYPE = np.dtype([('timestamp', 'U32'), ('total', 'i8'), ('failed', 'i8'), ('flaky', 'i8')])
+
+def run_row(run):
+    """The ``RUN_DTYPE`` tuple for one history entry."""
+    summary = run.get('summary', {})
+    return (run.get('timestamp', '') or '', summary.get('total', 0), summary.get('failed', 0), len(run.get('flaky_candidates', [])))
+
+def load_columns(entries):
+    """Stream run entries into a structured array without keeping the entries themselves."""
+    return np.fromiter((run_row(run) for run in entries), dtype=RUN_DTYPE)
+
+def rolling_mean(x, window):
+    """Trailing mean; the first ``window - 1`` points average over what is available."""
+    if not len(x):
+        return x.astype(float)
+    c = np.cumsum(np.insert(x.astype(float), 0, 0.0))
+    idx = np.arange(1, len(x) + 1)
+    lo = np.maximum(0, idx - window)
+    return (c[idx] - c[lo]) / (idx - lo)
+
+def ewma(x, alpha):
+    """Exponentially weighted moving average seeded with the first value.
+
+    Uses the closed form y_k = (1-a)^(k+1) y_prev + a * sum_j (1-a)^(k-j) x_j over
+    blocks short enough that (1-a)^-k cannot overflow, so only the block loop runs in
+    Python.
+    """
+    x = x.astype(float)
+    if not len(x) or alpha >= 1:
+        return x.copy()
+    decay = 1.0 - alpha
+    block = max(1, min(1024, int(300 / -math.log10(decay))))
+    out = np.empty_like(x)
+    prev = x[0]
+    for start in range(0, len(x), block):
+        seg = x[start:start + block]
+        k = np.arange(len(seg))
+        y = decay ** (k + 1) * prev + alpha * decay ** k * np.cumsum(seg * decay ** -k)
+        out[start:start + len(seg)] = y
+        prev = y[-1]
+    return out
+
+def rolling_percentiles(x, window, percentiles):
+    """Trailing-window percentiles; returns an array of shape (len(percentiles), len(x))."""
+    x = x.astype(float)
+    out = np.empty((len(percentiles), len(x)))
+    head = min(window - 1, len(x))
+    # Partial leading windows are few; full windows go through one vectorized call
+    for i in range(head):
+        out[:, i] = np.percentile(x[:i + 1], percentiles)
+    if len(x) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(x, window)
+        out[:, head:] = np.percentile(windows, percentiles, axis=1)
+    return out
+
+def change_points(x, window, threshold=CHANGE_THRESHOLD):
+    """Flag runs where the mean of the next ``window`` runs departs from the previous ``window``.
+
+    A run i is flagged when |mean(x[i:i+w]) - mean(x[i-w:i])| exceeds ``threshold``
+    pooled standard errors and is the strongest shift within +/- w runs.
+    """
+    n = len(x)
+    flags = np.zeros(n, dtype=bool)
+    if n < 2 * window:
+        return flags
+    x = x.astype(float)
+    c1 = np.cumsum(np.insert(x, 0, 0.0))
+    c2 = np.cumsum(np.insert(x * x, 0, 0.0))
+    i = np.arange(window, n - window + 1)
+    def stats(lo, hi):
+        mean = (c1[hi] - c1[lo]) / window
+        var = np.maximum((c2[hi] - c2[lo]) / window - mean * mean, 0.0)
+        return mean, var
+    ml, vl = stats(i - window, i)
+    mr, vr = stats(i, i + window)
+    score = np.abs(mr - ml) / np.sqrt((vl + vr) / window + 1e-9)
+    padded = np.concatenate([np.zeros(window), score, np.zeros(window)])
+    local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * window + 1).max(axis=1)
+    hits = (score > threshold) & (score >= local_max)
+    flags[i[hits]] = True
+    return flags
+
+def compute_trends(entries, window=DEFAULT_WINDOW, alpha=DEFAULT_ALPHA, percentiles=DEFAULT_PERCENTILES):
+    """Compute all chart series for ``entries`` (an iterable of run entries, oldest first).
+
+    Returns a dict of plain lists ready for JSON embedding.
+    """
+    cols = entries if isinstance(entries, np.ndarray) else load_columns(entries)
+    failed = cols['failed']
+    totals = np.maximum(1, cols['total'])
+    flaky = cols['flaky']
+    failure_rate = np.round(failed / totals * 100, 2)
+    pct = rolling_percentiles(failure_rate, window, percentiles)
+    series = {
+        'run': np.arange(1, len(cols) + 1).tolist(),
+        'timestamp': cols['timestamp'].tolist(),
+        'total': cols['total'].tolist(),
+        'failed': failed.tolist(),
+        'flaky': flaky.tolist(),
+        'failure_rate': failure_rate.tolist(),
+        'failure_rate_mean': np.round(rolling_mean(failure_rate, window), 2).tolist(),
+        'failure_rate_ewma': np.round(ewma(failure_rate, alpha), 2).tolist(),
+        'failed_mean': np.round(rolling_mean(failed, window), 2).tolist(),
+        'flaky_mean': np.round(rolling_mean(flaky, window), 2).tolist(),
+        'failure_rate_change': change_points(failure_rate, window).tolist(),
+        'params': {'window': window, 'alpha': alpha, 'percentiles': list(percentiles)},
+    }
+    for p, values in zip(percentiles, pct):
+        series[f'failure_rate_p{p}'] = np.round(values, 2).tolist()
+    return series
@@ -0,0 +1,37 @@
+package com.example.tests.extensions;
+
+import org.junit.jupiter.api.ClassDescriptor;
+import org.junit.jupiter.api.ClassOrderer;
+import org.junit.jupiter.api.ClassOrdererContext;
+
+import java.nio.file.*;
+import java.util.*;
+
+/**
+ * Runs test classes in the order written by scripts/test_priority.py (one class name per line
+ * in the file named by the priorityFile property), so classes that failed recently or are touched
+ * by the change run first. Classes not listed keep their discovery order after the listed ones;
+ * without the file the order is left unchanged.
+ */
+public class HistoryClassOrderer implements ClassOrderer {
+    private static Map<String, Integer> ranks() {
+        Path file = Paths.get(System.getProperty("priorityFile", "target/priority/order.txt"));
+        Map<String, Integer> ranks = new HashMap<>();
+        try {
+            for (String line : Files.readAllLines(file)) {
+                String name = line.trim();
+                if (!name.isEmpty()) ranks.putIfAbsent(name, ranks.size());
+            }
+        } catch (Exception ignored) {}
+        return ranks;
+    }
+
+    @Override
+    public void orderClasses(ClassOrdererContext context) {
+        Map<String, Integer> ranks = ranks();
+        if (ranks.isEmpty()) return;
+        // List.sort is stable, so unlisted classes keep their relative order
+        context.getClassDescriptors().sort(Comparator.comparingInt(
+                (ClassDescriptor d) -> ranks.getOrDefault(d.getTestClass().getName(), Integer.MAX_VALUE)));
+    }
+}
@@ -22,7 +22,12 @@ class RetryLogEntry {
     }
 }
 
-public class RetryExtension implements InvocationInterceptor {
+/**
+ * Retries a failing test method up to retry.max times. The attempt number stays in AttemptContext
+ * until afterEach, so AfterTestExecution callbacks (screenshots) and @AfterEach methods (traces,
+ * videos) name their artifacts after the attempt that actually ran last.
+ */
+public class RetryExtension implements InvocationInterceptor, AfterEachCallback {
     private static int maxRetries() {
         String prop = System.getProperty("retry.max", "0");
         try { return Integer.parseInt(prop); } catch (NumberFormatException e) { return 0; }
@@ -45,11 +50,14 @@ public class RetryExtension implements InvocationInterceptor {
                 if (attempt > max) {
                     throw last;
                 }
-            } finally {
-                AttemptContext.clear();
             }
             attempt++;
         }
         if (last != null) throw last;
     }
+
+    @Override
+    public void afterEach(ExtensionContext context) {
+        AttemptContext.clear();
+    }
 }
@@ -1,5 +1,6 @@
 package com.example.tests.extensions;
 
+import com.example.tests.util.AttemptContext;
 import com.microsoft.playwright.Page;
 import org.junit.jupiter.api.extension.*;
 
@@ -32,7 +33,9 @@ public class ScreenshotOnFailureExtension implements AfterTestExecutionCallback,
         Page page = ReflectionUtils.findPage(testInstance);
         if (page == null) return;
 
-        String baseName = sanitize(context.getDisplayName()) + "_" + TS.format(LocalDateTime.now());
+        // Same <Class>_<method>-attempt<N>-<timestamp> convention as traces/videos so reports can index them together
+        String prefix = context.getRequiredTestClass().getSimpleName() + "_" + sanitize(context.getTestMethod().map(m -> m.getName()).orElse("method"));
+        String baseName = prefix + "-attempt" + AttemptContext.getAttempt() + "-" + TS.format(LocalDateTime.now());
         Path target = Paths.get(SCREENSHOT_DIR, baseName + ".png");
         try {
             page.screenshot(new Page.ScreenshotOptions().setPath(target).setFullPage(true));